@@ -5,24 +5,44 @@ import traceback
 from pathlib import Path
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QWidget,
-    QFileDialog, QLineEdit, QComboBox, QTextEdit
+    QFileDialog, QLineEdit, QComboBox, QTextEdit, QProgressBar, QCheckBox
 )
 from PyQt6.QtGui import QIcon
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 import asyncio
 import aiohttp
 from ArticleGenerator.article_generator import ArticleGenerator, ImageDownloaderPix  # Предположим, что ArticleGenerator импортирован как отдельный модуль
+from ArticleGenerator.integration_api_unique_code.content_watch import ContentWatchClient, UniquenessGate
 import urllib.parse
+import logging
+from Common.log_sink import LogSink
+from Common.log_setup import get_logger
+from Common.article_store import PackedArticleStore
+from ArticleGenerator.token_budget import TokenBudget
+from WordPressPoster.WordPressPoster import WordPressPoster
+from WordPressPoster.pipeline import PublishingPipeline
 
 SETTINGS_FILE_PATH = Path('settings') / 'app_settings.json'
+POSTER_SETTINGS_FILE_PATH = Path('settings') / 'settings.json'  # Настройки окна WordPress Poster
 
 
 class WorkerThread(QThread):
-    log_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(bool)
+    progress_signal = pyqtSignal(object)  # ProgressEvent, не чаще двух раз в секунду
 
-    def __init__(self, data_folder, api_key_file, output_folder, prompt_file, min_chars, model_name, language, pixabay_api_key, num_images):
+    def __init__(self, data_folder, api_key_file, output_folder, prompt_file, min_chars, model_name, language, pixabay_api_key, num_images,
+                 content_watch_api_key='', min_uniqueness=80.0, youtube_api_key='', transcript_language='en', packed_store=False,
+                 budgets=None, model_prices=None, keyword_clustering=None, publish_immediately=False):
         super().__init__()
+        self.publish_immediately = publish_immediately
+        self.keyword_clustering = keyword_clustering
+        self.budgets = budgets
+        self.model_prices = model_prices
+        self.packed_store = packed_store
+        self.youtube_api_key = youtube_api_key
+        self.transcript_language = transcript_language
+        self.content_watch_api_key = content_watch_api_key
+        self.min_uniqueness = min_uniqueness
         self.data_folder = data_folder
         self.api_key_file = api_key_file
         self.output_folder = output_folder
@@ -34,7 +54,38 @@ class WorkerThread(QThread):
         self.num_images = num_images
 
     async def run_async(self):
+        client = None
+        transcript_source = None
+        transcript_condenser = None
+        store = None
+        budget = None
+        poster = None
         try:
+            # Лимиты токенов и стоимости задаются ключом "budgets" в app_settings.json, расход копится в леджере
+            if self.budgets:
+                budget = TokenBudget(self.budgets, ledger_file=SETTINGS_FILE_PATH.parent / 'token_ledger.db',
+                                     prices=self.model_prices)
+
+            # Упакованное хранилище: одна база статей и изображения по хэшу вместо папки на каждую статью
+            if self.packed_store:
+                os.makedirs(self.output_folder, exist_ok=True)
+                store = PackedArticleStore(self.output_folder)
+
+            # Субтитры YouTube как материал для статей подключаются, только если указан ключ YouTube Data API
+            if self.youtube_api_key:
+                from ArticleGenerator.integration_api_youtube.transcript_source import TranscriptSource
+                from ArticleGenerator.integration_api_youtube.transcript_condenser import TranscriptCondenser
+                transcript_source = TranscriptSource(self.youtube_api_key, language=self.transcript_language,
+                                                     cache_file=SETTINGS_FILE_PATH.parent / 'youtube_cache.db')
+                # Длинные субтитры сжимаются до бюджета токенов, чтобы не раздувать промпт
+                transcript_condenser = TranscriptCondenser(cache_file=SETTINGS_FILE_PATH.parent / 'youtube_cache.db')
+
+            # Проверка уникальности включается, только если указан ключ content-watch
+            uniqueness_gate = None
+            if self.content_watch_api_key:
+                client = ContentWatchClient(self.content_watch_api_key, cache_file=SETTINGS_FILE_PATH.parent / 'uniqueness_cache.db')
+                uniqueness_gate = UniquenessGate(client, min_percent=self.min_uniqueness)
+
             # Создаем экземпляр ArticleGenerator
             generator = ArticleGenerator(
                 self.data_folder,
@@ -44,20 +95,69 @@ class WorkerThread(QThread):
                 self.min_chars,
                 model_name=self.model_name,
                 language=self.language,
-                log_output=self.log_signal.emit
+                progress_callback=self.progress_signal.emit,
+                uniqueness_gate=uniqueness_gate,
+                transcript_source=transcript_source,
+                transcript_condenser=transcript_condenser,
+                store=store,
+                budget=budget,
+                keyword_clustering=self.keyword_clustering
             )
 
             # Создаем экземпляр ImageDownloaderPix
-            image_downloader = ImageDownloaderPix(self.pixabay_api_key, self.output_folder, self.log_signal.emit)
+            # Сообщения генератора и загрузчика попадают в окно через ArticleGeneratorLogger и LogSink
+            image_downloader = ImageDownloaderPix(self.pixabay_api_key, self.output_folder)
 
             # Генерация статей и скачивание изображений с несколькими попытками
-            await generator.generate_article_single_request(image_downloader)
+            if self.publish_immediately:
+                # Каждая готовая статья сразу публикуется с настройками окна WordPress Poster
+                poster = self.create_poster()
+                await PublishingPipeline(generator, poster).run(image_downloader)
+            else:
+                await generator.generate_article_single_request(image_downloader)
 
             self.finished_signal.emit(True)
         except Exception as e:
             error_message = f'Ошибка в процессе генерации: {str(e)}\n{traceback.format_exc()}'
-            self.log_signal.emit(error_message)
+            logging.getLogger('ArticleGeneratorLogger').error(error_message)
             self.finished_signal.emit(False)
+        finally:
+            if client is not None:
+                client.close()
+            if transcript_source is not None:
+                transcript_source.close()
+            if transcript_condenser is not None:
+                transcript_condenser.close()
+            if poster is not None:
+                poster.close()
+            if store is not None:
+                store.close()
+            if budget is not None:
+                budget.close()
+
+    def create_poster(self):
+        """Постер для публикации сразу после генерации: учетные данные и лимиты из settings/settings.json"""
+        settings = {}
+        if POSTER_SETTINGS_FILE_PATH.exists():
+            with open(POSTER_SETTINGS_FILE_PATH, 'r') as file:
+                settings = json.load(file)
+        credentials_file = settings.get('credentials_file', '')
+        if not os.path.isfile(credentials_file):
+            raise FileNotFoundError('Для публикации сразу после генерации укажите файл учетных данных в окне WordPress Poster')
+        return WordPressPoster(
+            os.path.abspath(self.output_folder),
+            credentials_file,
+            settings.get('db_file') or os.path.join(os.getcwd(), "post_tracking.db"),
+            batch_size=int(settings.get('batch_size', 5)),
+            logger=logging.getLogger('ArticleGeneratorLogger'),
+            max_concurrency=int(settings.get('max_concurrency', 20)),
+            max_total_concurrency=int(settings.get('max_total_concurrency', 50)),
+            site_limits=settings.get('site_limits', {}),
+            default_daily_quota=settings.get('default_daily_quota'),
+            http_settings=settings.get('http', {}),
+            batch_publishing=settings.get('batch_publishing', False),
+            packed_store=self.packed_store
+        )
 
     def run(self):
         asyncio.run(self.run_async())
@@ -79,10 +179,16 @@ class MainWindow(QMainWindow):
         self.min_chars = None
         self.pixabay_api_key = ''
         self.num_images = 1
+        self.budgets = None  # Настройки, которые задаются только в файле (см. README)
+        self.model_prices = None
 
         self.layout = QVBoxLayout()
         self.init_ui()
 
+        self.logger = self.setup_logger()
+        self.log_sink = LogSink(self.log_output)
+        self.logger.addHandler(self.log_sink)
+
         container = QWidget()
         container.setLayout(self.layout)
         self.setCentralWidget(container)
@@ -90,6 +196,13 @@ class MainWindow(QMainWindow):
         self.load_settings()
         self.thread = None
 
+    def setup_logger(self):
+        """Полная история генерации пишется в файл, в поле логов попадают только последние строки"""
+        return get_logger('ArticleGeneratorLogger', 'article_generator.log')
+
+    def log(self, message):
+        self.logger.info(message)
+
     def init_ui(self):
         grid_layout = QGridLayout()
 
@@ -140,12 +253,42 @@ class MainWindow(QMainWindow):
         self.num_images_input = QLineEdit()
         self.num_images_input.setPlaceholderText('Введите количество изображений')
 
+        # Необязательная проверка уникальности через content-watch.ru
+        self.content_watch_key_label = QLabel('API ключ content-watch (необязательно):')
+        self.content_watch_key_input = QLineEdit()
+        self.content_watch_key_input.setPlaceholderText('Без ключа уникальность не проверяется')
+        self.min_uniqueness_label = QLabel('Минимальная уникальность, %:')
+        self.min_uniqueness_input = QLineEdit()
+        self.min_uniqueness_input.setPlaceholderText('80')
+
+        # Необязательные субтитры YouTube как материал для статей
+        self.youtube_key_label = QLabel('API ключ YouTube (необязательно):')
+        self.youtube_key_input = QLineEdit()
+        self.youtube_key_input.setPlaceholderText('Без ключа субтитры не используются')
+        self.transcript_language_label = QLabel('Язык субтитров:')
+        self.transcript_language_input = QLineEdit()
+        self.transcript_language_input.setPlaceholderText('en')
+
+        # Почти одинаковые наборы ключевых слов (другой порядок слов, один синоним) дали бы конкурирующие статьи
+        self.clustering_label = QLabel('Похожие наборы ключевых слов:')
+        self.clustering_combo = QComboBox()
+        self.clustering_combo.addItem('Генерировать все', None)
+        self.clustering_combo.addItem('Одна статья на группу', 'representative')
+        self.clustering_combo.addItem('Объединять ключевые слова группы', 'merge')
+
+        self.packed_store_checkbox = QCheckBox('Упакованное хранилище статей (articles.db вместо папок)')
+        self.publish_immediately_checkbox = QCheckBox('Публиковать статьи сразу после генерации (настройки WordPress Poster)')
+
         self.start_button = QPushButton('Запустить генерацию')
         self.start_button.clicked.connect(self.start_process)
 
         self.save_button = QPushButton('Сохранить настройки')
         self.save_button.clicked.connect(self.save_settings)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        self.progress_label = QLabel('')
+
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
 
@@ -182,12 +325,28 @@ class MainWindow(QMainWindow):
         grid_layout.addWidget(self.num_images_label, 9, 0)
         grid_layout.addWidget(self.num_images_input, 9, 1)
 
+        grid_layout.addWidget(self.content_watch_key_label, 10, 0)
+        grid_layout.addWidget(self.content_watch_key_input, 10, 1)
+        grid_layout.addWidget(self.min_uniqueness_label, 11, 0)
+        grid_layout.addWidget(self.min_uniqueness_input, 11, 1)
+
+        grid_layout.addWidget(self.youtube_key_label, 12, 0)
+        grid_layout.addWidget(self.youtube_key_input, 12, 1)
+        grid_layout.addWidget(self.transcript_language_label, 13, 0)
+        grid_layout.addWidget(self.transcript_language_input, 13, 1)
+        grid_layout.addWidget(self.clustering_label, 14, 0)
+        grid_layout.addWidget(self.clustering_combo, 14, 1)
+        grid_layout.addWidget(self.packed_store_checkbox, 15, 0, 1, 2)
+        grid_layout.addWidget(self.publish_immediately_checkbox, 16, 0, 1, 2)
+
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.start_button)
         button_layout.addWidget(self.save_button)
 
         self.layout.addLayout(grid_layout)
         self.layout.addLayout(button_layout)
+        self.layout.addWidget(self.progress_bar)
+        self.layout.addWidget(self.progress_label)
         self.layout.addWidget(QLabel('Логи:', self), alignment=Qt.AlignmentFlag.AlignLeft)
         self.layout.setContentsMargins(5, 5, 5, 5)
         self.layout.addWidget(self.log_output)
@@ -201,7 +360,7 @@ class MainWindow(QMainWindow):
         if file:
             self.api_key_file = os.path.relpath(file)
             self.api_key_path.setText(self.api_key_file)
-            self.log_output.append(f'Выбран файл с API ключом: {self.api_key_file}')
+            self.log(f'Выбран файл с API ключом: {self.api_key_file}')
             QApplication.processEvents()
 
     def select_prompt_file(self):
@@ -209,7 +368,7 @@ class MainWindow(QMainWindow):
         if file:
             self.prompt_file = os.path.relpath(file)
             self.prompt_path.setText(self.prompt_file)
-            self.log_output.append(f'Выбран файл с промптом: {self.prompt_file}')
+            self.log(f'Выбран файл с промптом: {self.prompt_file}')
             QApplication.processEvents()
 
     def select_output_folder(self):
@@ -217,7 +376,7 @@ class MainWindow(QMainWindow):
         if folder:
             self.output_folder = os.path.relpath(folder)
             self.output_folder_path.setText(self.output_folder)
-            self.log_output.append(f'Выбрана папка для сохранения: {self.output_folder}')
+            self.log(f'Выбрана папка для сохранения: {self.output_folder}')
             QApplication.processEvents()
 
     def select_keyword_file(self):
@@ -225,7 +384,7 @@ class MainWindow(QMainWindow):
         if file:
             self.keyword_file = os.path.relpath(file)
             self.keyword_file_path.setText(self.keyword_file)
-            self.log_output.append(f'Выбран файл с ключевыми словами: {self.keyword_file}')
+            self.log(f'Выбран файл с ключевыми словами: {self.keyword_file}')
             QApplication.processEvents()
 
     def save_settings(self):
@@ -239,17 +398,28 @@ class MainWindow(QMainWindow):
             'language': self.language_combo.currentText() if self.language_combo.currentText() != 'Custom' else self.language_input.text(),
             'pixabay_api_key': self.pixabay_api_key_input.text(),
             'num_images': self.num_images_input.text(),
+            'content_watch_api_key': self.content_watch_key_input.text(),
+            'min_uniqueness': self.min_uniqueness_input.text(),
+            'youtube_api_key': self.youtube_key_input.text(),
+            'transcript_language': self.transcript_language_input.text(),
+            'packed_store': self.packed_store_checkbox.isChecked(),
+            'publish_immediately': self.publish_immediately_checkbox.isChecked(),
+            'keyword_clustering': self.clustering_combo.currentData(),
         }
+        # Ключи, которых нет в окне (лимиты токенов, цены моделей), сохраняются как были
+        for key, value in (('budgets', self.budgets), ('model_prices', self.model_prices)):
+            if value:
+                settings[key] = value
         SETTINGS_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
         with open(SETTINGS_FILE_PATH, 'w') as file:
             json.dump(settings, file, indent=4)
-        self.log_output.append('Настройки сохранены')
-        self.log_output.append(f'Сохранённые настройки: {settings}')
+        self.log('Настройки сохранены')
+        self.log(f'Сохранённые настройки: {settings}')
         QApplication.processEvents()
 
     def load_settings(self):
         if SETTINGS_FILE_PATH.exists():
-            self.log_output.append('Загрузка настроек...')
+            self.log('Загрузка настроек...')
             try:
                 with open(SETTINGS_FILE_PATH, 'r') as file:
                     settings = json.load(file)
@@ -276,19 +446,28 @@ class MainWindow(QMainWindow):
 
                     self.pixabay_api_key_input.setText(settings.get('pixabay_api_key', ''))
                     self.num_images_input.setText(settings.get('num_images', '1'))
-
-                    self.log_output.append(f'Загруженные настройки: {settings}')
+                    self.content_watch_key_input.setText(settings.get('content_watch_api_key', ''))
+                    self.min_uniqueness_input.setText(settings.get('min_uniqueness', ''))
+                    self.youtube_key_input.setText(settings.get('youtube_api_key', ''))
+                    self.transcript_language_input.setText(settings.get('transcript_language', ''))
+                    self.packed_store_checkbox.setChecked(settings.get('packed_store', False))
+                    self.publish_immediately_checkbox.setChecked(settings.get('publish_immediately', False))
+                    self.clustering_combo.setCurrentIndex(max(self.clustering_combo.findData(settings.get('keyword_clustering')), 0))
+                    self.budgets = settings.get('budgets')
+                    self.model_prices = settings.get('model_prices')
+
+                    self.log(f'Загруженные настройки: {settings}')
             except Exception as e:
                 error_message = f'Ошибка загрузки настроек: {str(e)}\n{traceback.format_exc()}'
-                self.log_output.append(error_message)
+                self.log(error_message)
                 QApplication.processEvents()
         else:
-            self.log_output.append('Файл настроек не найден. Используются настройки по умолчанию.')
+            self.log('Файл настроек не найден. Используются настройки по умолчанию.')
             QApplication.processEvents()
 
     def start_process(self):
         if not self.api_key_file or not self.output_folder or not self.prompt_file or not self.keyword_file or not self.min_chars_input.text() or not self.pixabay_api_key_input.text():
-            self.log_output.append('Пожалуйста, выберите необходимые файлы, папки, введите минимальное количество символов и API ключ для Pixabay')
+            self.log('Пожалуйста, выберите необходимые файлы, папки, введите минимальное количество символов и API ключ для Pixabay')
             return
 
         try:
@@ -297,29 +476,47 @@ class MainWindow(QMainWindow):
             language = self.language_combo.currentText() if self.language_combo.currentText() != 'Custom' else self.language_input.text()
             pixabay_api_key = self.pixabay_api_key_input.text()
             num_images = int(self.num_images_input.text()) if self.num_images_input.text() else 1
-
-            self.thread = WorkerThread(self.keyword_file, self.api_key_file, self.output_folder, self.prompt_file, min_chars, model_name, language, pixabay_api_key, num_images)
-            self.thread.log_signal.connect(self.log_output.append)
+            content_watch_api_key = self.content_watch_key_input.text().strip()
+            min_uniqueness = float(self.min_uniqueness_input.text()) if self.min_uniqueness_input.text() else 80.0
+
+            self.thread = WorkerThread(self.keyword_file, self.api_key_file, self.output_folder, self.prompt_file, min_chars, model_name, language, pixabay_api_key, num_images,
+                                       content_watch_api_key=content_watch_api_key, min_uniqueness=min_uniqueness,
+                                       youtube_api_key=self.youtube_key_input.text().strip(),
+                                       transcript_language=self.transcript_language_input.text().strip() or 'en',
+                                       packed_store=self.packed_store_checkbox.isChecked(),
+                                       budgets=self.budgets, model_prices=self.model_prices,
+                                       keyword_clustering=self.clustering_combo.currentData(),
+                                       publish_immediately=self.publish_immediately_checkbox.isChecked())
             self.thread.finished_signal.connect(self.on_process_finished)
+            self.thread.progress_signal.connect(self.update_progress)
+            self.progress_bar.setValue(0)
+            self.progress_label.setText('')
             self.thread.start()
 
             self.start_button.setEnabled(False)
         except Exception as e:
             error_message = f'Ошибка при запуске процесса: {str(e)}\n{traceback.format_exc()}'
-            self.log_output.append(error_message)
+            self.log(error_message)
             QApplication.processEvents()
 
+    def update_progress(self, event):
+        self.progress_bar.setMaximum(max(event.queued, 1))
+        self.progress_bar.setValue(event.processed)
+        self.progress_label.setText(event.summary())
+
     def on_process_finished(self, success):
         if success:
-            self.log_output.append('Процесс завершен успешно')
+            self.log('Процесс завершен успешно')
         else:
-            self.log_output.append('Процесс завершился с ошибкой')
+            self.log('Процесс завершился с ошибкой')
         self.start_button.setEnabled(True)
         QApplication.processEvents()
 
     def closeEvent(self, event):
         if self.thread is not None and self.thread.isRunning():
             self.thread.wait()
+        self.logger.removeHandler(self.log_sink)
+        self.log_sink.close()
         event.accept()
 
 
@@ -5,13 +5,23 @@ import aiohttp
 import asyncio
 import sqlite3
 import logging
+import threading
+import contextlib
 from pathlib import Path
 from openai import OpenAI
 import urllib.parse  # Добавляем импорт urllib для работы с кодировкой URL
 import csv
+from Common.progress import ProgressTracker
+from Common.article_store import FolderArticleStore
+from ArticleGenerator.token_budget import THROTTLE, STOP
+from ArticleGenerator.keyword_clusters import KeywordClusterer
+from ArticleGenerator.integration_api_youtube.transcript_condenser import CHARS_PER_TOKEN
 
 class ArticleGenerator:
-    def __init__(self, data_folder, api_key_file, output_folder, prompt_file, min_chars, model_name="gpt-4o-mini", language="English", log_output=None):
+    def __init__(self, data_folder, api_key_file, output_folder, prompt_file, min_chars, model_name="gpt-4o-mini", language="English", log_output=None,
+                 progress_callback=None, logger=None, uniqueness_gate=None, max_pending_checks=20,
+                 transcript_source=None, transcript_lookahead=8, transcript_condenser=None, store=None,
+                 budget=None, keyword_clustering=None, cluster_threshold=0.7, article_sink=None):
         self.data_folder = Path(data_folder).resolve()
         self.api_key_file = Path(api_key_file).resolve()
         self.output_folder = Path(output_folder).resolve()
@@ -20,14 +30,47 @@ class ArticleGenerator:
         self.model_name = model_name
         self.language = language
         self.log_output = log_output
+        self.logger = logger or logging.getLogger('ArticleGeneratorLogger')
+        # Прогресс для окна: наборы ключевых слов в очереди, готовые и неудачные статьи, потраченные токены
+        self.progress = ProgressTracker(progress_callback)
+        # Необязательная проверка уникальности (UniquenessGate) между выбором текста и сохранением
+        self.uniqueness_gate = uniqueness_gate
+        self.max_pending_checks = max_pending_checks
+        self._image_lock = asyncio.Lock()
+        # Необязательный источник субтитров YouTube (TranscriptSource) как материал для статьи;
+        # субтитры запрашиваются заранее для transcript_lookahead следующих наборов ключевых слов
+        self.transcript_source = transcript_source
+        self.transcript_lookahead = transcript_lookahead
+        # Необязательное сжатие длинных субтитров до бюджета токенов (TranscriptCondenser)
+        self.transcript_condenser = transcript_condenser
+        # Хранилище статей: по умолчанию папки сайтов и статей, либо упакованное (PackedArticleStore)
+        self.store = store or FolderArticleStore(self.output_folder)
+
+        # Статичная часть запроса (роль, язык и общий промпт) идет первой и одинакова для всех статей,
+        # поэтому провайдер может кэшировать ее префикс; ключевые слова и субтитры - в сообщении пользователя
+        self.system_message = None
+        self.prompt_tokens = 0
+        self.cached_tokens = 0  # Токены промпта, которые провайдер взял из своего кэша
+        self._usage_lock = threading.Lock()
+        # Необязательные лимиты токенов и стоимости на запуск, ключ и сайт (TokenBudget)
+        self.budget = budget
+        self.current_api_key = None
+        # Группировка почти одинаковых наборов ключевых слов до генерации:
+        # None - выключена, 'representative' - одна статья на группу, 'merge' - ключевые слова группы объединяются
+        self.keyword_clustering = keyword_clustering
+        self.cluster_threshold = cluster_threshold
+        # Необязательный приемник готовых статей: корутина (site, article), которую save_article ждет после
+        # записи статьи с изображениями; пока она не завершилась, следующая статья не генерируется
+        self.article_sink = article_sink
 
         self.api_keys = self.load_api_keys()
         self.current_key_index = 0
 
-    def log(self, message):
-        if self.log_output:
+    def log(self, message, level=logging.INFO, **fields):
+        """Запись в лог генератора; fields попадают в строку лога как key=value"""
+        self.logger.log(level, message, extra={'fields': fields} if fields else None)
+        if self.log_output and level >= logging.INFO:
             self.log_output(message)
-        print(message)
 
     def load_api_keys(self):
         if not self.api_key_file.exists():
@@ -38,9 +81,60 @@ class ArticleGenerator:
         return keys
 
     def set_GPT(self):
-        self.client = OpenAI(api_key=self.next_api_key())
+        self.current_api_key = self.next_api_key()
+        self.client = OpenAI(api_key=self.current_api_key)
         self.log(f'Set GPT model to {self.model_name}')
 
+    def switch_api_key(self):
+        """Переключается на следующий ключ, лимит которого не исчерпан; False, если таких нет"""
+        for _ in range(len(self.api_keys) - 1):
+            api_key = self.next_api_key()
+            if self.budget.check(api_key=api_key)[0] != STOP:
+                self.current_api_key = api_key
+                self.client = OpenAI(api_key=api_key)
+                return True
+        return False
+
+    async def wait_for_budget(self, site, throttled):
+        """Проверяет лимиты перед статьей: None - можно генерировать, иначе исчерпанная область ('site' или 'run').
+
+        При приближении к лимиту ждет budget.throttle_delay секунд; throttled - области,
+        о замедлении которых уже сообщалось.
+        """
+        while True:
+            state, scope = self.budget.check(api_key=self.current_api_key, site=site)
+            if state == THROTTLE:
+                if (scope, site) not in throttled:
+                    throttled.add((scope, site))
+                    target = f"site '{site}'" if scope == 'site' else scope.replace('_', ' ')
+                    self.log(f"Token budget for {target} is almost spent, slowing down generation", logging.WARNING,
+                             site=site, spent=self.budget.summary())
+                await asyncio.sleep(self.budget.throttle_delay)
+                return None
+            if state != STOP:
+                return None
+            if scope == 'api_key':
+                if self.switch_api_key():
+                    self.log("Token budget of the API key is spent, switched to the next key", logging.WARNING)
+                    continue
+                scope = 'run'
+                self.log("Token budgets of all API keys are spent", logging.ERROR)
+            return scope
+
+    def record_usage(self, usage, site=None):
+        """Учет usage ответа: прогресс, счетчики кэша промптов и лимиты; вызывается и из потоков"""
+        if not usage:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', None) or 0) if details else 0
+        with self._usage_lock:
+            self.prompt_tokens += usage.prompt_tokens
+            self.cached_tokens += cached_tokens
+        self.progress.add(tokens_used=usage.total_tokens, cached_tokens=cached_tokens)
+        cost = self.budget.record(self.model_name, usage, api_key=self.current_api_key, site=site) if self.budget else None
+        self.log("Chat completion usage", logging.DEBUG, prompt_tokens=usage.prompt_tokens,
+                 cached_tokens=cached_tokens, completion_tokens=usage.completion_tokens, cost=cost, site=site)
+
     def clean_text(self, text):
         return re.sub(r'[^a-zA-Zа-яА-Я0-9\s.,!?\'"()\-–:;]', '', text)
 
@@ -51,57 +145,157 @@ class ArticleGenerator:
     def remove_content_after_trigger(self, text, trigger="---"):
         trigger_index = text.find(trigger)
         if trigger_index != -1:
-            self.log(f"Trigger '{trigger}' found. Removing content after it.")
+            self.log(f"Trigger '{trigger}' found. Removing content after it.", logging.DEBUG)
             return text[:trigger_index].strip()
         return text
 
-    async def generate_article_single_request(self, image_downloader):
+    async def generate_article_single_request(self, image_downloader, session=None):
+        """Генерация по всем наборам ключевых слов; session - общая HTTP-сессия, если запуск делит ее с постером"""
         try:
             self.set_GPT()
-            prompt = self.read_prompt()
+            self.system_message = self.build_system_message(self.read_prompt())
             keywords_data = self.read_keywords(self.data_folder)
+            if self.keyword_clustering:
+                keywords_data = self.cluster_keywords(keywords_data)
             min_required_chars = int(self.min_chars * 0.6)
+            self.progress.add(queued=sum(len(keywords_sets) for keywords_sets in keywords_data.values()))
+
+            items = [(site, keywords) for site, keywords_sets in keywords_data.items() for keywords in keywords_sets]
+            transcripts = {}  # Индекс набора ключевых слов -> задача получения субтитров
+
+            def prefetch_transcripts(start):
+                for idx in range(start, min(start + self.transcript_lookahead, len(items))):
+                    if idx not in transcripts:
+                        query = ', '.join(items[idx][1][:3])
+                        transcripts[idx] = asyncio.ensure_future(self.prepare_transcript(query))
+
+            async with (aiohttp.ClientSession() if session is None else contextlib.nullcontext(session)) as session:
+                pending = set()
+                stopped_sites = set()  # Сайты, лимит которых исчерпан
+                throttled = set()
+                try:
+                    for idx, (site, keywords) in enumerate(items):
+                        if site in stopped_sites:
+                            self.progress.add(skipped=1)
+                            continue
+                        if self.budget is not None:
+                            exhausted = await self.wait_for_budget(site, throttled)
+                            if exhausted == 'site':
+                                self.log(f"Token budget for site '{site}' is spent, skipping its remaining keyword sets",
+                                         logging.WARNING, site=site, spent=self.budget.summary())
+                                stopped_sites.add(site)
+                                self.progress.add(skipped=1)
+                                continue
+                            if exhausted == 'run':
+                                self.log("Token budget is spent, generation stopped", logging.ERROR, spent=self.budget.summary())
+                                self.progress.add(skipped=len(items) - idx)
+                                break
 
-            async with aiohttp.ClientSession() as session:
-                for site, keywords_sets in keywords_data.items():
-                    for keywords in keywords_sets:
-                        self.log(f"Generating article for site '{site}' with keywords: {keywords}")
-                        first_keywords = ' '.join(keywords[:3])
-                        sanitized_keywords = self.sanitize_filename(first_keywords, max_length=30)
-
-                        site_folder = os.path.join(self.output_folder, site)
-                        os.makedirs(site_folder, exist_ok=True)
-
+                        self.log(f"Generating article for site '{site}' with keywords: {keywords}", site=site)
                         keyword_string = ', '.join(keywords)
-                        prompt_with_keywords = f"{prompt}\nInclude the following keywords: {keyword_string}\nGenerate content according to the following parameters."
-
-                        max_tokens = min(int(self.min_chars / 5), 4096)
-                        formatted_article = self.generate_article_with_retries(prompt_with_keywords, min_required_chars, max_tokens)
+                        prompt_with_keywords = f"Include the following keywords: {keyword_string}\nGenerate content according to the following parameters."
 
-                        if formatted_article:
-                            headline_folder = os.path.join(site_folder, sanitized_keywords)
-                            os.makedirs(headline_folder, exist_ok=True)
+                        if self.transcript_source is not None:
+                            prefetch_transcripts(idx)
+                            transcript = await transcripts.pop(idx)
+                            if transcript:
+                                prompt_with_keywords += f"\nUse the following video transcript as source material:\n{transcript}"
 
-                            output_file = os.path.join(headline_folder, "article.txt")
-                            with open(output_file, 'w', encoding='utf-8') as file:
-                                file.write(formatted_article)
-
-                            self.log(f"Article saved to {output_file}")
-                            await image_downloader.download_random_image(session, keywords, headline_folder)
+                        max_tokens = min(int(self.min_chars / 5), 4096)
+                        if self.uniqueness_gate is None and self.article_sink is None and self.transcript_source is None:
+                            formatted_article = self.generate_article_with_retries(prompt_with_keywords, min_required_chars, max_tokens,
+                                                                                   site=site)
+                        else:
+                            # Генерация уходит в поток, чтобы фоновые проверки уникальности, публикация, а также
+                            # предзагрузка и сжатие субтитров следующих наборов шли одновременно с ней
+                            formatted_article = await asyncio.to_thread(
+                                self.generate_article_with_retries, prompt_with_keywords, min_required_chars, max_tokens, site=site)
+
+                        if not formatted_article:
+                            self.progress.add(failed=1)
+                        elif self.uniqueness_gate is None:
+                            await self.save_article(session, image_downloader, site, keywords, formatted_article)
+                        else:
+                            while len(pending) >= self.max_pending_checks:
+                                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                            pending.add(asyncio.create_task(
+                                self.check_and_save(session, image_downloader, site, keywords, formatted_article)))
+                finally:
+                    for task in transcripts.values():
+                        task.cancel()
+                    if pending:
+                        await asyncio.gather(*pending)
 
         except Exception as e:
-            self.log(f"Error generating article: {e}")
+            self.log(f"Error generating article: {e}", logging.ERROR)
+        finally:
+            if self.prompt_tokens:
+                self.log(f"Prompt cache: {self.cached_tokens} of {self.prompt_tokens} prompt tokens served from cache "
+                         f"({self.cached_tokens / self.prompt_tokens:.0%})", prompt_tokens=self.prompt_tokens,
+                         cached_tokens=self.cached_tokens)
+            if self.budget is not None:
+                self.log(f"Spent in this run: {self.budget.summary()}")
+            self.progress.finish()
+
+    def build_system_message(self, prompt):
+        """Неизменная за запуск часть запроса: должна совпадать байт в байт, чтобы попадать в кэш провайдера"""
+        return f"You are an expert in generating SEO-optimized articles in {self.language}.\n\n{prompt}"
+
+    async def prepare_transcript(self, query):
+        """Субтитры для набора ключевых слов, при наличии сжатия - уже сжатые до бюджета"""
+        transcript = await self.transcript_source.get_transcript_by_keyword(query)
+        if not transcript or self.transcript_condenser is None:
+            return transcript
+        try:
+            return await self.transcript_condenser.condense(self.client, self.model_name, transcript,
+                                                            on_usage=self.record_usage)
+        except Exception as e:
+            # Без сжатия длинные субтитры не помещаются в промпт, поэтому они обрезаются до бюджета
+            self.log(f"Error condensing transcript for '{query}': {e}", logging.WARNING)
+            return transcript[:self.transcript_condenser.budget_tokens * CHARS_PER_TOKEN]
+
+    async def save_article(self, session, image_downloader, site, keywords, formatted_article):
+        first_keywords = ' '.join(keywords[:3])
+        article = self.sanitize_filename(first_keywords, max_length=30)
+        location = self.store.save_text(site, article, formatted_article)
+
+        self.log(f"Article saved to {location}", site=site, chars=len(formatted_article))
+        # Загрузчик сверяет теги с CSV перед записью, поэтому изображения скачиваются по одной статье
+        async with self._image_lock:
+            await image_downloader.download_random_image(
+                session, keywords, None, save_image=lambda filename, data: self.store.save_image(site, article, filename, data))
+        self.store.complete(site, article)
+        self.progress.add(done=1)
+        if self.article_sink is not None:
+            await self.article_sink(site, article)
+
+    async def check_and_save(self, session, image_downloader, site, keywords, formatted_article):
+        """Фоновая задача: проверка уникальности и сохранение прошедшего проверку текста"""
+        try:
+            passed, percent = await self.uniqueness_gate.check(session, formatted_article)
+            if not passed:
+                self.log(f"Article for keywords {keywords} rejected: uniqueness {percent}% is below "
+                         f"{self.uniqueness_gate.min_percent}%", logging.WARNING, site=site, percent=percent)
+                self.progress.add(failed=1)
+                return
+            self.log(f"Uniqueness check passed for keywords {keywords}", logging.DEBUG, site=site, percent=percent)
+            await self.save_article(session, image_downloader, site, keywords, formatted_article)
+        except Exception as e:
+            self.log(f"Error saving article for keywords {keywords}: {e}", logging.ERROR, site=site)
+            self.progress.add(failed=1)
 
-    def generate_article_with_retries(self, prompt_with_keywords, min_required_chars, max_tokens, retry_count=2):
+    def generate_article_with_retries(self, prompt_with_keywords, min_required_chars, max_tokens, retry_count=2, site=None):
         generated_texts = []
         for attempt in range(retry_count):
             response = self.client.chat.completions.create(
                 model=self.model_name,
-                messages=[{"role": "system", "content": f"You are an expert in generating SEO-optimized articles in {self.language}."},
+                messages=[{"role": "system", "content": self.system_message or self.build_system_message(self.read_prompt())},
                         {"role": "user", "content": prompt_with_keywords}],
                 max_tokens=max_tokens
             )
 
+            self.record_usage(response.usage, site)
+
             result = response.choices[0].message.content
             cleaned_article = self.clean_text(result)
             
@@ -112,7 +306,7 @@ class ArticleGenerator:
                 generated_texts.append(truncated_article)
                 self.log(f"Generated article {attempt + 1} meets minimum character requirement: {len(truncated_article)} characters.")
             else:
-                self.log(f"Generated article {attempt + 1} too short, retrying...")
+                self.log(f"Generated article {attempt + 1} too short, retrying...", logging.WARNING)
 
         unique_text = self.get_most_unique_text(generated_texts)
         return unique_text
@@ -132,17 +326,33 @@ class ArticleGenerator:
         keywords = {}
         self.log(f"Reading keywords from file: {keyword_file}")
         for idx, line in enumerate(lines):
-            self.log(f"Processing line {idx + 1}: {line.strip()}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.log(f"Processing line {idx + 1}: {line.strip()}", logging.DEBUG)
             parts = line.strip().split('|')
             if len(parts) == 2:
                 site = parts[0].strip()
                 keywords_list = [kw.strip() for kw in parts[1].split(',')]
                 keywords.setdefault(site, []).append(keywords_list)
             else:
-                self.log(f"Skipping line {idx + 1} due to incorrect format: {line.strip()}")
+                self.log(f"Skipping line {idx + 1} due to incorrect format: {line.strip()}", logging.WARNING)
         self.log(f'Parsed {len(keywords)} unique sites with keywords from file.')
         return keywords
 
+    def cluster_keywords(self, keywords_data):
+        """Оставляет по одному набору ключевых слов на группу почти одинаковых и сообщает, сколько генераций сэкономлено"""
+        clusterer = KeywordClusterer(threshold=self.cluster_threshold)
+        reduced, report = clusterer.reduce(keywords_data, merge=self.keyword_clustering == 'merge')
+        before = sum(len(keyword_sets) for keyword_sets in keywords_data.values())
+        after = sum(len(keyword_sets) for keyword_sets in reduced.values())
+        for site, groups in report.items():
+            for chosen, group in groups:
+                self.log(f"Similar keyword sets for '{site}' grouped into {chosen}: {group}", logging.DEBUG, site=site)
+            self.log(f"Site '{site}': {sum(len(group) for _, group in groups)} keyword sets grouped into {len(groups)}",
+                     site=site)
+        self.log(f"Keyword clustering: {before} keyword sets -> {after} articles, saved {before - after} generations",
+                 keyword_sets=before, articles=after, saved=before - after)
+        return reduced
+
     def read_prompt(self):
         with open(self.prompt_file, 'r', encoding='utf-8') as file:
             return file.read().strip()
@@ -152,15 +362,17 @@ class ArticleGenerator:
             raise ValueError("No API keys available.")
         key = self.api_keys[self.current_key_index]
         self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        self.log(f'Switching to API key {self.current_key_index}')
+        self.log(f'Switching to API key {self.current_key_index}', logging.DEBUG)
         return key
 
 
 class ImageDownloaderPix:
-    def __init__(self, api_key, base_image_path, log_function=None):
+    def __init__(self, api_key, base_image_path, log_function=None, api_url='https://pixabay.com/api/', logger=None):
         self.api_key = api_key
+        self.api_url = api_url  # Адрес API Pixabay (можно подменить локальным сервисом)
         self.base_image_path = base_image_path
-        self.log_function = log_function or print
+        self.log_function = log_function
+        self.logger = logger or logging.getLogger('ArticleGeneratorLogger')
         self.max_retries = 3  # Количество повторных попыток
         self.delay = 5  # Задержка между запросами
         self.csv_file = os.path.join('settings', 'downloaded_images.csv')  # Путь к CSV-файлу в папке settings
@@ -183,16 +395,22 @@ class ImageDownloaderPix:
                 writer = csv.writer(f)
                 writer.writerow(['query', 'filename', 'url'])  # Заголовки для файла CSV
 
+    def log(self, message, level=logging.INFO, **fields):
+        """Запись в лог генератора; полные ответы API пишутся только на уровне DEBUG"""
+        self.logger.log(level, message, extra={'fields': fields} if fields else None)
+        if self.log_function and level >= logging.INFO:
+            self.log_function(message)
+
     def get_random_user_agent(self):
         """Возвращает случайный User-Agent из списка."""
         return random.choice(self.user_agents)
 
     def image_already_downloaded(self, image_tags):
         """Проверяет, были ли изображения уже загружены по тегам"""
-        self.log_function(f"Checking if image with tags '{image_tags}' has already been downloaded.")
+        self.log(f"Checking if image with tags '{image_tags}' has already been downloaded.", logging.DEBUG)
         
         if not os.path.exists(self.csv_file):
-            self.log_function("CSV file does not exist. Proceeding with download.")
+            self.log("CSV file does not exist. Proceeding with download.", logging.DEBUG)
             return False
 
         with open(self.csv_file, 'r', encoding='utf-8') as f:
@@ -201,68 +419,71 @@ class ImageDownloaderPix:
             for row in reader:
                 # Проверяем, что строка содержит достаточно колонок
                 if len(row) < 4:
-                    self.log_function(f"Invalid row format in CSV: {row}, skipping...")
+                    self.log(f"Invalid row format in CSV: {row}, skipping...", logging.WARNING)
                     continue
                 
                 # Сравниваем теги (четвертая колонка в CSV)
                 if row[3] == image_tags:
-                    self.log_function(f"Image with tags '{image_tags}' already downloaded.")
+                    self.log(f"Image with tags '{image_tags}' already downloaded.", logging.DEBUG)
                     return True  # Изображение с такими тегами уже загружено
-        self.log_function(f"Image with tags '{image_tags}' has not been downloaded yet.")
+        self.log(f"Image with tags '{image_tags}' has not been downloaded yet.", logging.DEBUG)
         return False
 
 
     def write_to_csv(self, query, filename, image_url, image_tags, image_type):
         """Записывает информацию об изображении в CSV файл."""
-        self.log_function(f"Writing image data to CSV: {self.csv_file} | Query: {query}, Filename: {filename}, URL: {image_url}, Tags: {image_tags}, Type: {image_type}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.log(f"Writing image data to CSV: {self.csv_file} | Query: {query}, Filename: {filename}, URL: {image_url}, Tags: {image_tags}, Type: {image_type}", logging.DEBUG)
         
         with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow([query, filename, image_url, image_tags, image_type])
-        self.log_function(f"Successfully wrote image data to CSV.")
+        self.log(f"Successfully wrote image data to CSV.", logging.DEBUG)
 
 
-    async def download_images_for_keyword(self, session, keyword, output_folder):
+    async def download_images_for_keyword(self, session, keyword, output_folder, save_image=None):
         """Загружает изображения для заданного ключевого слова"""
-        self.log_function(f"Starting image search for keyword: {keyword}")
+        self.log(f"Starting image search for keyword: {keyword}")
         
         encoded_keyword = urllib.parse.quote(keyword)
-        url = f'https://pixabay.com/api/?key={self.api_key}&q={encoded_keyword}&per_page=5'
+        url = f'{self.api_url}?key={self.api_key}&q={encoded_keyword}&per_page=5'
 
         for attempt in range(self.max_retries):
             try:
                 user_agent = self.get_random_user_agent()
-                self.log_function(f"Requesting images for keyword: {keyword} (Attempt {attempt + 1}) with User-Agent: {user_agent}")
+                self.log(f"Requesting images for keyword: {keyword} (Attempt {attempt + 1}) with User-Agent: {user_agent}", logging.DEBUG)
 
                 headers = {'User-Agent': user_agent}
 
                 async with session.get(url, headers=headers) as response:
-                    self.log_function(f"Received response with status code: {response.status}")
+                    self.log(f"Received response with status code: {response.status}", logging.DEBUG)
                     
                     if response.status == 502:
-                        self.log_function(f"Received 502 Bad Gateway. Retrying in {self.delay} seconds...")
+                        self.log(f"Received 502 Bad Gateway. Retrying in {self.delay} seconds...", logging.WARNING)
                         await asyncio.sleep(self.delay)
                         continue
 
                     if response.status == 429:
-                        self.log_function(f"Received 429 Too Many Requests. Waiting for 10 seconds...")
+                        self.log(f"Received 429 Too Many Requests. Waiting for 10 seconds...", logging.WARNING)
                         await asyncio.sleep(10)
                         continue
 
                     response.raise_for_status()
                     data = await response.json()
 
-                    self.log_function(f"Received data: {data}")
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.log(f"Received data: {data}", logging.DEBUG)
                     
                     # Проверяем, что полученные данные содержат ключ 'hits' и что там есть результаты
                     if 'hits' in data and isinstance(data['hits'], list):
                         if len(data['hits']) == 0:
-                            self.log_function(f"No images found for keyword: {keyword}.")
+                            self.log(f"No images found for keyword: {keyword}.")
                             return False
 
                         for hit in data['hits']:
                             # Логируем полный 'hit', чтобы точно видеть данные
-                            self.log_function(f"Processing hit: {hit}")
+                            if self.logger.isEnabledFor(logging.DEBUG):
+                                self.log(f"Processing hit: {hit}", logging.DEBUG)
 
                             image_tags = hit.get('tags', None)  # Безопасно получаем теги
                             image_url = hit.get('largeImageURL', None)  # Безопасно получаем URL
@@ -270,72 +491,81 @@ class ImageDownloaderPix:
 
                             # Проверяем, чтобы теги и URL были корректными
                             if not image_tags or not image_url:
-                                self.log_function("Missing image tags or URL, skipping this hit...")
+                                self.log("Missing image tags or URL, skipping this hit...", logging.DEBUG)
                                 continue
 
                             # Проверяем, были ли изображения с такими тегами уже загружены
                             if not self.image_already_downloaded(image_tags):
-                                await self.download_image(session, image_url, output_folder, keyword, image_tags, image_type)
+                                await self.download_image(session, image_url, output_folder, keyword, image_tags, image_type,
+                                                          save_image=save_image)
                                 return True  # Успешно скачали изображение
-                        self.log_function(f"All images for keyword '{keyword}' are already downloaded by tags.")
+                        self.log(f"All images for keyword '{keyword}' are already downloaded by tags.")
                         return False
                     else:
-                        self.log_function(f"No valid 'hits' found in the response for keyword: {keyword}. Data received: {data}")
+                        self.log(f"No valid 'hits' found in the response for keyword: {keyword}", logging.WARNING)
+                        if self.logger.isEnabledFor(logging.DEBUG):
+                            self.log(f"Data received: {data}", logging.DEBUG)
                         return False
             except aiohttp.ClientError as e:
-                self.log_function(f"Network error occurred: {e}. Retrying in {self.delay} seconds...")
+                self.log(f"Network error occurred: {e}. Retrying in {self.delay} seconds...", logging.WARNING)
                 await asyncio.sleep(self.delay)
             except Exception as e:
-                self.log_function(f"Unexpected error occurred: {e}")
+                self.log(f"Unexpected error occurred: {e}", logging.ERROR)
                 break
         return False
 
 
-    async def download_image(self, session, image_url, output_folder, keyword, image_tags, image_type):
-        """Загружает изображение и сохраняет его с именем, включающим ключевое слово"""
-        self.log_function(f"Starting download for image with tags '{image_tags}' from URL: {image_url}")
+    async def download_image(self, session, image_url, output_folder, keyword, image_tags, image_type, save_image=None):
+        """Загружает изображение и сохраняет его с именем, включающим ключевое слово.
+
+        save_image(filename, data) - запись в хранилище статей вместо файла в output_folder.
+        """
+        self.log(f"Starting download for image with tags '{image_tags}' from URL: {image_url}", logging.DEBUG)
         
         random_number = random.randint(1000, 9999)
         image_extension = os.path.splitext(image_url)[1]  # Получаем расширение файла (например, .jpg, .png)
         image_filename = f"{keyword}_{random_number}{image_extension}"  # Формируем имя файла
-        image_path = os.path.join(output_folder, image_filename)
+        image_path = os.path.join(output_folder, image_filename) if output_folder else image_filename
 
         try:
             async with session.get(image_url) as response:
-                self.log_function(f"Downloading image: {image_filename}")
+                self.log(f"Downloading image: {image_filename}", logging.DEBUG)
                 response.raise_for_status()
                 image_data = await response.read()
-                with open(image_path, 'wb') as image_file:
-                    image_file.write(image_data)
-                self.log_function(f"Image saved: {image_path}")
+                if save_image is not None:
+                    image_path = save_image(image_filename, image_data)
+                else:
+                    with open(image_path, 'wb') as image_file:
+                        image_file.write(image_data)
+                self.log(f"Image saved: {image_path}")
 
                 # Сохраняем информацию об изображении в CSV, включая URL
                 self.write_to_csv(keyword, image_filename, image_url, image_tags, image_type)
-                self.log_function(f"Image information saved to CSV: {self.csv_file}")
+                self.log(f"Image information saved to CSV: {self.csv_file}", logging.DEBUG)
         except aiohttp.ClientError as e:
-            self.log_function(f"Failed to download image {image_filename}: {e}")
+            self.log(f"Failed to download image {image_filename}: {e}", logging.ERROR)
         except Exception as e:
-            self.log_function(f"Unexpected error during image download: {e}")
+            self.log(f"Unexpected error during image download: {e}", logging.ERROR)
 
 
 
-    async def download_random_image(self, session, keywords, output_folder):
+    async def download_random_image(self, session, keywords, output_folder, save_image=None):
         """Пытается загрузить изображение для каждого ключевого слова, пока не найдет новое изображение"""
         if not keywords:
-            self.log_function("No keywords provided, skipping image download.")
+            self.log("No keywords provided, skipping image download.", logging.WARNING)
             return
         
         # Пробегаем по каждому ключевому слову
         for keyword in keywords:
-            self.log_function(f"Trying to download images for keyword: {keyword}")
+            self.log(f"Trying to download images for keyword: {keyword}", logging.DEBUG)
             
             # Пытаемся загрузить изображение для ключевого слова
-            success = await self.download_images_for_keyword(session, keyword, output_folder)
+            success = await self.download_images_for_keyword(session, keyword, output_folder, save_image=save_image)
             
             if success:
-                self.log_function(f"Successfully downloaded an image for keyword: {keyword}")
+                self.log(f"Successfully downloaded an image for keyword: {keyword}")
                 return  # Успешно скачали изображение, выходим из функции
 
         # Если для всех ключевых слов изображения уже загружены или произошли ошибки
-        self.log_function("All images for all keywords are already downloaded or no suitable images found.")
+        self.log("All images for all keywords are already downloaded or no suitable images found.", logging.WARNING)
 
@@ -0,0 +1,160 @@
+import random
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import aiohttp
+
+API_URL = 'https://content-watch.ru/public/api/'
+
+
+class ContentWatchError(Exception):
+    """Ошибка, которую вернул сам API (неверный ключ, нулевой баланс, ответ не в формате API и т.п.) - повтор не поможет"""
+
+
+class ContentWatchClient:
+    """Асинхронный клиент API content-watch.ru для проверки уникальности текстов.
+
+    Запросы идут через переданную общую aiohttp-сессию, одновременно выполняется не больше
+    max_concurrency проверок. Сетевые ошибки, 429 и 5xx повторяются с экспоненциальной
+    задержкой. Результаты кэшируются по SHA-256 текста: в памяти и, если указан cache_file,
+    в SQLite, поэтому повторная проверка того же текста не тратит баланс. Одновременные
+    проверки одинакового текста объединяются в один запрос.
+    """
+
+    def __init__(self, api_key, api_url=API_URL, max_concurrency=5, max_retries=3, retry_base_delay=1.0,
+                 retry_max_delay=30, cache_file=None, logger=None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.logger = logger or logging.getLogger('ArticleGeneratorLogger')
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache = {}  # text_hash -> ответ API
+        self._in_flight = {}  # text_hash -> задача, проверяющая текст прямо сейчас
+
+        self.conn = None
+        if cache_file:
+            self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS uniqueness_cache (
+                                    text_hash TEXT PRIMARY KEY,
+                                    percent REAL,
+                                    checked_at TEXT
+                                )''')
+            self.conn.commit()
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def cached_percent(self, text_hash):
+        if text_hash in self._cache:
+            return float(self._cache[text_hash].get('percent', 0))
+        if self.conn is not None:
+            row = self.conn.execute("SELECT percent FROM uniqueness_cache WHERE text_hash = ?", (text_hash,)).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    async def request(self, session, payload):
+        """POST к API с ограничением одновременных запросов и повторами; возвращает ответ API"""
+        payload = {'key': self.api_key, **payload}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self._semaphore:
+                try:
+                    async with session.post(self.api_url, data=payload) as response:
+                        if response.status == 200:
+                            try:
+                                result = await response.json(content_type=None)
+                            except (aiohttp.ContentTypeError, ValueError) as e:
+                                raise ContentWatchError(f"ответ не в формате JSON: {e}") from e
+                            if not isinstance(result, dict):
+                                raise ContentWatchError(f"неожиданный ответ: {str(result)[:200]}")
+                            if result.get('error'):
+                                raise ContentWatchError(result['error'])
+                            return result
+                        if response.status != 429 and response.status < 500:
+                            raise ContentWatchError(f"HTTP {response.status}")
+                        header = response.headers.get('Retry-After')
+                        retry_after = int(header) if header and header.isdigit() else None
+                        self.logger.warning(f"content-watch ответил {response.status}")
+                except aiohttp.ClientError as e:
+                    self.logger.warning(f"Ошибка запроса к content-watch: {e}")
+                except asyncio.TimeoutError:
+                    self.logger.warning("Таймаут запроса к content-watch")
+
+            if attempt == self.max_retries:
+                break
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+            await asyncio.sleep(max(delay, retry_after or 0))
+        raise ContentWatchError(f"нет ответа после {self.max_retries + 1} попыток")
+
+    async def check_text(self, session, text, test=0, ignore=''):
+        """Проверяет уникальность текста; повторные проверки того же текста берутся из кэша"""
+        text_hash = self.text_hash(text)
+        if text_hash in self._cache:
+            return self._cache[text_hash]
+        percent = self.cached_percent(text_hash)
+        if percent is not None:
+            return {'error': '', 'percent': percent, 'cached': True}
+
+        if text_hash not in self._in_flight:
+            task = asyncio.ensure_future(self._check_text(session, {'text': text, 'test': test, 'ignore': ignore}))
+            self._in_flight[text_hash] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(text_hash, None))
+        result = await asyncio.shield(self._in_flight[text_hash])
+
+        self._cache[text_hash] = result
+        if self.conn is not None:
+            self.conn.execute("INSERT OR REPLACE INTO uniqueness_cache (text_hash, percent, checked_at) VALUES (?, ?, datetime('now'))",
+                              (text_hash, float(result.get('percent', 0))))
+            self.conn.commit()
+        return result
+
+    async def _check_text(self, session, payload):
+        """Запрос проверки; ответ без числового percent считается ошибкой API и не кэшируется"""
+        result = await self.request(session, payload)
+        try:
+            result['percent'] = float(result['percent'])
+        except (KeyError, ValueError, TypeError) as e:
+            raise ContentWatchError(f"в ответе нет процента уникальности: {str(result)[:200]}") from e
+        return result
+
+    async def check_url(self, session, url):
+        """Проверяет уникальность страницы"""
+        return await self.request(session, {'action': 'CHECK_URL', 'url': url})
+
+    async def get_balance(self, session):
+        """Баланс аккаунта"""
+        return await self.request(session, {'action': 'GET_BALANCE'})
+
+
+class UniquenessGate:
+    """Необязательная проверка статьи перед сохранением: текст проходит, если уникальность не ниже min_percent.
+
+    Если API недоступен или вернул ошибку, решение задает fail_open: True - статья сохраняется
+    (проверка не должна останавливать генерацию), False - статья отбрасывается.
+    """
+
+    def __init__(self, client, min_percent=80.0, fail_open=True):
+        self.client = client
+        self.min_percent = min_percent
+        self.fail_open = fail_open
+
+    async def check(self, session, text):
+        """Возвращает (passed, percent); percent=None, если проверить текст не удалось"""
+        try:
+            result = await self.client.check_text(session, text)
+        except ContentWatchError as e:
+            self.client.logger.warning(f"Уникальность не проверена: {e}")
+            return self.fail_open, None
+        percent = float(result.get('percent', 0))
+        return percent >= self.min_percent, percent
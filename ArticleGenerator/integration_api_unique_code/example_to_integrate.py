@@ -1,37 +1,6 @@
-import requests
-import json
-
-API_URL = 'https://content-watch.ru/public/api/'
-
-def check_text(api_key, text, test=0, ignore=''):
-    """Отправляет запрос на проверку уникальности текста."""
-    payload = {
-        'key': api_key,
-        'text': text,
-        'test': test,
-        'ignore': ignore
-    }
-    response = requests.post(API_URL, data=payload)
-    return response.json()
-
-def check_url(api_key, url):
-    """Отправляет запрос на проверку уникальности страницы."""
-    payload = {
-        'action': 'CHECK_URL',
-        'key': api_key,
-        'url': url
-    }
-    response = requests.post(API_URL, data=payload)
-    return response.json()
-
-def get_balance(api_key):
-    """Отправляет запрос на получение баланса аккаунта."""
-    payload = {
-        'action': 'GET_BALANCE',
-        'key': api_key
-    }
-    response = requests.post(API_URL, data=payload)
-    return response.json()
+import asyncio
+import aiohttp
+from ArticleGenerator.integration_api_unique_code.content_watch import ContentWatchClient
 
 def parse_response(response):
     """Обрабатывает и выводит ответ от API."""
@@ -68,22 +37,23 @@ def highlight_words(text, highlight_array):
     return " ".join(words)
 
 
-# Пример использования функций:
-api_key = "123456789012345"  # Укажите ваш API ключ
-text_to_check = "текст на проверку"
-url_to_check = "https://example.com"
+async def main(api_key, text_to_check, url_to_check):
+    client = ContentWatchClient(api_key)
+    async with aiohttp.ClientSession() as session:
+        # Проверка текста
+        print("Проверка текста:")
+        parse_response(await client.check_text(session, text_to_check))
+
+        # Проверка страницы
+        print("\nПроверка страницы:")
+        parse_response(await client.check_url(session, url_to_check))
 
-# Проверка текста
-print("Проверка текста:")
-response = check_text(api_key, text_to_check)
-parse_response(response)
+        # Запрос баланса
+        print("\nБаланс аккаунта:")
+        balance_response = await client.get_balance(session)
+        print(f"Баланс: {balance_response.get('balance', 'Не удалось получить баланс')}")
 
-# Проверка страницы
-print("\nПроверка страницы:")
-response = check_url(api_key, url_to_check)
-parse_response(response)
 
-# Запрос баланса
-print("\nБаланс аккаунта:")
-balance_response = get_balance(api_key)
-print(f"Баланс: {balance_response.get('balance', 'Не удалось получить баланс')}")
+if __name__ == '__main__':
+    # Пример использования: python -m ArticleGenerator.integration_api_unique_code.example_to_integrate
+    asyncio.run(main("123456789012345", "текст на проверку", "https://example.com"))
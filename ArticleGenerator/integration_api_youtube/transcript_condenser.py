@@ -0,0 +1,157 @@
+import re
+import asyncio
+import hashlib
+import logging
+import sqlite3
+
+CHARS_PER_TOKEN = 4  # Грубая оценка для английского текста; точный токенайзер здесь не нужен
+
+MAP_PROMPT = ("Summarize this fragment of a video transcript in at most {tokens} tokens. "
+              "Keep facts, numbers, names and practical advice; drop filler, greetings and ads.")
+REDUCE_PROMPT = ("Merge these summaries of consecutive parts of one video into a single summary of at most {tokens} tokens. "
+                 "Keep facts, numbers, names and practical advice; remove repetitions.")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_into_chunks(text, chunk_tokens):
+    """Делит текст на куски примерно по chunk_tokens токенов, стараясь резать по границам предложений"""
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    chunks, current, size = [], [], 0
+    for sentence in sentences:
+        # В автоматических субтитрах часто нет знаков препинания - режем по словам
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(' '.join(current))
+                current, size = [], 0
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].strip()
+        if size + len(sentence) > max_chars and current:
+            chunks.append(' '.join(current))
+            current, size = [], 0
+        if sentence:
+            current.append(sentence)
+            size += len(sentence) + 1
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+class TranscriptCondenser:
+    """Сжатие субтитров до бюджета токенов перед вставкой в промпт (map-reduce).
+
+    Субтитры короче budget_tokens возвращаются как есть. Длинные делятся на куски по
+    chunk_tokens, куски пересказываются одновременно (не больше max_concurrency запросов),
+    затем пересказы объединяются; если объединенный текст все еще длиннее бюджета, шаг
+    объединения повторяется. Поэтому размер контекста статьи не зависит от длины видео.
+    Результат кэшируется по SHA-256 субтитров, бюджету и модели: в памяти и, если указан
+    cache_file, в SQLite.
+    """
+
+    def __init__(self, budget_tokens=1500, chunk_tokens=3000, max_concurrency=4, model_name=None,
+                 cache_file=None, max_reduce_rounds=3, logger=None):
+        self.budget_tokens = budget_tokens
+        self.chunk_tokens = chunk_tokens
+        self.model_name = model_name
+        self.max_reduce_rounds = max_reduce_rounds
+        self.logger = logger or logging.getLogger('ArticleGeneratorLogger')
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache = {}
+        self._in_flight = {}
+
+        self.conn = None
+        if cache_file:
+            self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS condensed_transcripts (
+                                    cache_key TEXT PRIMARY KEY,
+                                    condensed TEXT,
+                                    source_tokens INTEGER,
+                                    condensed_at TEXT
+                                )''')
+            self.conn.commit()
+
+    def cache_key(self, transcript, model_name):
+        digest = hashlib.sha256(transcript.encode('utf-8')).hexdigest()
+        return f"{digest}:{self.budget_tokens}:{model_name}"
+
+    def cached(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        if self.conn is not None:
+            row = self.conn.execute("SELECT condensed FROM condensed_transcripts WHERE cache_key = ?", (key,)).fetchone()
+            if row:
+                self._cache[key] = row[0]
+                return row[0]
+        return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    async def condense(self, client, model_name, transcript, on_usage=None):
+        """Субтитры, сжатые до budget_tokens; client - синхронный клиент OpenAI генератора,
+        on_usage(usage) получает расход токенов каждого запроса"""
+        if not transcript or estimate_tokens(transcript) <= self.budget_tokens:
+            return transcript
+        model_name = self.model_name or model_name
+        key = self.cache_key(transcript, model_name)
+        condensed = self.cached(key)
+        if condensed is not None:
+            return condensed
+
+        if key not in self._in_flight:
+            task = asyncio.ensure_future(self._condense(client, model_name, transcript, on_usage))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        condensed = await asyncio.shield(self._in_flight[key])
+
+        self._cache[key] = condensed
+        if self.conn is not None:
+            self.conn.execute("INSERT OR REPLACE INTO condensed_transcripts (cache_key, condensed, source_tokens, condensed_at) VALUES (?, ?, ?, datetime('now'))",
+                              (key, condensed, estimate_tokens(transcript)))
+            self.conn.commit()
+        return condensed
+
+    async def _condense(self, client, model_name, transcript, on_usage=None):
+        chunks = split_into_chunks(transcript, self.chunk_tokens)
+        # Каждому куску - своя доля бюджета, чтобы сумма пересказов по возможности сразу в него уложилась
+        map_tokens = max(self.budget_tokens // len(chunks), 150)
+        summaries = await asyncio.gather(*(self.summarize(client, model_name, MAP_PROMPT, chunk, map_tokens, on_usage)
+                                           for chunk in chunks))
+        self.logger.debug("Transcript condensed (map)", extra={'fields': {
+            'source_tokens': estimate_tokens(transcript), 'chunks': len(chunks)}})
+
+        merged = '\n'.join(summaries)
+        rounds = 0
+        while estimate_tokens(merged) > self.budget_tokens and rounds < self.max_reduce_rounds:
+            rounds += 1
+            # Объединение тоже делится на куски, если пересказы не помещаются в один запрос
+            groups = split_into_chunks(merged, self.chunk_tokens)
+            reduce_tokens = max(self.budget_tokens // len(groups), 150)
+            merged = '\n'.join(await asyncio.gather(*(self.summarize(client, model_name, REDUCE_PROMPT, group, reduce_tokens, on_usage)
+                                                      for group in groups)))
+
+        if estimate_tokens(merged) > self.budget_tokens:
+            merged = merged[:self.budget_tokens * CHARS_PER_TOKEN]
+        return merged
+
+    async def summarize(self, client, model_name, instruction, text, max_tokens, on_usage=None):
+        async with self._semaphore:
+            # Клиент OpenAI синхронный, поэтому запросы идут в потоках и не блокируют цикл событий
+            response = await asyncio.to_thread(
+                client.chat.completions.create,
+                model=model_name,
+                messages=[{"role": "system", "content": instruction.format(tokens=max_tokens)},
+                          {"role": "user", "content": text}],
+                max_tokens=max_tokens
+            )
+        if on_usage is not None and response.usage:
+            on_usage(response.usage)
+        return response.choices[0].message.content.strip()
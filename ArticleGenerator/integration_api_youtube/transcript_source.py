@@ -0,0 +1,177 @@
+import json
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+from googleapiclient.discovery import build
+from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled, VideoUnavailable
+
+
+class YouTubeService:
+    """Клиент YouTube Data API, который создается один раз на ключ.
+
+    build() загружает discovery-документ, поэтому повторять его на каждый поиск нельзя.
+    Сам объект сервиса не потокобезопасен из-за общего httplib2.Http, поэтому запросы
+    из пула потоков выполняются с отдельным Http-объектом для каждого потока.
+    """
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __init__(self, api_key):
+        self.service = build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+        self._local = threading.local()
+
+    @classmethod
+    def get(cls, api_key):
+        with cls._lock:
+            if api_key not in cls._instances:
+                cls._instances[api_key] = cls(api_key)
+            return cls._instances[api_key]
+
+    def http(self):
+        if not hasattr(self._local, "http"):
+            self._local.http = httplib2.Http(timeout=30)
+        return self._local.http
+
+    def search(self, query, max_results=1):
+        """Идентификаторы видео по запросу (блокирующий вызов, выполняется в пуле потоков)"""
+        response = self.service.search().list(
+            q=query,
+            part="id",
+            type="video",
+            maxResults=max_results
+        ).execute(http=self.http())
+        return [item["id"]["videoId"] for item in response.get("items", [])]
+
+
+def fetch_transcript(video_id, language='en'):
+    """Текст субтитров видео (блокирующий вызов; поддерживает API youtube_transcript_api до и после 1.0)"""
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[language])
+        return " ".join(item['text'] for item in transcript)
+    transcript = YouTubeTranscriptApi().fetch(video_id, languages=[language])
+    return " ".join(snippet.text for snippet in transcript)
+
+
+class TranscriptSource:
+    """Источник субтитров YouTube для генератора.
+
+    Поиски и загрузки субтитров выполняются в пуле потоков и не блокируют цикл событий,
+    несколько ключевых наборов обрабатываются одновременно. Результаты поиска и субтитры
+    (включая отметку "субтитров нет") кэшируются в SQLite по запросу и по паре
+    (video_id, язык), поэтому наборы ключевых слов с общей темой не скачивают одно и то же
+    повторно ни в этом, ни в следующих запусках. Одинаковые запросы, идущие одновременно,
+    объединяются.
+    """
+
+    def __init__(self, api_key, language='en', cache_file='settings/youtube_cache.db', max_workers=8, max_results=1,
+                 logger=None):
+        self.api_key = api_key
+        self.language = language
+        self.max_results = max_results
+        self.logger = logger or logging.getLogger('ArticleGeneratorLogger')
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='youtube')
+        self._service = None
+        self._in_flight = {}
+
+        # Кэш читается и пишется только из потока цикла событий, пул потоков занят только сетью
+        self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS youtube_searches (
+                                query TEXT PRIMARY KEY,
+                                video_ids TEXT,
+                                searched_at TEXT
+                            )''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS youtube_transcripts (
+                                video_id TEXT,
+                                language TEXT,
+                                transcript TEXT,
+                                fetched_at TEXT,
+                                PRIMARY KEY (video_id, language)
+                            )''')
+        self.conn.commit()
+
+    def service(self):
+        if self._service is None:
+            self._service = YouTubeService.get(self.api_key)
+        return self._service
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _shared(self, key, factory):
+        """Одна задача на ключ, пока она выполняется; остальные вызовы ждут ее результат"""
+        if key not in self._in_flight:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(self._in_flight[key])
+
+    async def search(self, query):
+        row = self.conn.execute("SELECT video_ids FROM youtube_searches WHERE query = ?", (query,)).fetchone()
+        if row:
+            return json.loads(row[0])
+
+        async def do_search():
+            # Сервис создается в пуле потоков: build() тоже делает сетевой запрос
+            service = await self._run(self.service)
+            video_ids = await self._run(service.search, query, self.max_results)
+            self.conn.execute("INSERT OR REPLACE INTO youtube_searches (query, video_ids, searched_at) VALUES (?, ?, datetime('now'))",
+                              (query, json.dumps(video_ids)))
+            self.conn.commit()
+            return video_ids
+
+        return await self._shared(('search', query), do_search)
+
+    async def transcript(self, video_id, language=None):
+        """Субтитры видео или None, если их нет на нужном языке"""
+        language = language or self.language
+        row = self.conn.execute("SELECT transcript FROM youtube_transcripts WHERE video_id = ? AND language = ?",
+                                (video_id, language)).fetchone()
+        if row:
+            return row[0]
+
+        async def do_fetch():
+            try:
+                text = await self._run(fetch_transcript, video_id, language)
+            except (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable):
+                # Отсутствие субтитров тоже кэшируется, чтобы не спрашивать снова
+                self.logger.info(f"Субтитры для видео {video_id} ({language}) недоступны")
+                text = None
+            except Exception as e:
+                # Сетевые и прочие временные ошибки не кэшируются
+                self.logger.warning(f"Ошибка получения субтитров для видео {video_id}: {e}")
+                return None
+            self.conn.execute("INSERT OR REPLACE INTO youtube_transcripts (video_id, language, transcript, fetched_at) VALUES (?, ?, ?, datetime('now'))",
+                              (video_id, language, text))
+            self.conn.commit()
+            return text
+
+        return await self._shared(('transcript', video_id, language), do_fetch)
+
+    async def get_transcript_by_keyword(self, query, language=None):
+        """Субтитры первого найденного видео с доступными субтитрами или None"""
+        try:
+            video_ids = await self.search(query)
+        except Exception as e:
+            self.logger.warning(f"Ошибка поиска видео по запросу '{query}': {e}")
+            return None
+        if not video_ids:
+            self.logger.info(f"Видео по запросу '{query}' не найдено")
+            return None
+
+        for video_id in video_ids:
+            text = await self.transcript(video_id, language)
+            if text:
+                return text
+        return None
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,160 @@
+import re
+import random
+import hashlib
+
+STOP_WORDS = {
+    "a", "an", "the", "for", "to", "in", "of", "and", "on", "with", "at", "by", "or", "is",
+    "в", "на", "для", "и", "с", "по", "от", "до", "о", "как",
+}
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_keywords(keywords):
+    """Множество слов набора ключевых слов: нижний регистр, без знаков препинания, порядка и стоп-слов"""
+    words = set()
+    for keyword in keywords:
+        for word in re.findall(r"\w+", keyword.lower()):
+            if word not in STOP_WORDS:
+                words.add(word)
+    return frozenset(words)
+
+
+def jaccard(first, second):
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def lsh_bands(threshold, num_perm):
+    """Число полос LSH для порога Жаккара: минимум суммарной доли ложных срабатываний и пропусков.
+
+    Пара с коэффициентом s попадает в общую корзину с вероятностью 1 - (1 - s^rows)^bands,
+    поэтому полосы подбираются так, чтобы этот S-образный порог пришелся на threshold.
+    """
+    def probability(similarity, bands, rows):
+        return 1 - (1 - similarity ** rows) ** bands
+
+    def integral(function, start, end, steps=100):
+        step = (end - start) / steps
+        return sum(function(start + (idx + 0.5) * step) for idx in range(steps)) * step
+
+    best = None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        false_positive = integral(lambda s: probability(s, bands, rows), 0.0, threshold)
+        false_negative = integral(lambda s: 1 - probability(s, bands, rows), threshold, 1.0)
+        if best is None or false_positive + false_negative < best[0]:
+            best = (false_positive + false_negative, bands)
+    return best[1]
+
+
+class KeywordClusterer:
+    """Группировка почти одинаковых наборов ключевых слов до генерации (MinHash + LSH).
+
+    Наборы сравниваются по множествам нормализованных слов, поэтому "buy shoes online" и
+    "shoes buy online" совпадают, а наборы, отличающиеся одним словом, имеют высокий
+    коэффициент Жаккара. MinHash-подписи строятся по словарю (подпись слова считается один
+    раз), полосы LSH подбираются под порог (lsh_bands). Каждая группа представлена первым
+    набором: новый набор сравнивается точным Жаккаром только с представителями групп из своих
+    корзин, не более bucket_size на корзину, поэтому число сравнений на набор ограничено
+    bands * bucket_size даже для наборов с общей "головой" ("buy shoes online, cheap shoes, ..."),
+    и время растет линейно с числом наборов. Группы строятся отдельно для каждого сайта.
+    """
+
+    def __init__(self, threshold=0.7, num_perm=128, bands=None, bucket_size=4, seed=1):
+        if bands is None:
+            bands = lsh_bands(threshold, num_perm)
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.bucket_size = bucket_size
+        generator = random.Random(seed)
+        self._permutations = [(generator.randrange(1, MERSENNE_PRIME), generator.randrange(0, MERSENNE_PRIME))
+                              for _ in range(num_perm)]
+        self._word_signatures = {}
+
+    def word_signature(self, word):
+        signature = self._word_signatures.get(word)
+        if signature is None:
+            value = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+            signature = tuple((a * value + b) % MERSENNE_PRIME for a, b in self._permutations)
+            self._word_signatures[word] = signature
+        return signature
+
+    def signature(self, words):
+        if not words:
+            return (MERSENNE_PRIME,) * self.num_perm
+        return tuple(map(min, zip(*(self.word_signature(word) for word in words))))
+
+    def cluster(self, keyword_sets):
+        """Индексы наборов, сгруппированные по похожести; группы упорядочены по первому набору"""
+        normalized = [normalize_keywords(keywords) for keywords in keyword_sets]
+        # Представитель группы каждого набора (первый набор группы)
+        representative = list(range(len(keyword_sets)))
+
+        # Точные совпадения (тот же набор слов в другом порядке) объединяются сразу и в LSH не попадают
+        first_seen = {}
+        buckets = {}
+        for index, words in enumerate(normalized):
+            if words in first_seen:
+                representative[index] = representative[first_seen[words]]
+                continue
+            first_seen[words] = index
+
+            signature = self.signature(words)
+            keys = [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+            # Кандидаты из разных полос собираются в множество, чтобы каждая пара проверялась один раз
+            candidates = set()
+            for key in keys:
+                candidates.update(buckets.get(key, ()))
+            for other in sorted(candidates):
+                if jaccard(normalized[other], words) >= self.threshold:
+                    representative[index] = other
+                    break
+            else:
+                # Новая группа: набор становится представителем в своих корзинах, пока в них есть место
+                for key in keys:
+                    bucket = buckets.setdefault(key, [])
+                    if len(bucket) < self.bucket_size:
+                        bucket.append(index)
+
+        clusters = {}
+        for index in range(len(keyword_sets)):
+            clusters.setdefault(representative[index], []).append(index)
+        return sorted(clusters.values(), key=lambda members: members[0])
+
+    def reduce(self, keywords_data, merge=False):
+        """Возвращает (новые наборы по сайтам, отчет).
+
+        merge=False - от группы остается первый набор, merge=True - ключевые слова группы
+        объединяются в один набор (без повторов по нормализованному виду).
+        Отчет: {site: [(итоговый набор, [исходные наборы группы]), ...]} только для групп из двух и более наборов.
+        """
+        reduced = {}
+        report = {}
+        for site, keyword_sets in keywords_data.items():
+            result = []
+            for members in self.cluster(keyword_sets):
+                group = [keyword_sets[index] for index in members]
+                if merge and len(group) > 1:
+                    seen = set()
+                    merged = []
+                    for keywords in group:
+                        for keyword in keywords:
+                            key = ' '.join(sorted(normalize_keywords([keyword])))
+                            if key not in seen:
+                                seen.add(key)
+                                merged.append(keyword)
+                    chosen = merged
+                else:
+                    chosen = group[0]
+                result.append(chosen)
+                if len(group) > 1:
+                    report.setdefault(site, []).append((chosen, group))
+            reduced[site] = result
+        return reduced, report
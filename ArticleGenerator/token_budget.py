@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# Цены за 1 млн токенов в долларах: (вход, вход из кэша, выход); переопределяются ключом "model_prices" в настройках
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+
+OK, THROTTLE, STOP = "ok", "throttle", "stop"
+
+
+def key_label(api_key):
+    """Обезличенный идентификатор ключа для леджера и логов: сами ключи на диск не пишутся"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+class TokenBudget:
+    """Учет токенов и стоимости запросов с лимитами на запуск, API-ключ и сайт.
+
+    limits задаются словарем:
+        {"run": {"tokens": 2000000, "cost": 5.0},
+         "api_key": {"cost": 20.0},
+         "site": {"tokens": 300000},
+         "sites": {"site.com": {"cost": 10.0}},
+         "period": "day", "throttle_at": 0.8, "throttle_delay": 10}
+    Лимиты ключей и сайтов действуют в пределах периода ("day" - сутки UTC, None - все время)
+    и хранятся в SQLite-леджере, поэтому перезапуск не обнуляет потраченное. Лимит запуска
+    считается только в памяти. Когда использовано throttle_at доли лимита, генерация
+    замедляется на throttle_delay секунд на статью, при достижении лимита - останавливается
+    для превысившей его области.
+    """
+
+    def __init__(self, limits=None, ledger_file=None, prices=None, logger=None):
+        limits = limits or {}
+        self.run_limit = limits.get("run") or {}
+        self.key_limit = limits.get("api_key") or {}
+        self.site_limit = limits.get("site") or {}
+        self.site_limits = limits.get("sites") or {}
+        self.period = limits.get("period", "day")
+        self.throttle_at = limits.get("throttle_at", 0.8)
+        self.throttle_delay = limits.get("throttle_delay", 10)
+        self.prices = {**DEFAULT_PRICES, **{model: tuple(price) for model, price in (prices or {}).items()}}
+        self.logger = logger or logging.getLogger('ArticleGeneratorLogger')
+        self._lock = threading.Lock()
+        self.run_usage = {"tokens": 0, "cost": 0.0}
+        self._usage = {}  # (scope, key) -> {"tokens": .., "cost": ..} за текущий период
+
+        self.conn = None
+        if ledger_file:
+            self.conn = sqlite3.connect(ledger_file, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS token_ledger (
+                                    period TEXT,
+                                    scope TEXT,
+                                    scope_key TEXT,
+                                    prompt_tokens INTEGER DEFAULT 0,
+                                    cached_tokens INTEGER DEFAULT 0,
+                                    completion_tokens INTEGER DEFAULT 0,
+                                    cost REAL DEFAULT 0,
+                                    updated_at TEXT,
+                                    PRIMARY KEY (period, scope, scope_key)
+                                )''')
+            self.conn.commit()
+
+    def current_period(self):
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d") if self.period == "day" else "all"
+
+    def cost(self, model, prompt_tokens, cached_tokens, completion_tokens):
+        input_price, cached_price, output_price = self.prices.get(model, self.prices.get("gpt-4o-mini"))
+        return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price +
+                completion_tokens * output_price) / 1_000_000
+
+    def usage(self, scope, key):
+        """Потраченное областью (scope: "api_key" или "site") за текущий период"""
+        period = self.current_period()
+        cache_key = (period, scope, key)
+        if cache_key not in self._usage:
+            tokens, cost = 0, 0.0
+            if self.conn is not None:
+                row = self.conn.execute("""SELECT prompt_tokens + completion_tokens, cost FROM token_ledger
+                                           WHERE period = ? AND scope = ? AND scope_key = ?""", cache_key).fetchone()
+                if row:
+                    tokens, cost = row
+            self._usage[cache_key] = {"tokens": tokens, "cost": cost}
+        return self._usage[cache_key]
+
+    def record(self, model, usage, api_key=None, site=None):
+        """Учитывает ответ API (response.usage); возвращает стоимость запроса"""
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', None) or 0) if details else 0
+        cost = self.cost(model, usage.prompt_tokens, cached_tokens, usage.completion_tokens)
+        tokens = usage.prompt_tokens + usage.completion_tokens
+
+        scopes = []
+        if api_key:
+            scopes.append(("api_key", key_label(api_key)))
+        if site:
+            scopes.append(("site", site))
+        with self._lock:
+            self.run_usage["tokens"] += tokens
+            self.run_usage["cost"] += cost
+            period = self.current_period()
+            for scope, key in scopes:
+                spent = self.usage(scope, key)
+                spent["tokens"] += tokens
+                spent["cost"] += cost
+                if self.conn is not None:
+                    self.conn.execute("""INSERT INTO token_ledger (period, scope, scope_key, prompt_tokens, cached_tokens, completion_tokens, cost, updated_at)
+                                         VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+                                         ON CONFLICT (period, scope, scope_key) DO UPDATE SET
+                                             prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                                             cached_tokens = cached_tokens + excluded.cached_tokens,
+                                             completion_tokens = completion_tokens + excluded.completion_tokens,
+                                             cost = cost + excluded.cost,
+                                             updated_at = excluded.updated_at""",
+                                      (period, scope, key, usage.prompt_tokens, cached_tokens, usage.completion_tokens, cost))
+            if self.conn is not None:
+                self.conn.commit()
+        return cost
+
+    def _state(self, spent, limit):
+        """Доля использованного лимита по токенам или стоимости (берется большая)"""
+        ratio = 0.0
+        for measure in ("tokens", "cost"):
+            if limit.get(measure):
+                ratio = max(ratio, spent[measure] / limit[measure])
+        if ratio >= 1:
+            return STOP
+        if ratio >= self.throttle_at:
+            return THROTTLE
+        return OK
+
+    def check(self, api_key=None, site=None):
+        """Возвращает (состояние, область) для следующего запроса: самое строгое из run, api_key и site"""
+        with self._lock:
+            states = [(self._state(self.run_usage, self.run_limit), "run")]
+            if api_key and self.key_limit:
+                states.append((self._state(self.usage("api_key", key_label(api_key)), self.key_limit), "api_key"))
+            site_limit = self.site_limits.get(site, self.site_limit) if site else None
+            if site_limit:
+                states.append((self._state(self.usage("site", site), site_limit), "site"))
+        for wanted in (STOP, THROTTLE):
+            for state, scope in states:
+                if state == wanted:
+                    return state, scope
+        return OK, None
+
+    def summary(self):
+        return f"{self.run_usage['tokens']} tokens, ${self.run_usage['cost']:.4f}"
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
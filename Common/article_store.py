@@ -0,0 +1,221 @@
+import os
+import sys
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+PACKED_DB_NAME = 'articles.db'
+IMAGES_FOLDER_NAME = 'images'
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+
+
+class FolderArticleStore:
+    """Исходный формат хранения: папка сайта / папка статьи / article.txt и изображения рядом.
+
+    Методы совпадают с PackedArticleStore, поэтому генератор пишет статьи, не зная,
+    в каком формате они хранятся.
+    """
+
+    packed = False
+
+    def __init__(self, base_folder):
+        self.base_folder = str(base_folder)
+
+    def article_path(self, site, article):
+        return os.path.join(self.base_folder, site, article)
+
+    def save_text(self, site, article, text):
+        """Сохраняет текст статьи и возвращает описание места для лога"""
+        article_path = self.article_path(site, article)
+        os.makedirs(article_path, exist_ok=True)
+        output_file = os.path.join(article_path, "article.txt")
+        with open(output_file, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return output_file
+
+    def save_image(self, site, article, filename, data):
+        image_path = os.path.join(self.article_path(site, article), filename)
+        with open(image_path, 'wb') as image_file:
+            image_file.write(data)
+        return image_path
+
+    def complete(self, site, article):
+        """Статья записана полностью (в папках это видно по mtime, поэтому отмечать нечего)"""
+
+    def list_sites(self):
+        with os.scandir(self.base_folder) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+
+    def list_articles(self, site):
+        site_path = os.path.join(self.base_folder, site)
+        if not os.path.isdir(site_path):
+            return []
+        with os.scandir(site_path) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+
+    def load(self, site, article):
+        """Возвращает (текст или None, [(путь к изображению, имя для загрузки)])"""
+        article_path = self.article_path(site, article)
+        text = None
+        images = []
+        with os.scandir(article_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(".txt"):
+                    with open(entry.path, 'r', encoding='utf-8') as file:
+                        text = file.read()
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append((entry.path, entry.name))
+        return text, sorted(images, key=lambda image: image[1])
+
+    def close(self):
+        pass
+
+
+class PackedArticleStore:
+    """Упакованное хранилище: тексты и метаданные статей в одной базе SQLite, изображения -
+    файлы, адресуемые по SHA-256 содержимого (images/ab/abcdef....jpg).
+
+    Вместо миллионов папок на диске остаются одна база и по одному файлу на уникальное
+    изображение; одинаковые изображения разных статей хранятся один раз. Статья попадает
+    в list_articles() только после complete(), поэтому постер не увидит ее, пока генератор
+    не докачал изображения. Методы можно вызывать из разных потоков.
+    """
+
+    packed = True
+
+    def __init__(self, folder):
+        self.folder = str(folder)
+        self.images_folder = os.path.join(self.folder, IMAGES_FOLDER_NAME)
+        os.makedirs(self.images_folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.folder, PACKED_DB_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS articles (
+                                site TEXT,
+                                article TEXT,
+                                text TEXT,
+                                complete INTEGER DEFAULT 0,
+                                created_at TEXT,
+                                PRIMARY KEY (site, article)
+                            )''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS article_images (
+                                site TEXT,
+                                article TEXT,
+                                filename TEXT,
+                                content_hash TEXT,
+                                extension TEXT,
+                                PRIMARY KEY (site, article, filename)
+                            )''')
+        self.conn.commit()
+
+    @staticmethod
+    def exists(folder):
+        return os.path.isfile(os.path.join(str(folder), PACKED_DB_NAME))
+
+    def image_path(self, content_hash, extension):
+        return os.path.join(self.images_folder, content_hash[:2], content_hash + extension)
+
+    def save_text(self, site, article, text):
+        # Как и в папках, повторная запись заменяет текст и сохраняет уже скачанные изображения
+        with self._lock:
+            self.conn.execute("""INSERT INTO articles (site, article, text, complete, created_at) VALUES (?, ?, ?, 0, datetime('now'))
+                                 ON CONFLICT (site, article) DO UPDATE SET text = excluded.text, complete = 0""",
+                              (site, article, text))
+            self.conn.commit()
+        return f"{os.path.join(self.folder, PACKED_DB_NAME)} [{site}/{article}]"
+
+    def save_image(self, site, article, filename, data):
+        content_hash = hashlib.sha256(data).hexdigest()
+        extension = os.path.splitext(filename)[1].lower()
+        image_path = self.image_path(content_hash, extension)
+        if not os.path.exists(image_path):
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            # Запись через временный файл: недописанное изображение не займет адрес содержимого
+            temp_path = f"{image_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as image_file:
+                image_file.write(data)
+            os.replace(temp_path, image_path)
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO article_images (site, article, filename, content_hash, extension) VALUES (?, ?, ?, ?, ?)",
+                              (site, article, filename, content_hash, extension))
+            self.conn.commit()
+        return image_path
+
+    def complete(self, site, article):
+        with self._lock:
+            self.conn.execute("UPDATE articles SET complete = 1 WHERE site = ? AND article = ?", (site, article))
+            self.conn.commit()
+
+    def list_sites(self):
+        with self._lock:
+            return [site for (site,) in self.conn.execute("SELECT DISTINCT site FROM articles ORDER BY site")]
+
+    def list_articles(self, site):
+        with self._lock:
+            return [article for (article,) in
+                    self.conn.execute("SELECT article FROM articles WHERE site = ? AND complete = 1 ORDER BY article", (site,))]
+
+    def load(self, site, article):
+        """Возвращает (текст или None, [(путь к изображению, исходное имя файла)])"""
+        with self._lock:
+            row = self.conn.execute("SELECT text FROM articles WHERE site = ? AND article = ?", (site, article)).fetchone()
+            images = self.conn.execute("""SELECT filename, content_hash, extension FROM article_images
+                                          WHERE site = ? AND article = ? ORDER BY filename""", (site, article)).fetchall()
+        return (row[0] if row else None,
+                [(self.image_path(content_hash, extension), filename) for filename, content_hash, extension in images])
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def open_store(folder, packed=False):
+    """Хранилище статей в папке: упакованное, если его попросили или оно уже создано там раньше"""
+    if packed or PackedArticleStore.exists(folder):
+        return PackedArticleStore(folder)
+    return FolderArticleStore(folder)
+
+
+def export_to_folders(store, destination, log=print):
+    """Выгружает статьи упакованного хранилища в обычную структуру папок; возвращает число статей"""
+    target = FolderArticleStore(destination)
+    exported = 0
+    for site in store.list_sites():
+        articles = store.list_articles(site)
+        for article in articles:
+            text, images = store.load(site, article)
+            target.save_text(site, article, text or '')
+            for image_path, filename in images:
+                shutil.copyfile(image_path, os.path.join(target.article_path(site, article), filename))
+        exported += len(articles)
+        log(f"{site}: выгружено статей - {len(articles)}")
+    return exported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка упакованного хранилища статей в папки")
+    parser.add_argument('source', help="Папка с articles.db и images/")
+    parser.add_argument('destination', help="Папка, в которую будут записаны папки сайтов и статей")
+    args = parser.parse_args(argv)
+
+    if not PackedArticleStore.exists(args.source):
+        print(f"В папке {args.source} нет {PACKED_DB_NAME}", file=sys.stderr)
+        return 1
+    store = PackedArticleStore(args.source)
+    try:
+        exported = export_to_folders(store, args.destination)
+    finally:
+        store.close()
+    print(f"Всего выгружено статей: {exported}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import atexit
+import logging
+import threading
+from queue import SimpleQueue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listeners = {}  # Имя логгера -> QueueListener, чтобы повторная настройка не добавляла обработчики
+_lock = threading.Lock()
+
+
+def format_fields(record):
+    """Структурированные поля записи (extra={'fields': {...}}) в виде ' key=value ...'"""
+    fields = getattr(record, 'fields', None)
+    if not fields:
+        return ''
+    return ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+
+
+class StructuredFormatter(logging.Formatter):
+    """Обычная строка лога, к которой дописываются структурированные поля"""
+
+    def format(self, record):
+        return super().format(record) + format_fields(record)
+
+
+def get_logger(name, log_file, level=logging.INFO, console=True):
+    """Возвращает логгер, запись которого в файл и консоль идет в отдельном потоке.
+
+    Логгер получает один QueueHandler: вызов logger.info() только кладет запись в очередь,
+    а QueueListener пишет ее в файл и консоль вне цикла событий и потока GUI.
+    Повторный вызов (например, при повторном открытии окна) возвращает тот же логгер
+    без новых обработчиков, поэтому строки не дублируются.
+    """
+    logger = logging.getLogger(name)
+    with _lock:
+        if name in _listeners:
+            return logger
+
+        handlers = [logging.FileHandler(log_file, encoding='utf-8')]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+        queue = SimpleQueue()
+        listener = QueueListener(queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+
+        logger.addHandler(QueueHandler(queue))
+        logger.setLevel(level)
+        logger.propagate = False
+    return logger
+
+
+@atexit.register
+def stop_listeners():
+    """Дописывает оставшиеся в очередях записи при выходе из приложения"""
+    with _lock:
+        for listener in _listeners.values():
+            listener.stop()
+        _listeners.clear()
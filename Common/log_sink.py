@@ -0,0 +1,86 @@
+import html
+import logging
+import threading
+from collections import deque
+from PyQt6.QtCore import QTimer
+from Common.log_setup import format_fields
+
+LEVEL_COLORS = {
+    logging.ERROR: "red",
+    logging.CRITICAL: "red",
+    logging.WARNING: "orange",
+}
+
+
+class LogSink(logging.Handler):
+    """Буферизованный вывод логов в текстовое поле окна.
+
+    Сообщения из любых потоков складываются в кольцевой буфер, а таймер в потоке GUI
+    раз в flush_interval мс переносит их в виджет одной вставкой. В поле остается
+    не больше max_lines строк, длинные сообщения обрезаются до max_message_chars.
+    Полная история пишется только обработчиками файлового лога.
+    """
+
+    def __init__(self, widget, max_lines=5000, buffer_size=10000, flush_interval=200, max_message_chars=2000):
+        super().__init__()
+        self.widget = widget
+        self.max_message_chars = max_message_chars
+        # Старые строки удаляются самим документом, поэтому память поля ограничена
+        self.widget.document().setMaximumBlockCount(max_lines)
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0  # Сообщения, вытесненные из буфера до отображения
+        self._lock = threading.Lock()
+
+        self.timer = QTimer(widget)
+        self.timer.setInterval(flush_interval)
+        self.timer.timeout.connect(self.flush_to_widget)
+        self.timer.start()
+
+    def emit(self, record):
+        try:
+            message = record.getMessage() + format_fields(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append((record.levelno, message))
+
+    def flush_to_widget(self):
+        """Переносит накопленные сообщения в виджет (вызывается таймером в потоке GUI)"""
+        with self._lock:
+            if not self.buffer:
+                return
+            records = list(self.buffer)
+            self.buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+
+        lines = []
+        if dropped:
+            lines.append(self.format_line(logging.WARNING, f"... пропущено сообщений: {dropped} (полностью они есть в файле лога)"))
+        lines.extend(self.format_line(level, message) for level, message in records)
+        # Каждый <p> становится отдельной строкой документа, поэтому лимит строк продолжает работать
+        if hasattr(self.widget, "appendHtml"):
+            self.widget.appendHtml("".join(lines))  # QPlainTextEdit
+        else:
+            self.widget.append("".join(lines))  # QTextEdit
+        scrollbar = self.widget.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def format_line(self, level, message):
+        if len(message) > self.max_message_chars:
+            message = message[:self.max_message_chars] + f" ... (+{len(message) - self.max_message_chars} символов)"
+        text = html.escape(message).replace("\n", "<br>")
+        color = LEVEL_COLORS.get(level)
+        if color:
+            return f'<p><span style="color:{color}">{text}</span></p>'
+        return f'<p>{text}</p>'
+
+    def close(self):
+        # Вызывается и из logging.shutdown() при выходе, когда виджета уже может не быть
+        try:
+            self.timer.stop()
+        except RuntimeError:
+            pass
+        super().close()
@@ -0,0 +1,122 @@
+import time
+import threading
+from collections import deque
+
+
+class ProgressEvent:
+    """Снимок прогресса, который рабочий поток передает окну"""
+
+    __slots__ = ("queued", "done", "skipped", "failed", "bytes_sent", "tokens_used", "cached_tokens",
+                 "elapsed", "items_per_minute", "eta", "finished")
+
+    def __init__(self, queued, done, skipped, failed, bytes_sent, tokens_used, cached_tokens, elapsed, items_per_minute, eta,
+                 finished):
+        self.queued = queued  # Всего элементов в работе (включая пропущенные)
+        self.done = done
+        self.skipped = skipped
+        self.failed = failed
+        self.bytes_sent = bytes_sent
+        self.tokens_used = tokens_used
+        self.cached_tokens = cached_tokens  # Токены промпта из кэша провайдера (часть tokens_used)
+        self.elapsed = elapsed  # Секунд с начала работы
+        self.items_per_minute = items_per_minute  # Скорость за последние rate_window секунд
+        self.eta = eta  # Оценка оставшегося времени в секундах (None, пока скорость неизвестна)
+        self.finished = finished
+
+    @property
+    def processed(self):
+        return self.done + self.skipped + self.failed
+
+    def summary(self):
+        """Короткая строка для подписи к индикатору прогресса"""
+        parts = [f"{self.processed}/{self.queued}", f"ok {self.done}"]
+        if self.skipped:
+            parts.append(f"skipped {self.skipped}")
+        if self.failed:
+            parts.append(f"failed {self.failed}")
+        parts.append(f"{self.items_per_minute:.1f}/min")
+        if self.eta is not None and not self.finished:
+            minutes, seconds = divmod(int(self.eta), 60)
+            hours, minutes = divmod(minutes, 60)
+            parts.append(f"ETA {hours}:{minutes:02d}:{seconds:02d}")
+        if self.bytes_sent:
+            parts.append(f"{self.bytes_sent / 1024 / 1024:.1f} MB sent")
+        if self.tokens_used:
+            parts.append(f"{self.tokens_used} tokens" + (f" ({self.cached_tokens} cached)" if self.cached_tokens else ""))
+        return ", ".join(parts)
+
+
+class ProgressTracker:
+    """Потокобезопасные счетчики прогресса с встроенным ограничением частоты событий.
+
+    Рабочий код вызывает add() сколько угодно часто, а callback получает ProgressEvent
+    не чаще раза в min_interval секунд (и обязательно - при завершении всех элементов
+    и в finish()), поэтому поток GUI не захлебывается сигналами. Скорость и ETA
+    считаются по завершенным (done + failed) элементам за последние rate_window секунд:
+    пропуски уже опубликованного происходят мгновенно и исказили бы оценку.
+    """
+
+    def __init__(self, callback=None, min_interval=0.5, rate_window=60):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queued = 0
+            self.done = 0
+            self.skipped = 0
+            self.failed = 0
+            self.bytes_sent = 0
+            self.tokens_used = 0
+            self.cached_tokens = 0
+            self._started = time.monotonic()
+            self._samples = deque([(self._started, 0)])  # (время, завершено) для скользящей скорости
+            self._last_emit = 0.0
+
+    def add(self, queued=0, done=0, skipped=0, failed=0, bytes_sent=0, tokens_used=0, cached_tokens=0):
+        with self._lock:
+            self.queued += queued
+            self.done += done
+            self.skipped += skipped
+            self.failed += failed
+            self.bytes_sent += bytes_sent
+            self.tokens_used += tokens_used
+            self.cached_tokens += cached_tokens
+
+            now = time.monotonic()
+            if done or failed:
+                self._samples.append((now, self.done + self.failed))
+                while len(self._samples) > 2 and self._samples[1][0] < now - self.rate_window:
+                    self._samples.popleft()
+
+            all_processed = self.queued and self.done + self.skipped + self.failed >= self.queued
+            if self.callback is None or (now - self._last_emit < self.min_interval and not all_processed):
+                return
+            self._last_emit = now
+            event = self._snapshot(now, finished=False)
+        self.callback(event)
+
+    def finish(self):
+        """Отправляет итоговое событие независимо от ограничения частоты"""
+        with self._lock:
+            event = self._snapshot(time.monotonic(), finished=True)
+        if self.callback is not None:
+            self.callback(event)
+        return event
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot(time.monotonic(), finished=False)
+
+    def _snapshot(self, now, finished):
+        first_time, first_count = self._samples[0]
+        last_time, last_count = self._samples[-1]
+        # Пока нет завершенных элементов, скорость не определена
+        per_second = (last_count - first_count) / max(now - first_time, 1e-6) if last_count else 0.0
+        remaining = max(self.queued - self.done - self.skipped - self.failed, 0)
+        eta = remaining / per_second if per_second > 0 else None
+        return ProgressEvent(self.queued, self.done, self.skipped, self.failed, self.bytes_sent, self.tokens_used,
+                             self.cached_tokens, now - self._started, per_second * 60, eta, finished)
@@ -1,11 +1,23 @@
 import os
+import re
 import sys
+import json
+import random
 import aiohttp
 import asyncio
 import sqlite3
+import hashlib
 import logging
+import mimetypes
+import traceback
 from aiohttp import BasicAuth
 from pathlib import Path
+from datetime import datetime, timezone
+from WordPressPoster.concurrency import AdaptiveLimiter, FairScheduler, CircuitBreaker
+from WordPressPoster.batch_publisher import BatchPublisher
+from WordPressPoster.article_index import ArticleIndex
+from Common.progress import ProgressTracker
+from Common.article_store import open_store
 
 def resource_path(relative_path):
     """Возвращает правильный путь к ресурсу, поддерживая как исполняемые файлы, так и обычные скрипты"""
@@ -15,14 +27,53 @@ def resource_path(relative_path):
         base_path = Path(__file__).parent
     return base_path / relative_path
 
+# Настройки пула HTTP-соединений по умолчанию (переопределяются ключом "http" в settings.json)
+DEFAULT_HTTP_SETTINGS = {
+    "limit": 100,  # Всего соединений на все сайты
+    "limit_per_host": 0,  # Соединений на один сайт (0 - равно max_concurrency)
+    "dns_cache_ttl": 600,  # Секунд хранения DNS-ответов
+    "keepalive_timeout": 30,  # Секунд удержания простаивающего соединения
+    "request_timeout": 120,  # Общий таймаут одного запроса
+    "connect_timeout": 15,
+    "warm_up": True,  # Открывать соединения с сайтами до начала публикации
+    "preflight": True,  # Проверять REST API и учетные данные всех сайтов до начала публикации (заменяет warm_up)
+    "preflight_timeout": 15,  # Таймаут одного запроса проверки
+    "breaker_threshold": 5,  # Неудачных статей подряд, после которых сайт временно пропускается
+    "breaker_reset_timeout": 60,  # Секунд до пробной проверки пропускаемого сайта
+    "breaker_max_reset_timeout": 900,  # Предельный интервал между пробами; если и после него проба не прошла, статьи сайта откладываются
+}
+
 class WordPressPoster:
-    def __init__(self, base_folder, credentials_file, db_file, batch_size=5, pause_between_batches=10, logger=None):
+    def __init__(self, base_folder, credentials_file, db_file, batch_size=5, pause_between_batches=10, logger=None, scheme="https", max_concurrency=20,
+                 max_total_concurrency=50, site_limits=None, default_daily_quota=None, http_settings=None,
+                 max_retries=4, retry_base_delay=1.0, retry_max_delay=60, batch_publishing=False,
+                 watch=False, watch_interval=30, watch_settle=5, progress_callback=None, packed_store=False):
         self.base_folder = resource_path(base_folder)
         self.credentials_file = resource_path(credentials_file)
         self.db_file = resource_path(db_file)
         self.batch_size = batch_size
         self.pause_between_batches = pause_between_batches
+        self.max_concurrency = max_concurrency
+        self.limiters = {}  # Адаптивные ограничители запросов по сайтам
+        self.breakers = {}  # Автоматы защиты по сайтам: недоступный сайт пропускается без ожидания таймаутов
+        self.max_total_concurrency = max_total_concurrency  # Общий лимит статей в работе для всех сайтов
+        self.site_limits = site_limits or {}  # Вес и дневная квота сайтов из настроек: {site: {"weight": .., "daily_quota": ..}}
+        self.default_daily_quota = default_daily_quota
+        self.http_settings = {**DEFAULT_HTTP_SETTINGS, **(http_settings or {})}
+        self.max_retries = max_retries  # Повторы запросов при таймаутах, 429 и 5xx
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Необязательная публикация через /wp-json/batch/v1 (меньше запросов к сайтам с большой задержкой)
+        self.batch_publisher = BatchPublisher(self) if batch_publishing else None
+        # Режим наблюдения: после прохода по сайтам постер ждет новые статьи от генератора
+        self.watch = watch
+        self.watch_interval = watch_interval  # Секунд между проверками папок
+        self.watch_settle = watch_settle  # Статьи, папка которых менялась недавно, ждут следующей проверки
+        self.scheme = scheme  # Протокол REST API сайтов (http используется для локальных стендов)
+        # Упакованное хранилище статей используется, если его включили или генератор уже создал его в папке
+        self.store = open_store(self.base_folder, packed_store)
         self.sites_credentials = self.load_site_credentials()
+        self.posted_articles = {}  # Множества опубликованных статей по сайтам, загруженные одним запросом
         self._is_running = True
         self.create_database()
         self.logger = logger or logging.getLogger(__name__)  # Использование переданного логгера или создание нового
@@ -31,143 +82,614 @@ class WordPressPoster:
         self.published_count = 0
         self.skipped_count = 0
         self.total_articles = 0
+        self.site_published = {}  # Опубликовано за текущий запуск по сайтам (для дневных квот)
+        # Прогресс для окна: статьи в очереди, опубликованные, пропущенные, неудачные и отправленные байты
+        self.progress = ProgressTracker(progress_callback)
+        self._media_uploads = {}  # Загрузки, идущие прямо сейчас: (site, content_hash) -> задача
+        self._media_checked = set()  # Вложения из кэша, наличие которых на сайте уже проверено в этом запуске
+        self._failed_preflight = set()  # Сайты, не прошедшие предварительную проверку: их статьи в этом запуске пропускаются
+        self._postponed = {}  # (site, article) -> отметка в прогрессе ('skipped'/'failed') для статей, ждущих следующего прохода
 
-    def log(self, message, level=logging.INFO):
-        """Логгирование с учетом уровней"""
+    def log(self, message, level=logging.INFO, **fields):
+        """Логгирование с учетом уровней; fields попадают в строку лога как key=value"""
         if self.logger:
-            if level == logging.ERROR:
-                self.logger.error(message)
-            elif level == logging.WARNING:
-                self.logger.warning(message)
-            else:
-                self.logger.info(message)
+            self.logger.log(level, message, extra={'fields': fields} if fields else None)
 
     def stop(self):
         """Метод для остановки работы"""
         self._is_running = False
 
     def create_database(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS posts (
+        # Одно долгоживущее соединение на все время работы вместо открытия на каждую статью.
+        # check_same_thread=False: объект создается в потоке GUI, а работает в потоке постера.
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS posts (
                             id INTEGER PRIMARY KEY AUTOINCREMENT,
                             site TEXT,
                             article TEXT,
                             posted INTEGER
                         )''')
-        conn.commit()
-        conn.close()
+        index_exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_posts_site_article'").fetchone()
+        if not index_exists:
+            # В старых базах могли остаться дубликаты, без их удаления уникальный индекс не создать
+            self.conn.execute("""DELETE FROM posts WHERE id NOT IN (
+                                     SELECT MIN(id) FROM posts GROUP BY site, article)""")
+            self.conn.execute("CREATE UNIQUE INDEX idx_posts_site_article ON posts (site, article)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(posts)")}
+        if 'posted_at' not in columns:
+            # Время публикации (UTC) нужно для подсчета дневных квот
+            self.conn.execute("ALTER TABLE posts ADD COLUMN posted_at TEXT")
+        # Состояние статьи: pending -> media_uploaded -> published (у старых записей NULL при posted=1)
+        for column, column_type in (('state', 'TEXT'), ('slug', 'TEXT'), ('media_ids', 'TEXT'), ('post_id', 'INTEGER')):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE posts ADD COLUMN {column} {column_type}")
+        # Кэш уже загруженных медиафайлов: хэш содержимого -> ID вложения на сайте
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS media_cache (
+                                site TEXT,
+                                content_hash TEXT,
+                                media_id INTEGER,
+                                uploaded_at TEXT,
+                                PRIMARY KEY (site, content_hash)
+                            )''')
+        self.conn.commit()
+        self._uncommitted = 0
+        self.article_index = ArticleIndex(self.conn, self.base_folder)
+
+    def commit(self):
+        """Фиксирует накопленные отметки о публикации одной транзакцией"""
+        if self._uncommitted:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """Фиксирует изменения и закрывает соединение с базой"""
+        if self.conn is not None:
+            self.commit()
+            self.conn.close()
+            self.conn = None
+        self.store.close()
 
     def load_site_credentials(self):
         sites = {}
         with open(self.credentials_file, "r", encoding="utf-8") as file:
             for line in file:
-                site, login, password = line.strip().split("|")
+                if not line.strip():
+                    continue
+                # Формат: site|login|password[|weight[|daily_quota]]
+                site, login, password, *limits = line.strip().split("|")
                 sites[site] = {"login": login, "password": password}
+                if len(limits) > 0 and limits[0].strip():
+                    sites[site]["weight"] = float(limits[0])
+                if len(limits) > 1 and limits[1].strip():
+                    sites[site]["daily_quota"] = int(limits[1])
         return sites
 
+    def site_weight(self, site):
+        """Вес сайта при распределении общего лимита: из файла учетных данных, затем из настроек"""
+        weight = self.sites_credentials.get(site, {}).get("weight")
+        if weight is None:
+            weight = self.site_limits.get(site, {}).get("weight", 1)
+        return weight
+
+    def daily_quota(self, site):
+        """Дневная квота публикаций сайта или None, если она не ограничена"""
+        quota = self.sites_credentials.get(site, {}).get("daily_quota")
+        if quota is None:
+            quota = self.site_limits.get(site, {}).get("daily_quota", self.default_daily_quota)
+        return quota
+
+    def posted_today(self, site):
+        """Количество статей, опубликованных на сайте с начала текущих суток (по местному времени)"""
+        start_of_day = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+        since = start_of_day.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        cursor = self.conn.execute("SELECT COUNT(*) FROM posts WHERE site=? AND posted_at >= ?", (site, since))
+        return cursor.fetchone()[0]
+
+    def api_url(self, site, route):
+        """Возвращает адрес маршрута REST API WordPress для сайта"""
+        return f"{self.scheme}://{site}/wp-json/{route}"
+
+    def load_posted_articles(self, site):
+        """Загружает множество опубликованных статей сайта одним запросом"""
+        cursor = self.conn.execute("SELECT article FROM posts WHERE site=? AND posted=1", (site,))
+        self.posted_articles[site] = {row[0] for row in cursor}
+        return self.posted_articles[site]
+
+    def get_limiter(self, site):
+        """Возвращает ограничитель одновременных запросов сайта.
+
+        batch_size задает стартовое окно, max_concurrency - верхнюю границу,
+        pause_between_batches - паузу после 429 без заголовка Retry-After.
+        """
+        if site not in self.limiters:
+            self.limiters[site] = AdaptiveLimiter(initial_limit=self.batch_size, max_limit=self.max_concurrency,
+                                                  pause_on_429=self.pause_between_batches)
+        return self.limiters[site]
+
+    def get_breaker(self, site):
+        if site not in self.breakers:
+            self.breakers[site] = CircuitBreaker(failure_threshold=self.http_settings["breaker_threshold"],
+                                                 reset_timeout=self.http_settings["breaker_reset_timeout"],
+                                                 max_reset_timeout=self.http_settings["breaker_max_reset_timeout"])
+        return self.breakers[site]
+
+    async def check_site(self, session, site, credentials, attempts=3):
+        """Проверяет REST API и учетные данные сайта; возвращает (True, None) или (False, причина).
+
+        Сетевые ошибки, 429 и 5xx повторяются до attempts раз, отказ в авторизации - окончательный.
+        """
+        for attempt in range(attempts):
+            ok, reason, status = await self._check_site_once(session, site, credentials)
+            if ok or not self.is_retryable(status) or attempt == attempts - 1:
+                return ok, reason
+            await asyncio.sleep(self.retry_delay(attempt))
+
+    async def _check_site_once(self, session, site, credentials):
+        timeout = aiohttp.ClientTimeout(total=self.http_settings["preflight_timeout"])
+        try:
+            async with session.get(self.api_url(site, ""), params={'_fields': 'namespaces'}, timeout=timeout) as response:
+                if response.status != 200:
+                    return False, f"REST API недоступен (HTTP {response.status})", response.status
+                index = await response.json(content_type=None)
+                if 'wp/v2' not in index.get('namespaces', []):
+                    return False, "REST API не предоставляет wp/v2", response.status
+
+            auth = BasicAuth(credentials['login'], credentials['password'])
+            async with session.get(self.api_url(site, "wp/v2/users/me"), auth=auth, timeout=timeout,
+                                   params={'context': 'edit', '_fields': 'id,capabilities'}) as response:
+                if response.status in (401, 403):
+                    return False, f"учетные данные отклонены (HTTP {response.status})", response.status
+                if response.status != 200:
+                    return False, f"проверка учетных данных не удалась (HTTP {response.status})", response.status
+                capabilities = (await response.json(content_type=None)).get('capabilities')
+                if capabilities is not None and not capabilities.get('publish_posts'):
+                    return False, "у пользователя нет права публиковать посты", response.status
+        except Exception as e:
+            return False, f"сайт не отвечает: {str(e) or type(e).__name__}", None
+        return True, None, 200
+
+    async def preflight(self, session):
+        """Одновременно проверяет все сайты до начала публикации; не прошедшие проверку сайты пропускаются"""
+        sites = list(self.sites_credentials)
+        results = await asyncio.gather(*(self.check_site(session, site, self.sites_credentials[site]) for site in sites))
+        for site, (ok, reason) in zip(sites, results):
+            if ok:
+                self.get_breaker(site).record_success()
+            else:
+                self.get_breaker(site).trip(reason)
+                self._failed_preflight.add(site)
+                self.log(f"Сайт {site} не прошел проверку: {reason}. Его статьи будут пропущены", logging.ERROR, site=site)
+        healthy = sum(1 for ok, _ in results if ok)
+        self.log(f"Предварительная проверка: доступно сайтов {healthy} из {len(sites)}", logging.INFO)
+
+    async def site_available(self, session, site, credentials):
+        """False, пока автомат защиты сайта открыт; когда подходит время, выполняет пробную проверку сайта"""
+        breaker = self.get_breaker(site)
+        if not breaker.is_open:
+            return True
+        if not breaker.probe_due():
+            return False
+        ok, reason = await self.check_site(session, site, credentials)
+        if ok:
+            breaker.record_success()
+            self.log(f"Сайт {site} снова доступен, публикация продолжается", logging.INFO, site=site)
+            return True
+        breaker.record_failure(reason, probe=True)
+        self.log(f"Сайт {site} по-прежнему недоступен: {reason}. Следующая проверка через {breaker.reset_timeout} с",
+                 logging.WARNING, site=site)
+        return False
+
+    async def wait_for_site(self, session, site, credentials):
+        """Ждет пробы отключенного сайта, не бросая его очередь; True - сайт снова доступен.
+
+        False - ждать бессмысленно: запуск останавливается, сайт не прошел предварительную
+        проверку или проба не прошла и при максимальном интервале. В режиме наблюдения
+        не ждет: отложенные статьи заберет следующий проход, а остальные сайты не задерживаются.
+        """
+        breaker = self.get_breaker(site)
+        if self.watch or site in self._failed_preflight:
+            return False
+        self.log(f"Сайт {site} недоступен ({breaker.reason}), публикация продолжится после проверки "
+                 f"через {breaker.probe_delay():.0f} с", logging.WARNING, site=site)
+        while self._is_running and not breaker.exhausted:
+            # Не дольше секунды, чтобы остановка не ждала пробы
+            await asyncio.sleep(min(max(breaker.probe_delay(), 0.05), 1.0))
+            if self._is_running and await self.site_available(session, site, credentials):
+                return True
+        return False
+
     def is_posted(self, site, article):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT posted FROM posts WHERE site=? AND article=?", (site, article))
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
-
-    def mark_as_posted(self, site, article):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO posts (site, article, posted) VALUES (?, ?, 1)", (site, article))
-        conn.commit()
-        conn.close()
-
-    async def upload_image(self, session, site, username, password, image_path):
-        wp_media_url = f"https://{site}/wp-json/wp/v2/media"
-        headers = {'Content-Disposition': f'attachment; filename={os.path.basename(image_path)}'}
+        if site in self.posted_articles:
+            return article in self.posted_articles[site]
+        cursor = self.conn.execute("SELECT 1 FROM posts WHERE site=? AND article=? AND posted=1", (site, article))
+        return cursor.fetchone() is not None
+
+    def post_slug(self, site, article):
+        """Детерминированный slug статьи - клиентский маркер идемпотентности публикации"""
+        base = re.sub(r'[^a-z0-9]+', '-', article.lower()).strip('-')[:60].strip('-') or 'post'
+        digest = hashlib.sha1(f"{site}/{article}".encode('utf-8')).hexdigest()[:8]
+        return f"{base}-{digest}"
+
+    def get_state(self, site, article):
+        cursor = self.conn.execute("SELECT state FROM posts WHERE site=? AND article=?", (site, article))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def set_state(self, site, article, state, slug=None, media_ids=None, commit=False):
+        """Записывает промежуточное состояние неопубликованной статьи"""
+        self.conn.execute("""INSERT INTO posts (site, article, posted, state, slug, media_ids) VALUES (?, ?, 0, ?, ?, ?)
+                             ON CONFLICT (site, article) DO UPDATE SET
+                                 state=excluded.state,
+                                 slug=COALESCE(excluded.slug, slug),
+                                 media_ids=COALESCE(excluded.media_ids, media_ids)""",
+                          (site, article, state, slug, json.dumps(media_ids) if media_ids is not None else None))
+        self._uncommitted += 1
+        if commit:
+            self.commit()
+
+    def mark_as_posted(self, site, article, post_id=None):
+        # Фиксация происходит в commit() после обработки пачки статей
+        self.conn.execute("""INSERT INTO posts (site, article, posted, posted_at, state, post_id) VALUES (?, ?, 1, datetime('now'), 'published', ?)
+                             ON CONFLICT (site, article) DO UPDATE SET
+                                 posted=1, posted_at=excluded.posted_at, state='published', post_id=excluded.post_id""",
+                          (site, article, post_id))
+        self._uncommitted += 1
+        self.site_published[site] = self.site_published.get(site, 0) + 1
+        if site in self.posted_articles:
+            self.posted_articles[site].add(article)
+
+    def postpone(self, site, articles, outcome='skipped'):
+        """Учитывает в прогрессе статьи, которые остались неопубликованными и будут найдены следующим проходом"""
+        for article in articles:
+            self._postponed[(site, article)] = outcome
+        self.progress.add(**{outcome: len(articles)})
+
+    def queue_articles(self, site, articles):
+        """Ставит статьи прохода в прогресс и возвращает число впервые найденных.
+
+        Отложенные прошлыми проходами статьи уже посчитаны в queued, у них снимается только
+        прежняя отметка о пропуске или ошибке, иначе в режиме наблюдения счетчики росли бы с каждым проходом.
+        """
+        new_articles = 0
+        revived = {}
+        for article in articles:
+            outcome = self._postponed.pop((site, article), None)
+            if outcome is None:
+                new_articles += 1
+            else:
+                revived[outcome] = revived.get(outcome, 0) - 1
+        self.progress.add(queued=new_articles, **revived)
+        return new_articles
+
+    async def read_file_chunks(self, path, chunk_size=256 * 1024):
+        """Читает файл кусками в пуле потоков, не блокируя цикл событий"""
+        file = await asyncio.to_thread(open, path, 'rb')
+        try:
+            while True:
+                chunk = await asyncio.to_thread(file.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+
+    def read_article(self, txt_file):
+        """Читает заголовок (первая строка) и текст статьи"""
+        with open(txt_file, "r", encoding="utf-8") as f:
+            return self.parse_article(f.read())
+
+    def parse_article(self, text):
+        lines = text.splitlines(keepends=True)
+        return lines[0].strip(), ''.join(lines[1:]).strip()
+
+    def load_article(self, site, article):
+        """Возвращает ((заголовок, текст) или None, [(путь к изображению, имя файла для загрузки)])
+
+        Папки статей читаются через индекс, упакованное хранилище - одним запросом к его базе.
+        Метод блокирующий и вызывается через asyncio.to_thread.
+        """
+        if self.store.packed:
+            text, images = self.store.load(site, article)
+            return (self.parse_article(text) if text is not None else None), images
+        # Файлы статьи уже известны из индекса, повторно папка читается только для статей вне его
+        txt_file, image_files = self.article_index.files(site, article)
+        images = [(image_file, os.path.basename(image_file)) for image_file in image_files]
+        return (self.read_article(txt_file) if txt_file else None), images
+
+    def file_hash(self, path, chunk_size=1024 * 1024):
+        """SHA-256 содержимого файла"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def cached_media_id(self, site, content_hash):
+        cursor = self.conn.execute("SELECT media_id FROM media_cache WHERE site=? AND content_hash=?", (site, content_hash))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def cache_media_id(self, site, content_hash, media_id):
+        # Фиксируется вместе с отметками о публикации в commit()
+        self.conn.execute("INSERT OR REPLACE INTO media_cache (site, content_hash, media_id, uploaded_at) VALUES (?, ?, ?, datetime('now'))",
+                          (site, content_hash, media_id))
+        self._uncommitted += 1
+
+    def forget_media_id(self, site, media_id):
+        """Удаляет из кэша вложение, которого больше нет на сайте"""
+        self.conn.execute("DELETE FROM media_cache WHERE site=? AND media_id=?", (site, media_id))
+        self._uncommitted += 1
+        self._media_checked.discard((site, media_id))
+
+    async def media_exists(self, session, site, auth, media_id):
+        """False, если сайт ответил 404/410 на запрос вложения; при других ответах и ошибках вложение считается существующим"""
         try:
-            self.log(f"Попытка загрузить изображение: {image_path}", logging.INFO)
-            with open(image_path, 'rb') as image_file:
-                data = image_file.read()
-
-            async with session.post(wp_media_url, headers=headers, data=data, 
-                                    auth=BasicAuth(username, password), 
-                                    params={'media_type': 'image'}) as response:
-                if response.status == 201:
-                    json_response = await response.json()
-                    self.log(f"Изображение успешно загружено на {site}: {json_response['id']}", logging.INFO)
-                    return json_response['id']
-                else:
-                    error_message = await response.text()
-                    self.log(f"Ошибка загрузки изображения на {site}: {response.status}, {error_message}", logging.ERROR)
-                    return None
+            async with self.get_limiter(site).slot("lookup") as slot, \
+                    session.get(self.api_url(site, f"wp/v2/media/{media_id}"), auth=auth,
+                                params={'_fields': 'id', 'context': 'edit'}) as response:
+                slot.record(response)
+                await response.read()
+                return response.status not in (404, 410)
         except Exception as e:
-            self.log(f"Ошибка при загрузке изображения на {site}: {str(e)}", logging.ERROR)
+            self.log(f"Не удалось проверить вложение {media_id} на {site}: {str(e)}", logging.WARNING)
+            return True
+
+    async def upload_image(self, session, site, username, password, image_path, filename=None):
+        """Загружает изображение, если такого же содержимого еще нет на сайте, и возвращает ID вложения"""
+        try:
+            content_hash = await asyncio.to_thread(self.file_hash, image_path)
+        except Exception as e:
+            self.log(f"Ошибка чтения изображения {image_path}: {str(e)}", logging.ERROR)
             return None
 
-    async def publish_post(self, session, site, username, password, title, content, featured_image_id=None):
+        media_id = self.cached_media_id(site, content_hash)
+        if media_id:
+            # Вложение могли удалить на сайте: перед первым использованием в запуске его наличие проверяется
+            if (site, media_id) in self._media_checked or await self.media_exists(session, site, BasicAuth(username, password), media_id):
+                self._media_checked.add((site, media_id))
+                self.log(f"Изображение {image_path} уже загружено на {site} ранее, используется вложение {media_id}", logging.INFO)
+                return media_id
+            self.log(f"Вложение {media_id} удалено с {site}, изображение {image_path} будет загружено заново", logging.WARNING)
+            self.forget_media_id(site, media_id)
+
+        # Одинаковые файлы из разных статей, загружаемые одновременно, отправляются один раз
+        key = (site, content_hash)
+        if key in self._media_uploads:
+            return await asyncio.shield(self._media_uploads[key])
+
+        upload = asyncio.ensure_future(self.send_image(session, site, username, password, image_path, filename))
+        self._media_uploads[key] = upload
+        upload.add_done_callback(lambda _: self._media_uploads.pop(key, None))
+        media_id = await asyncio.shield(upload)
+
+        if media_id:
+            self.cache_media_id(site, content_hash, media_id)
+            self._media_checked.add((site, media_id))
+        return media_id
+
+    async def send_image(self, session, site, username, password, image_path, filename=None):
+        wp_media_url = self.api_url(site, "wp/v2/media")
+        for attempt in range(self.max_retries + 1):
+            status, retry_after = None, None
+            try:
+                self.log(f"Попытка загрузить изображение: {image_path}", logging.DEBUG)
+                # Изображение передается потоком: в памяти держится только текущий кусок файла
+                file_size = await asyncio.to_thread(os.path.getsize, image_path)
+                headers = {
+                    'Content-Disposition': f'attachment; filename={filename or os.path.basename(image_path)}',
+                    'Content-Type': mimetypes.guess_type(image_path)[0] or 'application/octet-stream',
+                    'Content-Length': str(file_size),
+                }
+
+                async with self.get_limiter(site).slot("media") as slot, \
+                        session.post(wp_media_url, headers=headers, data=self.read_file_chunks(image_path),
+                                     auth=BasicAuth(username, password),
+                                     params={'media_type': 'image', '_fields': 'id'}) as response:
+                    slot.record(response)
+                    status, retry_after = response.status, slot.retry_after
+                    if response.status == 201:
+                        json_response = await response.json()
+                        self.progress.add(bytes_sent=file_size)
+                        self.log(f"Изображение успешно загружено на {site}: {json_response['id']}", logging.INFO,
+                                 site=site, media_id=json_response['id'], bytes=file_size)
+                        return json_response['id']
+                    else:
+                        error_message = await response.text()
+                        self.log(f"Ошибка загрузки изображения на {site}: {response.status}, {error_message}", logging.ERROR)
+            except Exception as e:
+                self.log(f"Ошибка при загрузке изображения на {site}: {str(e)}", logging.ERROR)
+
+            if not self.is_retryable(status) or attempt == self.max_retries or not self._is_running or self.get_breaker(site).is_open:
+                return None
+            delay = self.retry_delay(attempt, retry_after)
+            self.log(f"Повтор загрузки {image_path} на {site} через {delay:.1f} с", logging.WARNING)
+            await asyncio.sleep(delay)
+        return None
+
+    def is_retryable(self, status):
+        """Повторять имеет смысл сетевые ошибки и таймауты (status=None), 429 и ошибки сервера"""
+        return status is None or status == 429 or status >= 500
+
+    def retry_delay(self, attempt, retry_after=None):
+        """Экспоненциальная задержка с полным джиттером; Retry-After от сервера не сокращается"""
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    async def find_post_by_slug(self, session, site, auth, slug):
+        """Ищет пост с заданным slug в любом статусе.
+
+        Возвращает (checked, post_id): checked=False, если сайт не ответил и наличие поста неизвестно.
+        """
+        try:
+            async with self.get_limiter(site).slot("lookup") as slot, \
+                    session.get(self.api_url(site, "wp/v2/posts"), auth=auth,
+                                params={'slug': slug, 'status': 'any', '_fields': 'id'}) as response:
+                slot.record(response)
+                if response.status == 200:
+                    posts = await response.json()
+                    return True, posts[0]['id'] if posts else None
+                self.log(f"Не удалось проверить наличие поста {slug} на {site}: {response.status}", logging.WARNING)
+        except Exception as e:
+            self.log(f"Не удалось проверить наличие поста {slug} на {site}: {str(e)}", logging.WARNING)
+        return False, None
+
+    async def create_post(self, session, site, auth, post_data):
+        """Отправляет запрос на создание поста и возвращает (status, body, retry_after).
+
+        В режиме batch_publishing пост уходит в общий батч сайта, если сайт поддерживает batch API.
+        """
+        if self.batch_publisher is not None:
+            result = await self.batch_publisher.submit(session, site, auth, post_data)
+            if result is not None:
+                return result
+
+        async with self.get_limiter(site).slot("post") as slot, \
+                session.post(self.api_url(site, "wp/v2/posts"), json=post_data, auth=auth,
+                             params={'_fields': 'id'}) as response:
+            slot.record(response)
+            if response.status == 201:
+                body = await response.json()
+            else:
+                body = await response.text()
+            return response.status, body, slot.retry_after
+
+    def is_invalid_media_error(self, status, body):
+        """Ответ WordPress на пост, featured_media которого не существует (вложение удалили с сайта)"""
+        return status == 400 and 'featured_media' in str(body)
+
+    async def publish_post(self, session, site, username, password, title, content, featured_image_id=None,
+                           slug=None, check_existing=False, reupload_featured_image=None):
+        """Публикует пост с повторами и возвращает его ID или None.
+
+        slug служит маркером идемпотентности: перед повтором (и перед первой попыткой при
+        check_existing) проверяется, не создал ли WordPress пост в прошлый раз, когда ответ потерялся.
+        reupload_featured_image(media_id) - корутина, которая загружает изображение заново и возвращает
+        новый ID, если сайт отклонил featured_media из кэша.
+        """
         if not self._is_running:
-            return
+            return None
 
-        wp_site_url = f"https://{site}/wp-json/wp/v2/posts"
         post_data = {"title": title, "content": content, "status": "publish"}
+        auth = BasicAuth(username, password)
 
         if featured_image_id:
             post_data["featured_media"] = featured_image_id  # Используем ID изображения, а не путь
+        if slug:
+            post_data["slug"] = slug
 
+        for attempt in range(self.max_retries + 1):
+            status, retry_after = None, None
+            try:
+                checked = True
+                if slug and (check_existing or attempt > 0):
+                    checked, existing_id = await self.find_post_by_slug(session, site, auth, slug)
+                    if existing_id:
+                        self.log(f"Пост '{title}' уже существует на {site} (ID {existing_id}), повторно не создается", logging.INFO)
+                        self.published_count += 1
+                        return existing_id
+
+                # Если наличие поста проверить не удалось, создавать его нельзя - можно получить дубль
+                if checked:
+                    status, body, retry_after = await self.create_post(session, site, auth, post_data)
+                    if status == 201:
+                        self.progress.add(bytes_sent=len(content.encode('utf-8')))
+                        self.log(f"Пост '{title}' успешно опубликован на {site}", logging.INFO,
+                                 site=site, post_id=body['id'], attempt=attempt + 1)
+                        self.published_count += 1
+                        return body['id']
+                    elif self.is_invalid_media_error(status, body) and reupload_featured_image is not None:
+                        self.log(f"Вложение {post_data['featured_media']} не найдено на {site}, изображение для '{title}' "
+                                 f"будет загружено заново", logging.WARNING, site=site)
+                        featured_image_id = await reupload_featured_image(post_data.pop('featured_media'))
+                        reupload_featured_image = None  # Загрузка заново делается один раз
+                        if featured_image_id:
+                            post_data["featured_media"] = featured_image_id
+                        continue
+                    elif status is not None:
+                        self.log(f"Ошибка публикации '{title}' на {site}: {status}, {body}", logging.ERROR,
+                                 site=site, status=status, attempt=attempt + 1)
+            except Exception as e:
+                self.log(f"Ошибка запроса на {site}: {str(e)}", logging.ERROR)
+
+            if not self.is_retryable(status) or attempt == self.max_retries or not self._is_running or self.get_breaker(site).is_open:
+                return None
+            delay = self.retry_delay(attempt, retry_after)
+            self.log(f"Повтор публикации '{title}' на {site} через {delay:.1f} с (попытка {attempt + 2} из {self.max_retries + 1})", logging.WARNING)
+            await asyncio.sleep(delay)
+        return None
+
+    async def process_article(self, session, site, credentials, article):
+        """Публикует статью и сообщает результат автомату защиты сайта.
+
+        Возвращает True - опубликована, False - ошибка публикации, None - статья пропущена.
+        """
+        breaker = self.get_breaker(site)
         try:
-            async with session.post(wp_site_url, json=post_data, auth=BasicAuth(username, password)) as response:
-                if response.status == 201:
-                    self.log(f"Пост '{title}' успешно опубликован на {site}", logging.INFO)
-                    self.published_count += 1
-                    return True
-                else:
-                    error_message = await response.text()
-                    self.log(f"Ошибка публикации '{title}' на {site}: {response.status}, {error_message}", logging.ERROR)
-                    return False
+            result = await self.publish_article(session, site, credentials, article)
         except Exception as e:
-            self.log(f"Ошибка запроса на {site}: {str(e)}", logging.ERROR)
-            return False
+            breaker.record_failure(str(e))
+            raise
+        if result:
+            breaker.record_success()
+        elif result is False:
+            was_open = breaker.is_open
+            breaker.record_failure(f"не удалось опубликовать {breaker.failures + 1} статей подряд")
+            if breaker.is_open and not was_open:
+                self.log(f"Сайт {site} временно отключен: {breaker.reason}. Проверка через {breaker.reset_timeout} с",
+                         logging.ERROR, site=site)
+        return result
 
-    async def process_article(self, session, site, credentials, article):
+    async def publish_article(self, session, site, credentials, article):
         if not self._is_running:
-            return
+            return None
 
-        article_path = os.path.join(self.base_folder, site, article)
-        
         if self.is_posted(site, article):
             self.log(f"Статья '{article}' уже была опубликована, пропуск", logging.INFO)
             self.skipped_count += 1
-            return
+            self.progress.add(skipped=1)
+            return None
+
+        if not await self.site_available(session, site, credentials):
+            self.log(f"Сайт {site} недоступен, статья '{article}' будет опубликована позже", logging.DEBUG, site=site)
+            self.postpone(site, [article])
+            return None
 
         self.log(f"Найдена новая статья: {article}", logging.INFO)
         
-        txt_file = None
-        image_files = []
-        
-        # Измененный блок для поиска всех изображений
-        for file in os.listdir(article_path):
-            if file.endswith(".txt"):
-                txt_file = os.path.join(article_path, file)
-            elif file.lower().endswith((".jpg", ".jpeg", ".png", ".gif")):
-                image_files.append(os.path.join(article_path, file))
-                self.log(f"Найдено изображение для статьи {article}: {file}", logging.INFO)
+        article_text, image_files = await asyncio.to_thread(self.load_article, site, article)
+        for _, image_name in image_files:
+            self.log(f"Найдено изображение для статьи {article}: {image_name}", logging.DEBUG)
         
-        if txt_file:
-            with open(txt_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                post_title = lines[0].strip()
-                post_content = ''.join(lines[1:]).strip()
+        if article_text:
+            post_title, post_content = article_text
+
+            # Запись о статье уже есть, значит прошлый запуск мог создать пост, не получив ответа
+            previous_state = self.get_state(site, article)
+            slug = self.post_slug(site, article)
+            self.set_state(site, article, 'pending', slug=slug)
 
             # Если есть изображения, загружаем их все
             featured_image_id = None
             uploaded_image_urls = []
+            media_ids = []
             
             if image_files:
-                for idx, image_file in enumerate(image_files):
-                    image_id = await self.upload_image(session, site, credentials['login'], credentials['password'], image_file)
-                    
-                    if image_id:
+                # Все изображения статьи загружаются одновременно в пределах лимита сайта
+                image_ids = await asyncio.gather(
+                    *(self.upload_image(session, site, credentials['login'], credentials['password'], image_file, image_name)
+                      for image_file, image_name in image_files),
+                    return_exceptions=True)
+
+                for idx, ((image_file, _), image_id) in enumerate(zip(image_files, image_ids)):
+                    if isinstance(image_id, Exception) or not image_id:
+                        reason = f": {image_id}" if isinstance(image_id, Exception) else ""
+                        self.log(f"Изображение {image_file} для статьи {article} не загружено{reason}", logging.ERROR)
+                    else:
                         self.log(f"Изображение {image_file} успешно загружено. ID: {image_id}", logging.INFO)
+                        media_ids.append(image_id)
                         # Первое изображение будет featured
                         if idx == 0:
                             featured_image_id = image_id
@@ -178,64 +700,223 @@ class WordPressPoster:
                 #if uploaded_image_urls:
                 #    post_content += "<br>" + "<br>".join(uploaded_image_urls)  # Добавляем изображения в HTML
 
+            # Состояние фиксируется до публикации: после сбоя следующий запуск сначала поищет пост по slug
+            self.set_state(site, article, 'media_uploaded', media_ids=media_ids, commit=True)
+
+            async def reupload_featured_image(media_id):
+                # Вложение из кэша удалили на сайте уже после проверки: строка кэша удаляется, файл загружается заново
+                self.forget_media_id(site, media_id)
+                image_file, image_name = image_files[0]
+                return await self.upload_image(session, site, credentials['login'], credentials['password'], image_file, image_name)
+
             # Публикуем пост с первым изображением как featured
-            success = await self.publish_post(session, site, credentials['login'], credentials['password'], post_title, post_content, featured_image_id)
-            
-            if success:
-                self.mark_as_posted(site, article)
+            post_id = await self.publish_post(session, site, credentials['login'], credentials['password'], post_title, post_content,
+                                              featured_image_id, slug=slug, check_existing=previous_state is not None,
+                                              reupload_featured_image=reupload_featured_image)
+
+            if post_id:
+                self.mark_as_posted(site, article, post_id)
+                self.progress.add(done=1)
+                return True
+            self.postpone(site, [article], 'failed')
+            return False
         else:
             self.log(f"Текстовый файл для статьи {article} не найден", logging.ERROR)
+            self.postpone(site, [article], 'failed')
+            return None
 
 
 
-    async def process_batch(self, session, site, credentials, articles):
-        if not self._is_running:
-            return
+    async def process_site(self, session, site, credentials, articles, scheduler, quota_left=None):
+        """Скользящее окно: новая статья стартует, как только завершилась предыдущая.
 
-        tasks = []
-        for article in articles:
-            self.log(f"Начата обработка статьи: {article}", logging.INFO)
-            task = asyncio.create_task(self.process_article(session, site, credentials, article))
-            tasks.append(task)
-        
-        await asyncio.gather(*tasks)
+        Размер окна равен текущему лимиту AdaptiveLimiter сайта, поэтому одна медленная
+        статья не задерживает остальные, а темп подстраивается под возможности сайта.
+        Каждая статья дополнительно занимает слот общего FairScheduler.
+        """
+        limiter = self.get_limiter(site)
+        pending = set()
+        # quota_left уже учитывает все, что опубликовано сегодня до этого прохода (posted_today),
+        # поэтому с ним сравниваются только публикации самого прохода
+        published_before = self.site_published.get(site, 0)
+
+        def published():
+            return self.site_published.get(site, 0) - published_before
+
+        async def run_article(article):
+            try:
+                await self.process_article(session, site, credentials, article)
+            finally:
+                scheduler.release(site)
+
+        for idx, article in enumerate(articles):
+            if not self._is_running:
+                break
+
+            # Статьи в работе резервируют квоту, пока не станет ясно, опубликованы ли они
+            while pending and (len(pending) >= limiter.window or
+                               (quota_left is not None and published() + len(pending) >= quota_left)):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                self.collect_finished(done)
+
+            if not await self.site_available(session, site, credentials) and not await self.wait_for_site(session, site, credentials):
+                self.log(f"Сайт {site} недоступен ({self.get_breaker(site).reason}), оставшиеся статьи будут опубликованы позже",
+                         logging.WARNING, site=site)
+                self.postpone(site, articles[idx:])
+                break
+
+            if quota_left is not None and published() >= quota_left:
+                self.log(f"Дневная квота сайта {site} исчерпана, оставшиеся статьи будут опубликованы позже", logging.INFO)
+                self.postpone(site, articles[idx:])
+                break
+
+            await scheduler.acquire(site)
+            self.log(f"Начата обработка статьи: {article} (окно {limiter.window})", logging.INFO)
+            pending.add(asyncio.create_task(run_article(article)))
+
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            self.collect_finished(done)
+        self.commit()
+
+    def collect_finished(self, tasks):
+        """Логирует ошибки завершенных задач и фиксирует отметки о публикации пачками по batch_size"""
+        for task in tasks:
+            if not task.cancelled() and task.exception() is not None:
+                self.log(f"Ошибка обработки статьи: {task.exception()}", logging.ERROR)
+                self.progress.add(failed=1)
+        if self._uncommitted >= self.batch_size:
+            self.commit()
+
+    def collect_new_articles(self, site, report=True):
+        """Возвращает неопубликованные статьи сайта.
+
+        report=False используется в режиме наблюдения: уже опубликованные статьи
+        не добавляются к счетчику пропущенных повторно, а пустые проверки не логируются.
+        """
+        # Уже опубликованные статьи отсеиваются по индексу без обращения к их папкам.
+        # Между проверками в режиме наблюдения множество поддерживает mark_as_posted.
+        if report or site not in self.posted_articles:
+            posted = self.load_posted_articles(site)
+        else:
+            posted = self.posted_articles[site]
+        if self.store.packed:
+            # В упакованном хранилище статьи видны только после записи изображений, выжидать не нужно
+            found_articles = self.store.list_articles(site)
+            scanned = found_articles, [article for article in found_articles if article not in posted]
+        else:
+            scanned = self.article_index.scan_site(site, skip=posted, settle=self.watch_settle if self.watch else 0)
+            self._uncommitted += self.article_index.take_uncommitted()
+        if scanned is None:
+            return []
+
+        found_articles, new_articles = scanned
+        already_posted = sum(1 for article in found_articles if article in posted)
+        if not report:
+            if new_articles:
+                self.log(f"Найдено {len(new_articles)} новых статей на {site}", logging.INFO)
+            return new_articles
+        self.skipped_count += already_posted
+        self.progress.add(queued=already_posted, skipped=already_posted)
+
+        if new_articles:
+            self.log(f"Найдено {len(new_articles)} новых статей на {site} (уже опубликовано: {already_posted})", logging.INFO)
+        else:
+            self.log(f"На сайте {site} нет новых статей для обработки (уже опубликовано: {already_posted}).", logging.INFO)
+        return new_articles
+
+    def create_session(self):
+        """Общая сессия с настроенным пулом соединений, кэшем DNS и keep-alive"""
+        settings = self.http_settings
+        connector = aiohttp.TCPConnector(
+            limit=settings["limit"],
+            limit_per_host=settings["limit_per_host"] or self.max_concurrency,
+            ttl_dns_cache=settings["dns_cache_ttl"],
+            keepalive_timeout=settings["keepalive_timeout"],
+        )
+        timeout = aiohttp.ClientTimeout(total=settings["request_timeout"], connect=settings["connect_timeout"])
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def warm_up(self, session):
+        """Заранее резолвит DNS и открывает соединения со всеми сайтами, чтобы первые статьи не ждали рукопожатий"""
+        async def touch(site):
+            try:
+                async with session.head(self.api_url(site, ""), allow_redirects=False) as response:
+                    await response.read()
+            except Exception as e:
+                self.log(f"Не удалось заранее подключиться к {site}: {str(e)}", logging.WARNING)
+
+        await asyncio.gather(*(touch(site) for site in self.sites_credentials))
+
+    async def process_pass(self, session, scheduler, report=True):
+        """Один проход по всем сайтам: сбор новых статей и их одновременная публикация"""
+        jobs = []
+        unavailable = set()
+        if not report:
+            # В режиме наблюдения статьи отключенных сайтов не собираются, пока проба не покажет, что сайт доступен;
+            # пробы всех сайтов идут одновременно, чтобы один зависший сайт не задерживал проход
+            sites = list(self.sites_credentials)
+            available = await asyncio.gather(*(self.site_available(session, site, self.sites_credentials[site]) for site in sites))
+            unavailable = {site for site, ok in zip(sites, available) if not ok}
+
+        for site, credentials in self.sites_credentials.items():
+            if not self._is_running:
+                break
+            if site in unavailable:
+                continue
+
+            articles = self.collect_new_articles(site, report=report)
+            if not articles:
+                continue
+
+            quota = self.daily_quota(site)
+            quota_left = None
+            if quota is not None:
+                quota_left = max(quota - self.posted_today(site), 0)
+                if report or quota_left:
+                    self.log(f"Дневная квота {site}: {quota}, осталось: {quota_left}", logging.INFO)
+                if quota_left == 0:
+                    continue
+
+            # Сумма по всем сайтам за все проходы, а не число статей последнего сайта; отложенные статьи считаются один раз
+            self.total_articles += self.queue_articles(site, articles)
+            jobs.append(self.process_site(session, site, credentials, articles, scheduler, quota_left))
+
+        await asyncio.gather(*jobs)
+
+    async def watch_for_articles(self, session, scheduler):
+        """Режим наблюдения: проверяет папки каждые watch_interval секунд до остановки.
+
+        Проверка дешевая благодаря индексу: перечитываются только папки, mtime которых изменился.
+        """
+        self.log(f"Ожидание новых статей (проверка каждые {self.watch_interval} с)", logging.INFO)
+        while self._is_running:
+            waited = 0.0
+            while self._is_running and waited < self.watch_interval:
+                await asyncio.sleep(min(1.0, self.watch_interval - waited))
+                waited += 1.0
+            if self._is_running:
+                await self.process_pass(session, scheduler, report=False)
 
     async def process_sites_with_batches(self):
+        """Обрабатывает все сайты одновременно под общим лимитом с учетом весов и дневных квот"""
         try:
-            async with aiohttp.ClientSession() as session:
-                for site, credentials in self.sites_credentials.items():
-                    if not self._is_running:
-                        break
-                    
-                    site_path = os.path.join(self.base_folder, site)
-                    
-                    if os.path.isdir(site_path):
-                        self.log(f"Обработка сайта: {site}", logging.INFO)
-                        
-                        all_articles = [article for article in os.listdir(site_path) if os.path.isdir(os.path.join(site_path, article))]
-                        total_articles = len(all_articles)
-
-                        if total_articles == 0:
-                            self.log(f"На сайте {site} не найдено статей для обработки.", logging.INFO)
-                            continue
-                        
-                        self.log(f"Найдено {total_articles} статей на {site}", logging.INFO)
-                        self.total_articles = total_articles
-
-                        for i in range(0, total_articles, self.batch_size):
-                            if not self._is_running:
-                                break
-                            
-                            batch_articles = all_articles[i:i + self.batch_size]
-                            self.log(f"Обрабатывается батч {i // self.batch_size + 1}: {len(batch_articles)} статей", logging.INFO)
-                            
-                            await self.process_batch(session, site, credentials, batch_articles)
-                            
-                            if i + self.batch_size < total_articles:
-                                self.log(f"Пауза перед следующим батчем на {self.pause_between_batches} секунд", logging.INFO)
-                                await asyncio.sleep(self.pause_between_batches)
+            scheduler = FairScheduler(self.max_total_concurrency,
+                                      {site: self.site_weight(site) for site in self.sites_credentials})
+            async with self.create_session() as session:
+                if self.http_settings["preflight"]:
+                    await self.preflight(session)
+                elif self.http_settings["warm_up"]:
+                    await self.warm_up(session)
+
+                await self.process_pass(session, scheduler)
+                if self.watch:
+                    await self.watch_for_articles(session, scheduler)
 
                 self.log(f"Обработка завершена. Всего статей: {self.total_articles}, опубликовано: {self.published_count}, пропущено: {self.skipped_count}", logging.INFO)
         except Exception as e:
             self.log(f"Неожиданная ошибка: {str(e)}", logging.ERROR)
-            self.log(traceback.format_exc(), logging.ERROR)
\ No newline at end of file
+            self.log(traceback.format_exc(), logging.ERROR)
+        finally:
+            self.commit()
+            self.progress.finish()
@@ -3,9 +3,11 @@ import sys
 import json
 import asyncio
 import logging
-from PyQt6.QtWidgets import (QApplication, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog, QMessageBox, QCheckBox, QPlainTextEdit)
+from PyQt6.QtWidgets import (QApplication, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog, QMessageBox, QCheckBox, QPlainTextEdit, QProgressBar)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from WordPressPoster.WordPressPoster import WordPressPoster  # Импортируем класс WordPressPoster.
+from Common.log_sink import LogSink
+from Common.log_setup import get_logger
 from pathlib import Path
 
 def resource_path(relative_path):
@@ -18,13 +20,18 @@ def resource_path(relative_path):
 
 class WordPressPosterThread(QThread):
     finished = pyqtSignal()
+    progress_signal = pyqtSignal(object)  # ProgressEvent, не чаще двух раз в секунду
 
     def __init__(self, wp_poster):
         super().__init__()
         self.wp_poster = wp_poster
+        self.wp_poster.progress.callback = self.progress_signal.emit
 
     def run(self):
-        asyncio.run(self.wp_poster.process_sites_with_batches())
+        try:
+            asyncio.run(self.wp_poster.process_sites_with_batches())
+        finally:
+            self.wp_poster.close()
         self.finished.emit()
 
 class WordPressGUI(QWidget):
@@ -41,6 +48,10 @@ class WordPressGUI(QWidget):
         # Элементы интерфейса
         self.initUI()
 
+        # Поле логов получает сообщения пачками по таймеру, полная история остается в wordpress_poster.log
+        self.log_sink = LogSink(self.log_output)
+        self.logger.addHandler(self.log_sink)
+
         # Загрузка настроек
         self.load_settings()
 
@@ -52,26 +63,8 @@ class WordPressGUI(QWidget):
         self.has_errors = False
 
     def setup_logger(self):
-        """Настройка логирования"""
-        logger = logging.getLogger('WordPressPosterLogger')
-        logger.setLevel(logging.DEBUG)
-
-        # Логгер в файл
-        file_handler = logging.FileHandler('wordpress_poster.log')
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(file_formatter)
-
-        # Логгер для командной строки
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
-        console_handler.setFormatter(file_formatter)
-
-        # Добавляем обработчики
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-
-        return logger
+        """Настройка логирования: файл и консоль пишутся в отдельном потоке, обработчики не дублируются"""
+        return get_logger('WordPressPosterLogger', 'wordpress_poster.log', level=logging.DEBUG)
 
     def initUI(self):
         self.setWindowTitle('WordPress Poster')
@@ -95,10 +88,20 @@ class WordPressGUI(QWidget):
         self.advanced_settings_checkbox = QCheckBox('Show Advanced Settings')
         self.advanced_settings_checkbox.stateChanged.connect(self.toggle_advanced_settings)
 
-        self.batch_size_label = QLabel('Batch Size:')
+        self.batch_size_label = QLabel('Initial Concurrency per Site:')
         self.batch_size_input = QLineEdit()
-        self.pause_label = QLabel('Pause Between Batches (s):')
+        self.max_concurrency_label = QLabel('Max Concurrency per Site:')
+        self.max_concurrency_input = QLineEdit()
+        self.max_total_concurrency_label = QLabel('Max Concurrency (all sites):')
+        self.max_total_concurrency_input = QLineEdit()
+        self.pause_label = QLabel('Pause After 429 (s):')
         self.pause_input = QLineEdit()
+        self.batch_publishing_checkbox = QCheckBox('Publish via WordPress batch API (/batch/v1)')
+        self.watch_checkbox = QCheckBox('Keep running and publish new articles as they appear')
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        self.progress_label = QLabel('')
 
         self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
@@ -132,16 +135,30 @@ class WordPressGUI(QWidget):
         self.advanced_settings_layout = QVBoxLayout()
         self.advanced_settings_layout.addWidget(self.batch_size_label)
         self.advanced_settings_layout.addWidget(self.batch_size_input)
+        self.advanced_settings_layout.addWidget(self.max_concurrency_label)
+        self.advanced_settings_layout.addWidget(self.max_concurrency_input)
+        self.advanced_settings_layout.addWidget(self.max_total_concurrency_label)
+        self.advanced_settings_layout.addWidget(self.max_total_concurrency_input)
         self.advanced_settings_layout.addWidget(self.pause_label)
         self.advanced_settings_layout.addWidget(self.pause_input)
+        self.advanced_settings_layout.addWidget(self.batch_publishing_checkbox)
+        self.advanced_settings_layout.addWidget(self.watch_checkbox)
         self.advanced_settings_layout.setContentsMargins(20, 0, 20, 0)
 
         self.batch_size_label.hide()
         self.batch_size_input.hide()
+        self.max_concurrency_label.hide()
+        self.max_concurrency_input.hide()
+        self.max_total_concurrency_label.hide()
+        self.max_total_concurrency_input.hide()
         self.pause_label.hide()
         self.pause_input.hide()
+        self.batch_publishing_checkbox.hide()
+        self.watch_checkbox.hide()
 
         layout.addLayout(self.advanced_settings_layout)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.progress_label)
         layout.addWidget(self.log_output)
 
         buttons_layout = QHBoxLayout()
@@ -161,13 +178,25 @@ class WordPressGUI(QWidget):
         if self.advanced_settings_checkbox.isChecked():
             self.batch_size_label.show()
             self.batch_size_input.show()
+            self.max_concurrency_label.show()
+            self.max_concurrency_input.show()
+            self.max_total_concurrency_label.show()
+            self.max_total_concurrency_input.show()
             self.pause_label.show()
             self.pause_input.show()
+            self.batch_publishing_checkbox.show()
+            self.watch_checkbox.show()
         else:
             self.batch_size_label.hide()
             self.batch_size_input.hide()
+            self.max_concurrency_label.hide()
+            self.max_concurrency_input.hide()
+            self.max_total_concurrency_label.hide()
+            self.max_total_concurrency_input.hide()
             self.pause_label.hide()
             self.pause_input.hide()
+            self.batch_publishing_checkbox.hide()
+            self.watch_checkbox.hide()
 
     def browse_base_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, 'Select Base Folder')
@@ -188,25 +217,52 @@ class WordPressGUI(QWidget):
         if not os.path.exists(self.settings_folder):
             os.makedirs(self.settings_folder)
 
+        # Квоты и веса сайтов задаются только в файле настроек:
+        # "site_limits": {"site.com": {"weight": 2, "daily_quota": 100}}, "default_daily_quota": 50
+        self.site_limits = {}
+        self.default_daily_quota = None
+        # Настройки пула HTTP-соединений: "http": {"limit": 100, "limit_per_host": 20, "dns_cache_ttl": 600, ...}
+        self.http_settings = {}
+        # Интервал проверки папок в режиме наблюдения: "watch_interval": 30
+        self.watch_interval = 30
+
         if os.path.exists(self.settings_file):
             with open(self.settings_file, 'r') as f:
                 settings = json.load(f)
+                self.site_limits = settings.get('site_limits', {})
+                self.default_daily_quota = settings.get('default_daily_quota')
+                self.http_settings = settings.get('http', {})
+                self.watch_interval = settings.get('watch_interval', 30)
                 self.batch_size_input.setText(str(settings.get('batch_size', '5')))
+                self.max_concurrency_input.setText(str(settings.get('max_concurrency', '20')))
+                self.max_total_concurrency_input.setText(str(settings.get('max_total_concurrency', '50')))
                 self.pause_input.setText(str(settings.get('pause_between_batches', '10')))
+                self.batch_publishing_checkbox.setChecked(settings.get('batch_publishing', False))
+                self.watch_checkbox.setChecked(settings.get('watch', False))
                 self.base_folder_input.setText(settings.get('base_folder', ''))
                 self.credentials_file_input.setText(settings.get('credentials_file', ''))
                 self.db_file_input.setText(settings.get('db_file', ''))
         else:
             self.batch_size_input.setText('5')
+            self.max_concurrency_input.setText('20')
+            self.max_total_concurrency_input.setText('50')
             self.pause_input.setText('10')
 
     def save_settings(self):
         settings = {
             'batch_size': int(self.batch_size_input.text()),
+            'max_concurrency': int(self.max_concurrency_input.text()),
+            'max_total_concurrency': int(self.max_total_concurrency_input.text()),
             'pause_between_batches': int(self.pause_input.text()),
+            'batch_publishing': self.batch_publishing_checkbox.isChecked(),
+            'watch': self.watch_checkbox.isChecked(),
+            'watch_interval': self.watch_interval,
             'base_folder': self.base_folder_input.text(),
             'credentials_file': self.credentials_file_input.text(),
-            'db_file': self.db_file_input.text()
+            'db_file': self.db_file_input.text(),
+            'site_limits': self.site_limits,
+            'default_daily_quota': self.default_daily_quota,
+            'http': self.http_settings
         }
 
         with open(self.settings_file, 'w') as f:
@@ -215,17 +271,9 @@ class WordPressGUI(QWidget):
         QMessageBox.information(self, 'Settings Saved', 'Settings have been saved successfully!')
 
     def log_message(self, message, level="INFO"):
-        color = "black"
+        # В поле логов сообщение попадет через LogSink вместе с сообщениями постера
         if level == "ERROR":
-            color = "red"
             self.has_errors = True
-        elif level == "WARNING":
-            color = "orange"
-
-        self.log_output.appendHtml(f'<span style="color:{color}">{message}</span>')
-        self.log_output.repaint()
-
-        if level == "ERROR":
             self.logger.error(message)
         elif level == "WARNING":
             self.logger.warning(message)
@@ -236,6 +284,8 @@ class WordPressGUI(QWidget):
         try:
             self.has_errors = False
             batch_size = int(self.batch_size_input.text())
+            max_concurrency = int(self.max_concurrency_input.text())
+            max_total_concurrency = int(self.max_total_concurrency_input.text())
             pause_between_batches = int(self.pause_input.text())
             base_folder = self.base_folder_input.text()
             credentials_file = self.credentials_file_input.text()
@@ -250,16 +300,29 @@ class WordPressGUI(QWidget):
                 QMessageBox.critical(self, 'Error', 'One or more paths are invalid.')
                 return
 
-            self.wp_poster = WordPressPoster(base_folder, credentials_file, db_file, batch_size=batch_size, pause_between_batches=pause_between_batches, logger=self.logger)
+            self.wp_poster = WordPressPoster(base_folder, credentials_file, db_file, batch_size=batch_size, pause_between_batches=pause_between_batches, logger=self.logger, max_concurrency=max_concurrency,
+                                          max_total_concurrency=max_total_concurrency, site_limits=self.site_limits,
+                                          default_daily_quota=self.default_daily_quota,
+                                          http_settings=self.http_settings,
+                                          batch_publishing=self.batch_publishing_checkbox.isChecked(),
+                                          watch=self.watch_checkbox.isChecked(), watch_interval=self.watch_interval)
 
             self.thread = WordPressPosterThread(self.wp_poster)
+            self.thread.progress_signal.connect(self.update_progress)
+            self.progress_bar.setValue(0)
+            self.progress_label.setText('')
             self.thread.start()
             self.thread.finished.connect(self.on_poster_finished)
             self.log_message('WordPress Poster started successfully!', "INFO")
 
         except ValueError:
-            self.log_message('Invalid input for batch size or pause.', "ERROR")
-            QMessageBox.critical(self, 'Error', 'Invalid input for batch size or pause.')
+            self.log_message('Invalid input for concurrency or pause.', "ERROR")
+            QMessageBox.critical(self, 'Error', 'Invalid input for concurrency or pause.')
+
+    def update_progress(self, event):
+        self.progress_bar.setMaximum(max(event.queued, 1))
+        self.progress_bar.setValue(event.processed)
+        self.progress_label.setText(event.summary())
 
     def stop_poster(self):
         if self.thread:
@@ -276,6 +339,12 @@ class WordPressGUI(QWidget):
             QMessageBox.information(self, 'Finished', 'WordPress Poster finished successfully!')
         self.thread = None
 
+    def closeEvent(self, event):
+        # Логгер общий для всех окон постера, поле этого окна больше не должно получать сообщения
+        self.logger.removeHandler(self.log_sink)
+        self.log_sink.close()
+        event.accept()
+
 def load_styles(app):
     style_path = os.path.join(os.getcwd(), 'style.qss')
     if os.path.exists(style_path):
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+
+
+class ArticleIndex:
+    """Постоянный индекс папок статей в базе постера.
+
+    Для каждой папки хранится mtime (в наносекундах) на момент сканирования.
+    Список статей сайта перечитывается через os.scandir только когда изменился
+    mtime папки сайта (статью добавили, удалили или переименовали), а файлы
+    статьи - только когда изменился mtime ее папки. Опубликованные статьи
+    вообще не проверяются, поэтому повторный запуск на большом дереве
+    сводится к одному stat на сайт и одному stat на неопубликованную статью.
+    Индекс пишет в соединение постера, но транзакцию не фиксирует: число записей
+    забирает постер (take_uncommitted) и фиксирует их вместе с отметками о публикации.
+    """
+
+    def __init__(self, conn, base_folder, racy_window=2.0):
+        self.conn = conn
+        self.base_folder = base_folder
+        # mtime моложе racy_window секунд не кэшируется: папку могут изменить
+        # в ту же "тиковую" единицу времени файловой системы сразу после сканирования
+        self.racy_window_ns = int(racy_window * 1e9)
+        self._files = {}  # (site, article) -> (txt_file, image_files) последнего сканирования
+        self._uncommitted = 0  # Записи в индекс, еще не зафиксированные постером
+
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS folder_index (
+                                path TEXT PRIMARY KEY,
+                                mtime_ns INTEGER
+                            )''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS article_index (
+                                site TEXT,
+                                article TEXT,
+                                mtime_ns INTEGER,
+                                txt_file TEXT,
+                                images TEXT,
+                                PRIMARY KEY (site, article)
+                            )''')
+        self.conn.commit()
+
+    def _cacheable(self, mtime_ns, now_ns):
+        return mtime_ns if now_ns - mtime_ns >= self.racy_window_ns else None
+
+    @staticmethod
+    def scan_article(article_path):
+        """Имена текстового файла и изображений статьи (порядок изображений стабилен: первое - featured)"""
+        txt_file = None
+        images = []
+        with os.scandir(article_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(".txt"):
+                    txt_file = entry.name
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(entry.name)
+        return txt_file, sorted(images)
+
+    def list_articles(self, site):
+        """Все папки статей сайта: из индекса, если папка сайта не менялась, иначе через scandir"""
+        site_path = os.path.join(self.base_folder, site)
+        try:
+            site_mtime = os.stat(site_path).st_mtime_ns
+        except OSError:
+            return None
+
+        row = self.conn.execute("SELECT mtime_ns FROM folder_index WHERE path = ?", (site,)).fetchone()
+        if row and row[0] == site_mtime:
+            return [article for (article,) in
+                    self.conn.execute("SELECT article FROM article_index WHERE site = ?", (site,))]
+
+        with os.scandir(site_path) as entries:
+            articles = [entry.name for entry in entries if entry.is_dir()]
+
+        known = {article for (article,) in
+                 self.conn.execute("SELECT article FROM article_index WHERE site = ?", (site,))}
+        removed = known.difference(articles)
+        if removed:
+            self.conn.executemany("DELETE FROM article_index WHERE site = ? AND article = ?",
+                                  ((site, article) for article in removed))
+        # Новые папки попадают в индекс без mtime и будут просканированы, как только понадобятся
+        self.conn.executemany("INSERT OR IGNORE INTO article_index (site, article) VALUES (?, ?)",
+                              ((site, article) for article in articles if article not in known))
+        self.conn.execute("INSERT OR REPLACE INTO folder_index (path, mtime_ns) VALUES (?, ?)",
+                          (site, self._cacheable(site_mtime, time.time_ns())))
+        self._uncommitted += 1
+        return articles
+
+    def scan_site(self, site, skip=(), settle=0):
+        """Возвращает (все статьи, статьи для обработки) сайта или None, если папки сайта нет.
+
+        skip - уже опубликованные статьи, их папки не проверяются.
+        settle - статьи, папка которых менялась менее settle секунд назад, откладываются
+        (в режиме наблюдения генератор может еще дописывать изображения).
+        """
+        articles = self.list_articles(site)
+        if articles is None:
+            return None
+
+        cached = {article: (mtime_ns, txt_file, images) for article, mtime_ns, txt_file, images in
+                  self.conn.execute("SELECT article, mtime_ns, txt_file, images FROM article_index WHERE site = ?", (site,))}
+        now_ns = time.time_ns()
+        settle_ns = int(settle * 1e9)
+        ready = []
+        updates = []
+        for article in sorted(articles):
+            if article in skip:
+                continue
+            article_path = os.path.join(self.base_folder, site, article)
+            try:
+                mtime_ns = os.stat(article_path).st_mtime_ns
+            except OSError:
+                continue  # Папку удалили после чтения списка
+            if settle_ns and now_ns - mtime_ns < settle_ns:
+                continue
+
+            stored_mtime, txt_file, images = cached.get(article, (None, None, None))
+            if stored_mtime == mtime_ns:
+                images = json.loads(images) if images else []
+            else:
+                try:
+                    txt_file, images = self.scan_article(article_path)
+                except OSError:
+                    continue
+                updates.append((self._cacheable(mtime_ns, now_ns), txt_file, json.dumps(images), site, article))
+
+            self._files[(site, article)] = (txt_file, images)
+            ready.append(article)
+
+        if updates:
+            self.conn.executemany("""INSERT INTO article_index (mtime_ns, txt_file, images, site, article)
+                                     VALUES (?, ?, ?, ?, ?)
+                                     ON CONFLICT (site, article) DO UPDATE SET
+                                         mtime_ns = excluded.mtime_ns,
+                                         txt_file = excluded.txt_file,
+                                         images = excluded.images""", updates)
+            self._uncommitted += len(updates)
+        return articles, ready
+
+    def take_uncommitted(self):
+        """Число записей в индекс с прошлого вызова (их фиксирует владелец соединения)"""
+        count, self._uncommitted = self._uncommitted, 0
+        return count
+
+    def files(self, site, article):
+        """Полные пути к текстовому файлу и изображениям статьи.
+
+        Берутся из последнего scan_site; статьи, которых там не было, сканируются на месте.
+        Метод не пишет в базу, поэтому его можно вызывать из asyncio.to_thread.
+        """
+        article_path = os.path.join(self.base_folder, site, article)
+        entry = self._files.pop((site, article), None)
+        if entry is None:
+            entry = self.scan_article(article_path)
+        txt_file, images = entry
+        return (os.path.join(article_path, txt_file) if txt_file else None,
+                [os.path.join(article_path, image) for image in images])
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+
+
+class BatchPublisher:
+    """Собирает создание постов одного сайта в запросы к /wp-json/batch/v1.
+
+    Каждый вызов submit() ждет результат своего поста, поэтому ответы батча
+    сопоставляются со статьями без дополнительной бухгалтерии. Батч отправляется,
+    когда набралось max_items постов или прошло linger секунд с первого из них.
+    Сайты без batch API (WordPress < 5.6 или отключенный эндпоинт) определяются
+    один раз и дальше публикуются обычными запросами.
+    """
+
+    def __init__(self, poster, linger=0.25, max_items=25):
+        self.poster = poster
+        self.linger = linger
+        self.max_items = max_items  # Верхняя граница; сайт может сообщить меньшую
+        self._site_limits = {}  # site -> максимальный размер батча или 0, если batch API нет
+        self._detecting = {}  # site -> задача проверки поддержки
+        self._pending = {}  # site -> [(post_data, future)]
+        self._timers = {}
+        self._tasks = set()
+
+    async def batch_size(self, session, site, auth):
+        """Максимальный размер батча для сайта (0 - сайт не поддерживает batch API)"""
+        if site in self._site_limits:
+            return self._site_limits[site]
+        if site not in self._detecting:
+            self._detecting[site] = asyncio.ensure_future(self._detect(session, site, auth))
+        return await asyncio.shield(self._detecting[site])
+
+    async def _detect(self, session, site, auth):
+        limit = 0
+        try:
+            async with session.options(self.poster.api_url(site, "batch/v1"), auth=auth) as response:
+                if response.status == 200:
+                    schema = await response.json()
+                    limit = self.max_items
+                    for endpoint in schema.get("endpoints", []):
+                        max_items = endpoint.get("args", {}).get("requests", {}).get("maxItems")
+                        if max_items:
+                            limit = min(limit, max_items)
+        except Exception as e:
+            self.poster.log(f"Не удалось проверить batch API на {site}: {str(e)}", logging.WARNING)
+
+        if limit:
+            self.poster.log(f"Сайт {site} поддерживает batch API, до {limit} постов в запросе", logging.INFO)
+        else:
+            self.poster.log(f"Сайт {site} не поддерживает batch API, посты публикуются по одному", logging.INFO)
+        self._site_limits[site] = limit
+        return limit
+
+    async def submit(self, session, site, auth, post_data):
+        """Ставит пост в батч и ждет результат.
+
+        Возвращает (status, body, retry_after) как у одиночного запроса или None,
+        если сайт не поддерживает batch API и пост нужно отправить обычным запросом.
+        """
+        limit = await self.batch_size(session, site, auth)
+        if not limit:
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._pending.setdefault(site, [])
+        queue.append((post_data, future))
+        if len(queue) >= limit:
+            self._flush(session, site, auth)
+        elif len(queue) == 1:
+            self._timers[site] = asyncio.get_running_loop().call_later(self.linger, self._flush, session, site, auth)
+        return await future
+
+    def _flush(self, session, site, auth):
+        timer = self._timers.pop(site, None)
+        if timer:
+            timer.cancel()
+        items = self._pending.pop(site, [])
+        if items:
+            task = asyncio.ensure_future(self._send(session, site, auth, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, session, site, auth, items):
+        payload = {
+            "validation": "normal",
+            "requests": [{"method": "POST", "path": "/wp/v2/posts?_fields=id", "body": post_data}
+                         for post_data, _ in items],
+        }
+        results = None
+        try:
+            async with self.poster.get_limiter(site).slot("batch") as slot, \
+                    session.post(self.poster.api_url(site, "batch/v1"), json=payload, auth=auth) as response:
+                slot.record(response)
+                if response.status in (200, 207):
+                    body = await response.json()
+                    results = [(item.get("status"), item.get("body"), None) for item in body.get("responses", [])]
+                    self.poster.log(f"Отправлен батч из {len(items)} постов на {site}", logging.INFO)
+                elif response.status in (400, 404, 405, 501):
+                    # Эндпоинт недоступен: дальше публикуем по одному, ответ None означает "отправь сам"
+                    self._site_limits[site] = 0
+                    self.poster.log(f"Batch API на {site} недоступен ({response.status}), переход на одиночные запросы", logging.WARNING)
+                    results = [None] * len(items)
+                else:
+                    error_message = await response.text()
+                    self.poster.log(f"Ошибка батча на {site}: {response.status}, {error_message}", logging.ERROR)
+                    results = [(response.status, error_message, slot.retry_after)] * len(items)
+        except Exception as e:
+            self.poster.log(f"Ошибка отправки батча на {site}: {str(e)}", logging.ERROR)
+
+        if results is None or len(results) != len(items):
+            # Исход неизвестен (таймаут и т.п.): как у одиночного запроса без ответа,
+            # повтор в publish_post сначала проверит, не созданы ли посты
+            results = [(None, None, None)] * len(items)
+
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,261 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class RequestSlot:
+    """Результат одного запроса, который сообщается ограничителю при освобождении слота"""
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+    def record(self, response):
+        self.status = response.status
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            self.retry_after = int(retry_after)
+
+
+class AdaptiveLimiter:
+    """Ограничитель одновременных запросов к одному сайту с подстройкой по AIMD.
+
+    Пока ответы быстрые и успешные (2xx), лимит растет примерно на increase_step за каждое
+    "окно" завершенных запросов. При 429/5xx, сетевых ошибках или росте задержки выше
+    latency_tolerance от обычной лимит умножается на decrease_factor. Ответ 429 вдобавок
+    приостанавливает новые запросы на Retry-After (или pause_on_429) секунд.
+    Обычная задержка считается отдельно для каждого вида запросов (kind в slot()): загрузка
+    изображения всегда дольше создания поста, и общая оценка принимала бы ее за перегрузку.
+    """
+
+    def __init__(self, initial_limit=5, min_limit=1, max_limit=50, increase_step=1.0, decrease_factor=0.5,
+                 latency_tolerance=2.0, pause_on_429=10):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.pause_on_429 = pause_on_429
+
+        self.in_flight = 0
+        self.baseline_latency = {}  # Сглаженная задержка успешных ответов по видам запросов
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def window(self):
+        """Текущее целое число разрешенных одновременных запросов"""
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self):
+        async with self._condition:
+            while True:
+                delay = self._paused_until - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < self.window:
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self, status=None, latency=None, retry_after=None, kind=None):
+        async with self._condition:
+            self.in_flight -= 1
+            self._update(status, latency, retry_after, kind)
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, kind=None):
+        """Занимает слот на время запроса; вызывающий код записывает ответ через slot.record().
+
+        kind - вид запроса ("media", "post", "lookup"...), задержка сравнивается с обычной для этого вида.
+        """
+        request_slot = RequestSlot()
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield request_slot
+        finally:
+            await self.release(request_slot.status, time.monotonic() - started, request_slot.retry_after, kind)
+
+    def _update(self, status, latency, retry_after, kind=None):
+        now = time.monotonic()
+        started = now - (latency or 0)
+
+        if status == 429:
+            self._paused_until = max(self._paused_until, now + (retry_after or self.pause_on_429))
+
+        if status is None or status == 429 or status >= 500:
+            self._decrease(started, now)
+            return
+
+        if not 200 <= status < 300:
+            # Ошибки клиента (404, 401 и т.п.) ничего не говорят о нагрузке на сайт
+            return
+
+        if latency is not None:
+            baseline = self.baseline_latency.get(kind)
+            if baseline is None:
+                self.baseline_latency[kind] = latency
+            elif latency > baseline * self.latency_tolerance:
+                self._decrease(started, now)
+                return
+            else:
+                self.baseline_latency[kind] = 0.9 * baseline + 0.1 * latency
+
+        self.limit = min(self.max_limit, self.limit + self.increase_step / self.limit)
+
+    def _decrease(self, started, now):
+        # Запросы, начатые до последнего снижения, уже учтены в нем и повторно лимит не режут
+        if started < self._last_decrease:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+
+
+class FairScheduler:
+    """Общий лимит статей в работе для всех сайтов с честным распределением по весам.
+
+    Свободный слот получает ожидающий сайт с наименьшим "виртуальным временем" -
+    числом выданных ему слотов, деленным на вес. Поэтому сайт с большой очередью
+    не вытесняет остальные, а сайт с весом 2 получает вдвое больше слотов, чем с весом 1.
+    """
+
+    def __init__(self, max_in_flight=50, weights=None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.weights = weights or {}
+        self.in_flight = 0
+        self.virtual_time = {}
+        self._waiters = {}  # Очереди ожидающих future по сайтам
+
+    def weight(self, site):
+        return max(self.weights.get(site) or 1, 0.01)
+
+    async def acquire(self, site):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self._grant(site)
+            return
+
+        if site not in self._waiters:
+            # Сайт, долго не ждавший слотов, не должен получить их все сразу за "накопленное" время
+            waiting = [self.virtual_time.get(other, 0.0) for other in self._waiters]
+            if waiting:
+                self.virtual_time[site] = max(self.virtual_time.get(site, 0.0), min(waiting))
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(site, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но забрать его не успели - возвращаем
+                self.release(site)
+            else:
+                self._discard(site, future)
+            raise
+
+    def release(self, site):
+        self.in_flight -= 1
+        self._wake()
+
+    def _grant(self, site):
+        self.in_flight += 1
+        self.virtual_time[site] = self.virtual_time.get(site, 0.0) + 1 / self.weight(site)
+
+    def _discard(self, site, future):
+        queue = self._waiters.get(site)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiters[site]
+
+    def _wake(self):
+        while self.in_flight < self.max_in_flight and self._waiters:
+            site = min(self._waiters, key=lambda name: self.virtual_time.get(name, 0.0))
+            queue = self._waiters[site]
+            future = queue.popleft()
+            if not queue:
+                del self._waiters[site]
+            if future.cancelled():
+                continue
+            self._grant(site)
+            future.set_result(None)
+
+
+class CircuitBreaker:
+    """Автомат защиты сайта: после failure_threshold неудач подряд сайт считается недоступным.
+
+    closed - работа идет как обычно. open - статьи сайта пропускаются сразу, без запросов
+    и ожидания таймаутов. Через reset_timeout секунд автомат переходит в half_open и
+    пропускает одну пробу: успех закрывает его, неудача снова открывает с удвоенным
+    (до max_reset_timeout) интервалом. Неудачи обычных статей во время пробы не учитываются.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=60, max_reset_timeout=900):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.reason = None
+        self.exhausted = False  # Проба не прошла и при максимальном интервале
+        self._opened_at = 0.0
+
+    @property
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def probe_due(self):
+        """True, если автомат открыт достаточно долго и пора делать пробу (переводит его в half_open)"""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def probe_delay(self):
+        """Секунд до следующей пробы (0, если проба уже идет или пора ее делать)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.reason = None
+        self.exhausted = False
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, reason=None, probe=False):
+        """Неудача статьи или, при probe=True, пробной проверки сайта.
+
+        Интервал до следующей пробы меняет только результат пробы: статьи, начатые до
+        срабатывания автомата, могут завершиться ошибкой, пока проба еще идет.
+        """
+        if self.state == self.HALF_OPEN:
+            if not probe:
+                return
+            self.failures += 1
+            self.exhausted = self.reset_timeout >= self.max_reset_timeout
+            # Проба не прошла - следующая будет позже
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self.trip(reason)
+            return
+        self.failures += 1
+        if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self.trip(reason)
+
+    def trip(self, reason=None):
+        """Открывает автомат сразу (например, если сайт не прошел предварительную проверку)"""
+        self.state = self.OPEN
+        self.reason = reason or self.reason
+        self._opened_at = time.monotonic()
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import traceback
+
+from WordPressPoster.concurrency import FairScheduler
+
+
+class PublishingPipeline:
+    """Генерация и публикация в одном цикле событий: каждая готовая статья сразу уходит на сайт.
+
+    Генератор и постер работают с одной HTTP-сессией постера (общий пул соединений и кэш DNS).
+    Генератор кладет записанную статью (вместе с изображениями) в ограниченную очередь, постер
+    забирает ее и публикует через process_article под общим FairScheduler и лимитами сайтов.
+    Когда очередь заполнена (сайты не успевают), генератор ждет, поэтому статьи не копятся
+    в памяти, а первые статьи появляются на сайтах, пока остальные еще генерируются.
+    Статьи, которые не удалось опубликовать сразу (сайт отключен автоматом защиты, исчерпана
+    дневная квота), остаются в хранилище и публикуются следующим запуском постера.
+    """
+
+    def __init__(self, generator, poster, queue_size=20):
+        self.generator = generator
+        self.poster = poster
+        self.queue_size = queue_size
+
+    async def run(self, image_downloader):
+        poster = self.poster
+        scheduler = FairScheduler(poster.max_total_concurrency,
+                                  {site: poster.site_weight(site) for site in poster.sites_credentials})
+        queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def enqueue(site, article):
+            await queue.put((site, article))
+
+        self.generator.article_sink = enqueue
+        try:
+            async with poster.create_session() as session:
+                # Проверка сайтов идет одновременно с генерацией первых статей
+                check = asyncio.ensure_future(poster.preflight(session) if poster.http_settings["preflight"]
+                                              else poster.warm_up(session))
+                consumer = asyncio.create_task(self.publish(session, queue, scheduler, check))
+                try:
+                    await self.generator.generate_article_single_request(image_downloader, session=session)
+                finally:
+                    await queue.put(None)
+                    await consumer
+                poster.log(f"Обработка завершена. Всего статей: {poster.total_articles}, опубликовано: {poster.published_count}, "
+                           f"пропущено: {poster.skipped_count}", logging.INFO)
+        finally:
+            self.generator.article_sink = None
+            poster.commit()
+            poster.progress.finish()
+
+    async def publish(self, session, queue, scheduler, check):
+        """Забирает статьи из очереди и публикует их, пока генератор не положит None"""
+        try:
+            await self.consume(session, queue, scheduler, check)
+        except Exception as e:
+            self.poster.log(f"Ошибка публикации во время генерации: {str(e)}", logging.ERROR)
+            self.poster.log(traceback.format_exc(), logging.ERROR)
+            # Генерация продолжается, статьи остаются в хранилище для следующего запуска постера
+            while await queue.get() is not None:
+                pass
+
+    async def consume(self, session, queue, scheduler, check):
+        poster = self.poster
+        pending = set()
+        in_work = {}  # Статьи сайта в работе: резервируют дневную квоту, пока не ясно, опубликованы ли они
+        quota_left = {}
+        await check
+
+        async def run_article(site, credentials, article):
+            try:
+                await poster.process_article(session, site, credentials, article)
+            finally:
+                in_work[site] -= 1
+                scheduler.release(site)
+
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            site, article = item
+            poster.total_articles += 1
+            poster.progress.add(queued=1)
+
+            credentials = poster.sites_credentials.get(site)
+            if credentials is None:
+                poster.log(f"Нет учетных данных для сайта {site}, статья '{article}' не будет опубликована", logging.WARNING, site=site)
+                poster.progress.add(skipped=1)
+                continue
+
+            if site not in quota_left:
+                quota = poster.daily_quota(site)
+                quota_left[site] = max(quota - poster.posted_today(site), 0) if quota is not None else None
+            if quota_left[site] is not None and poster.site_published.get(site, 0) + in_work.get(site, 0) >= quota_left[site]:
+                poster.log(f"Дневная квота сайта {site} исчерпана, статья '{article}' будет опубликована позже", logging.INFO, site=site)
+                poster.progress.add(skipped=1)
+                continue
+
+            # Пока все слоты заняты, очередь не разбирается и генератор останавливается на следующей статье
+            await scheduler.acquire(site)
+            in_work[site] = in_work.get(site, 0) + 1
+            pending.add(asyncio.create_task(run_article(site, credentials, article)))
+
+            done = {task for task in pending if task.done()}
+            if done:
+                pending -= done
+                poster.collect_finished(done)
+
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            poster.collect_finished(done)
+        poster.commit()
@@ -0,0 +1,350 @@
+"""Сквозной бенчмарк генерации и публикации статей на локальных сервисах-заглушках.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.e2e_benchmark --articles 100 1000 10000
+    python -m benchmarks.e2e_benchmark --articles 100 --compare benchmarks/results/e2e-20241001-120000.json
+
+Каждый размер прогона выполняется в отдельном процессе, чтобы пиковое потребление
+памяти (RSS) не переносилось между прогонами.
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+from benchmarks.stand_ins import (ServiceBehavior, StandInServer, chat_completions_app, pixabay_app,
+                                  wordpress_app, content_watch_app, dump_state)
+
+RESULTS_FOLDER = Path(__file__).parent / 'results'
+
+
+def percentile(samples, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в мегабайтах (ru_maxrss в КБ на Linux и в байтах на macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def timed(samples, method):
+    """Оборачивает корутину или функцию экземпляра и записывает длительность каждого вызова"""
+    if asyncio.iscoroutinefunction(method):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - started)
+    else:
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+def prepare_workspace(workspace, sites, articles, prompt_lines=40):
+    """Создает файлы ключей, промпта, ключевых слов и учетных данных для прогона"""
+    api_key_file = workspace / 'api_keys.txt'
+    api_key_file.write_text('sk-stand-in-1\nsk-stand-in-2\n', encoding='utf-8')
+
+    prompt_file = workspace / 'prompt.txt'
+    prompt_file.write_text('Write a detailed blog article.\n' * prompt_lines, encoding='utf-8')
+
+    keyword_file = workspace / 'keywords.txt'
+    with open(keyword_file, 'w', encoding='utf-8') as file:
+        for idx in range(articles):
+            site = sites[idx % len(sites)]
+            file.write(f"{site}|bench {idx}, topic {idx % 97}, extra {idx % 13}\n")
+
+    credentials_file = workspace / 'credentials.txt'
+    credentials_file.write_text(''.join(f"{site}|admin|secret\n" for site in sites), encoding='utf-8')
+
+    return api_key_file, prompt_file, keyword_file, credentials_file
+
+
+def run_single(args):
+    """Один прогон заданного размера; возвращает словарь с метриками"""
+    from ArticleGenerator.article_generator import ArticleGenerator, ImageDownloaderPix
+    from WordPressPoster.WordPressPoster import WordPressPoster
+    from ArticleGenerator.integration_api_unique_code.content_watch import ContentWatchClient, UniquenessGate
+    from Common.article_store import PackedArticleStore
+    from WordPressPoster.pipeline import PublishingPipeline
+
+    chat = StandInServer(chat_completions_app(
+        ServiceBehavior(args.chat_latency, args.jitter, args.chat_error_rate, args.chat_rate_limit))).start()
+    pixabay = StandInServer(pixabay_app(
+        ServiceBehavior(args.pixabay_latency, args.jitter, args.pixabay_error_rate, args.pixabay_rate_limit),
+        ServiceBehavior(args.cdn_latency, args.jitter), image_size=args.image_size)).start()
+    wordpress_servers = [
+        StandInServer(wordpress_app(
+            ServiceBehavior(args.wp_latency, args.jitter, args.wp_error_rate, args.wp_rate_limit),
+            # Загрузка изображений на настоящих сайтах заметно дольше создания поста
+            media_behavior=ServiceBehavior(args.wp_media_latency, args.jitter, args.wp_error_rate, args.wp_rate_limit)
+            if args.wp_media_latency is not None else None,
+            lost_response_rate=args.wp_lost_response_rate, batch_max_items=args.wp_batch_max_items,
+            # Первые сайты отклоняют учетные данные: предварительная проверка должна их отключить
+            reject_auth=idx < args.auth_fail_sites)).start()
+        for idx in range(args.sites)
+    ]
+    sites = [server.address for server in wordpress_servers]
+    content_watch = None
+    if args.uniqueness_min_percent is not None:
+        content_watch = StandInServer(content_watch_app(
+            ServiceBehavior(args.cw_latency, args.jitter, args.cw_error_rate))).start()
+
+    generation_samples, image_samples, posting_samples = [], [], []
+    workspace_holder = tempfile.TemporaryDirectory(prefix='artgenpost-bench-')
+    workspace = Path(workspace_holder.name)
+    previous_cwd = os.getcwd()
+    try:
+        # ImageDownloaderPix ведет CSV в папке settings относительно текущего каталога
+        os.chdir(workspace)
+        api_key_file, prompt_file, keyword_file, credentials_file = prepare_workspace(workspace, sites, args.articles, args.prompt_lines)
+        output_folder = workspace / 'output'
+        os.environ['OPENAI_BASE_URL'] = f"{chat.base_url}/v1"
+
+        quiet = logging.getLogger('ArtGenPostBenchmark')
+        quiet.addHandler(logging.NullHandler())
+        quiet.propagate = False
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            uniqueness_gate = None
+            if content_watch is not None:
+                client = ContentWatchClient('stand-in', api_url=f"{content_watch.base_url}/public/api/",
+                                            max_concurrency=args.cw_concurrency, retry_base_delay=0.1, logger=quiet)
+                uniqueness_gate = UniquenessGate(client, min_percent=args.uniqueness_min_percent)
+            store = None
+            if args.packed_store:
+                output_folder.mkdir(exist_ok=True)
+                store = PackedArticleStore(output_folder)
+            generator = ArticleGenerator(keyword_file, api_key_file, output_folder, prompt_file, args.min_chars,
+                                         logger=quiet, uniqueness_gate=uniqueness_gate, store=store)
+            image_downloader = ImageDownloaderPix('stand-in', output_folder, api_url=f"{pixabay.base_url}/api/",
+                                                  logger=quiet)
+            generator.generate_article_with_retries = timed(generation_samples, generator.generate_article_with_retries)
+            image_downloader.download_random_image = timed(image_samples, image_downloader.download_random_image)
+
+            def create_poster():
+                poster = WordPressPoster(output_folder, credentials_file, workspace / 'posts.db',
+                                         batch_size=args.batch_size, pause_between_batches=args.pause,
+                                         logger=quiet, scheme='http', batch_publishing=args.batch_publishing)
+                poster.process_article = timed(posting_samples, poster.process_article)
+                return poster
+
+            if args.pipeline:
+                # Генерация и публикация идут одновременно, поэтому все время прогона считается генерацией
+                output_folder.mkdir(exist_ok=True)
+                poster = create_poster()
+                started = time.perf_counter()
+                asyncio.run(PublishingPipeline(generator, poster).run(image_downloader))
+                generation_elapsed = time.perf_counter() - started
+                posting_elapsed = 0.0
+                poster.close()
+                if store is not None:
+                    store.close()
+            else:
+                started = time.perf_counter()
+                asyncio.run(generator.generate_article_single_request(image_downloader))
+                generation_elapsed = time.perf_counter() - started
+                if store is not None:
+                    store.close()
+
+                poster = create_poster()
+                started = time.perf_counter()
+                asyncio.run(poster.process_sites_with_batches())
+                posting_elapsed = time.perf_counter() - started
+                poster.close()
+    finally:
+        os.chdir(previous_cwd)
+        workspace_holder.cleanup()
+        for server in [chat, pixabay, *wordpress_servers, *([content_watch] if content_watch else [])]:
+            server.stop()
+
+    published = sum(dump_state(server.app)["posts"] for server in wordpress_servers)
+    total_elapsed = generation_elapsed + posting_elapsed
+    return {
+        "articles": args.articles,
+        "sites": args.sites,
+        "published": published,
+        "generation_seconds": generation_elapsed,
+        "posting_seconds": posting_elapsed,
+        "articles_per_minute": published / total_elapsed * 60 if total_elapsed else 0.0,
+        "generation_per_minute": args.articles / generation_elapsed * 60 if generation_elapsed else 0.0,
+        "posting_per_minute": published / posting_elapsed * 60 if posting_elapsed else 0.0,
+        "latency": {
+            "generation": summarize(generation_samples),
+            "image_download": summarize(image_samples),
+            "posting": summarize(posting_samples),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "services": {
+            "chat": dump_state(chat.app),
+            "pixabay": dump_state(pixabay.app),
+            "wordpress": [dump_state(server.app) for server in wordpress_servers],
+            "content_watch": dump_state(content_watch.app) if content_watch else None,
+        },
+    }
+
+
+def compare(results, baseline, threshold):
+    """Сравнивает результаты с сохраненными; возвращает список строк с регрессиями"""
+    regressions = []
+    baseline_runs = {run["articles"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        previous = baseline_runs.get(run["articles"])
+        if not previous:
+            continue
+        checks = [
+            ("articles_per_minute", run["articles_per_minute"], previous["articles_per_minute"], True),
+            ("peak_rss_mb", run["peak_rss_mb"], previous["peak_rss_mb"], False),
+        ]
+        for stage, current in run["latency"].items():
+            before = previous["latency"].get(stage, {})
+            if current.get("p95") and before.get("p95"):
+                checks.append((f"{stage}.p95", current["p95"], before["p95"], False))
+
+        for name, current, before, higher_is_better in checks:
+            if not before:
+                continue
+            change = (current - before) / before
+            print(f"[{run['articles']}] {name}: {before:.4f} -> {current:.4f} ({change:+.1%})")
+            worse = change < -threshold if higher_is_better else change > threshold
+            if worse:
+                regressions.append(f"[{run['articles']}] {name} ухудшился на {abs(change):.1%}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='End-to-end throughput benchmark for ArtGenPost')
+    parser.add_argument('--articles', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--sites', type=int, default=4)
+    parser.add_argument('--min-chars', type=int, default=1500)
+    parser.add_argument('--batch-size', type=int, default=5)
+    parser.add_argument('--pause', type=float, default=0)
+    parser.add_argument('--image-size', type=int, default=200 * 1024)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--chat-latency', type=float, default=0.05)
+    parser.add_argument('--chat-error-rate', type=float, default=0.0)
+    parser.add_argument('--chat-rate-limit', type=float, default=None)
+    parser.add_argument('--pixabay-latency', type=float, default=0.02)
+    parser.add_argument('--pixabay-error-rate', type=float, default=0.0)
+    parser.add_argument('--pixabay-rate-limit', type=float, default=None)
+    parser.add_argument('--cdn-latency', type=float, default=0.01)
+    parser.add_argument('--wp-latency', type=float, default=0.05)
+    parser.add_argument('--wp-media-latency', type=float, default=None,
+                        help='Задержка загрузки изображений (по умолчанию равна --wp-latency)')
+    parser.add_argument('--wp-error-rate', type=float, default=0.0)
+    parser.add_argument('--wp-rate-limit', type=float, default=None)
+    parser.add_argument('--wp-lost-response-rate', type=float, default=0.0)
+    parser.add_argument('--wp-batch-max-items', type=int, default=None,
+                        help='Включить /wp-json/batch/v1 на заглушках WordPress')
+    parser.add_argument('--auth-fail-sites', type=int, default=0,
+                        help='Сколько сайтов отвечают 401 на запросы с авторизацией (отозванный пароль приложения)')
+    parser.add_argument('--batch-publishing', action='store_true', help='Публиковать через batch API')
+    parser.add_argument('--uniqueness-min-percent', type=float, default=None,
+                        help='Включает проверку уникальности на заглушке content-watch с этим порогом')
+    parser.add_argument('--cw-latency', type=float, default=0.5)
+    parser.add_argument('--cw-error-rate', type=float, default=0.0)
+    parser.add_argument('--cw-concurrency', type=int, default=5)
+    parser.add_argument('--prompt-lines', type=int, default=40, help='Длина общего промпта в строках (~8 токенов на строку)')
+    parser.add_argument('--packed-store', action='store_true', help='Хранить статьи в articles.db вместо папок')
+    parser.add_argument('--pipeline', action='store_true', help='Публиковать статьи сразу после генерации (один цикл событий)')
+    parser.add_argument('--compare', type=Path, help='Файл с результатами предыдущего прогона')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Допустимое ухудшение (0.10 = 10%%)')
+    parser.add_argument('--output', type=Path, help='Куда сохранить результаты')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    argv = list(sys.argv[1:] if argv is None else argv)
+
+    if args.single:
+        args.articles = args.articles[0]
+        print(json.dumps(run_single(args)))
+        return 0
+
+    runs = []
+    for articles in args.articles:
+        print(f"Прогон на {articles} статей...", flush=True)
+        child_args = [arg for arg in argv if arg != '--single']
+        child_args = strip_option(child_args, '--articles') + ['--articles', str(articles), '--single']
+        completed = subprocess.run([sys.executable, '-m', 'benchmarks.e2e_benchmark', *child_args],
+                                   capture_output=True, text=True, check=True)
+        run = json.loads(completed.stdout.strip().splitlines()[-1])
+        runs.append(run)
+        print(f"  {run['articles_per_minute']:.1f} статей/мин, опубликовано {run['published']}, "
+              f"posting p95 {run['latency']['posting']['p95']}, пиковый RSS {run['peak_rss_mb']:.1f} МБ")
+
+    results = {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ('compare', 'output', 'single', 'articles')},
+        "runs": runs,
+    }
+    output = args.output or RESULTS_FOLDER / f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=4, default=str), encoding='utf-8')
+    print(f"Результаты сохранены в {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Обнаружены регрессии:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+
+def strip_option(argv, option):
+    """Удаляет из списка аргументов опцию вместе с ее значениями"""
+    result, skipping = [], False
+    for arg in argv:
+        if arg == option:
+            skipping = True
+            continue
+        if skipping and not arg.startswith('--'):
+            continue
+        skipping = False
+        result.append(arg)
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(main())
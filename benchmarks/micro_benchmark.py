@@ -0,0 +1,222 @@
+"""Микробенчмарки горячих путей обработки текста и учета опубликованного.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.micro_benchmark                    # сравнение с сохраненным baseline
+    python -m benchmarks.micro_benchmark --update-baseline  # перезапись baseline
+
+Команда завершается с кодом 1, если какой-либо путь стал медленнее baseline
+больше чем в --threshold раз.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import statistics
+import sqlite3
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+from pathlib import Path
+
+BASELINE_FILE = Path(__file__).parent / 'baselines' / 'micro.json'
+
+WORDS = ["business", "sport", "health", "travel", "finance", "garden", "kitchen", "shoes", "online", "buy",
+         "best", "cheap", "review", "guide", "tips", "2024", "how", "to", "choose", "home"]
+
+
+def make_article(rng, chars=12000):
+    """Синтетическая статья: заголовок, абзацы, символы, которые вырезает clean_text, и триггер в конце"""
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))).capitalize()
+        sentence += rng.choice(['.', '!', '?', ' — ✓', ' **bold**', ' #tag.'])
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return "Synthetic headline\n" + ' '.join(sentences) + "\n---\nNotes for the editor that must be cut."
+
+
+def build_corpora(workspace, scale, seed=42):
+    """Готовит синтетические данные реалистичного размера"""
+    rng = random.Random(seed)
+    sizes = {
+        "keyword_lines": int(100_000 * scale),
+        "image_rows": int(50_000 * scale),
+        "posted_rows": int(100_000 * scale),
+    }
+
+    keyword_file = workspace / 'keywords.txt'
+    with open(keyword_file, 'w', encoding='utf-8') as file:
+        for idx in range(sizes["keyword_lines"]):
+            keywords = ', '.join(' '.join(rng.sample(WORDS, 3)) for _ in range(rng.randint(2, 5)))
+            file.write(f"site{idx % 80}.com|{keywords}\n")
+
+    settings_folder = workspace / 'settings'
+    settings_folder.mkdir(exist_ok=True)
+    with open(settings_folder / 'downloaded_images.csv', 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['query', 'filename', 'url'])
+        for idx in range(sizes["image_rows"]):
+            tags = f"{rng.choice(WORDS)}, {rng.choice(WORDS)}, img{idx}"
+            writer.writerow([rng.choice(WORDS), f"img_{idx}.jpg", f"https://cdn.example.com/{idx}.jpg", tags, 'photo'])
+
+    texts = [make_article(rng) for _ in range(2)]
+    return sizes, keyword_file, texts
+
+
+def calibrate(function, min_time):
+    """Число вызовов в одной серии, при котором серия длится не меньше min_time секунд"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return number
+        # Запас в 20%, чтобы после масштабирования серия точно не оказалась короче min_time
+        number = max(number * 2, int(number * min_time * 1.2 / elapsed) if elapsed else number * 10)
+
+
+def measure(benchmarks, repeat, min_time=0.05):
+    """Медианное время одного вызова каждой функции по repeat сериям.
+
+    Калибровка заодно прогревает кэши и ленивые инициализации. Серии не короче min_time,
+    серии разных функций чередуются по кругам, и берется медиана, а не минимум: кратковременное
+    замедление машины портит один круг, а не все серии одной функции.
+    """
+    numbers = {name: calibrate(function, min_time) for name, function in benchmarks.items()}
+    timings = {name: [] for name in benchmarks}
+    for _ in range(repeat):
+        for name, function in benchmarks.items():
+            number = numbers[name]
+            started = time.perf_counter()
+            for _ in range(number):
+                function()
+            timings[name].append((time.perf_counter() - started) / number)
+    return {name: statistics.median(samples) for name, samples in timings.items()}
+
+
+def run_benchmarks(workspace, scale, repeat, min_time=0.05):
+    from ArticleGenerator.article_generator import ArticleGenerator, ImageDownloaderPix
+    from WordPressPoster.WordPressPoster import WordPressPoster
+
+    sizes, keyword_file, (text, other_text) = build_corpora(workspace, scale)
+
+    api_key_file = workspace / 'api_keys.txt'
+    api_key_file.write_text('sk-micro\n', encoding='utf-8')
+    prompt_file = workspace / 'prompt.txt'
+    prompt_file.write_text('prompt', encoding='utf-8')
+    credentials_file = workspace / 'credentials.txt'
+    credentials_file.write_text('site0.com|admin|secret\n', encoding='utf-8')
+
+    quiet = logging.getLogger('ArtGenPostMicroBenchmark')
+    quiet.addHandler(logging.NullHandler())
+    quiet.propagate = False
+
+    generator = ArticleGenerator(keyword_file, api_key_file, workspace / 'output', prompt_file, 1000, logger=quiet)
+    downloader = ImageDownloaderPix('micro', workspace / 'output', logger=quiet)
+    poster = WordPressPoster(workspace, credentials_file, workspace / 'posts.db', logger=quiet)
+
+    conn = sqlite3.connect(poster.db_file)
+    conn.executemany("INSERT INTO posts (site, article, posted) VALUES (?, ?, 1)",
+                     ((f"site{idx % 80}.com", f"article {idx}") for idx in range(sizes["posted_rows"])))
+    conn.commit()
+    conn.close()
+
+    rng = random.Random(7)
+    lookups = [(f"site{idx % 80}.com", f"article {idx}") for idx in rng.sample(range(sizes["posted_rows"]), 500)]
+    lookups += [(f"site{idx % 80}.com", f"missing {idx}") for idx in range(500)]
+    marks = iter(range(10 ** 9))
+
+    def is_posted_batch():
+        for site, article in lookups:
+            poster.is_posted(site, article)
+
+    def mark_as_posted_batch():
+        for _ in range(100):
+            poster.mark_as_posted("site0.com", f"new article {next(marks)}")
+        poster.commit()
+
+    benchmarks = {
+        "clean_text": lambda: generator.clean_text(text),
+        "remove_content_after_trigger": lambda: generator.remove_content_after_trigger(text),
+        "calculate_similarity": lambda: generator.calculate_similarity(text, other_text),
+        "read_keywords": lambda: generator.read_keywords(keyword_file),
+        "image_already_downloaded": lambda: downloader.image_already_downloaded("missing, tags"),
+        "is_posted_x1000": is_posted_batch,
+        "mark_as_posted_x100": mark_as_posted_batch,
+    }
+
+    return sizes, measure(benchmarks, repeat, min_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks for ArtGenPost hot paths')
+    parser.add_argument('--scale', type=float, default=1.0, help='Множитель размера синтетических данных')
+    parser.add_argument('--repeat', type=int, default=7, help='Количество серий замеров (сравнивается медиана)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Минимальная длительность одной серии, с')
+    parser.add_argument('--threshold', type=float, default=1.3,
+                        help='Допустимое замедление относительно baseline (1.3 = на 30%% медленнее)')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='artgenpost-micro-') as workspace:
+        try:
+            # ImageDownloaderPix ищет CSV в папке settings относительно текущего каталога
+            os.chdir(workspace)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                sizes, results = run_benchmarks(Path(workspace), args.scale, args.repeat, args.min_time)
+        finally:
+            os.chdir(previous_cwd)
+
+    baseline = None
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if baseline.get("sizes") != sizes:
+            print(f"Размеры данных отличаются от baseline ({baseline.get('sizes')}), сравнение пропущено")
+            baseline = None
+        elif (baseline.get("python"), baseline.get("machine")) != (platform.python_version(), platform.machine()):
+            # Замеры другой версии Python или другой машины несравнимы: разница в разы бывает и без изменений кода
+            print(f"Baseline снят на Python {baseline.get('python')} ({baseline.get('machine')}), текущий запуск - "
+                  f"Python {platform.python_version()} ({platform.machine()}); сравнение пропущено, "
+                  f"обновите baseline через --update-baseline")
+            baseline = None
+
+    regressions = []
+    for name, seconds in results.items():
+        line = f"{name:32s} {seconds * 1000:10.3f} ms"
+        if baseline and name in baseline["results"]:
+            ratio = seconds / baseline["results"][name]
+            line += f"   x{ratio:.2f} к baseline"
+            if ratio > args.threshold:
+                line += "   РЕГРЕССИЯ"
+                regressions.append(name)
+        print(line)
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "sizes": sizes,
+            "results": results,
+        }, indent=4), encoding='utf-8')
+        print(f"Baseline сохранен в {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"Замедлились: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
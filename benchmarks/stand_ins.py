@@ -0,0 +1,378 @@
+import json
+import time
+import hashlib
+import random
+import asyncio
+import threading
+from aiohttp import web
+
+
+class ServiceBehavior:
+    """Поведение локального сервиса: задержка, доля ошибок и ограничение частоты (429)"""
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit=None, retry_after=1):
+        self.latency = latency  # Средняя задержка ответа в секундах
+        self.jitter = jitter  # Разброс задержки в секундах (+/-)
+        self.error_rate = error_rate  # Доля ответов 500
+        self.rate_limit = rate_limit  # Запросов в секунду до ответа 429 (None - без ограничения)
+        self.retry_after = retry_after  # Значение заголовка Retry-After для ответов 429
+
+        self._tokens = float(rate_limit or 0)
+        self._last_refill = time.monotonic()
+
+    def _take_token(self):
+        """Простейший token bucket: возвращает False, если лимит исчерпан"""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        self._tokens = min(float(self.rate_limit), self._tokens + (now - self._last_refill) * self.rate_limit)
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def apply(self):
+        """Имитирует задержку и возвращает готовый ответ с ошибкой или None"""
+        if not self._take_token():
+            return web.json_response({"code": "rest_too_many_requests"}, status=429,
+                                     headers={"Retry-After": str(self.retry_after)})
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({"code": "internal_server_error"}, status=500)
+        return None
+
+
+class StandInServer:
+    """Запускает aiohttp-приложение в отдельном потоке со своим циклом событий.
+
+    Отдельный поток нужен потому, что генератор обращается к OpenAI синхронным клиентом
+    и блокирует собственный цикл событий на время запроса.
+    """
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    @property
+    def base_url(self):
+        return f"http://{self.address}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start_site())
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    async def _start_site(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 система выбирает свободный порт, узнаем его у сокета
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+
+def chat_completions_app(behavior=None, chars_per_token=5, cache_min_tokens=1024, cache_block_tokens=128):
+    """Сервис, отвечающий как POST /v1/chat/completions.
+
+    Кэш промптов устроен как у провайдера: совпавший с прошлыми запросами префикс от
+    cache_min_tokens токенов засчитывается блоками по cache_block_tokens в cached_tokens.
+    """
+    behavior = behavior or ServiceBehavior()
+    counter = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+    seen_prefixes = set()
+
+    def cached_prefix_tokens(prompt):
+        block_chars = cache_block_tokens * 4
+        blocks = len(prompt) // block_chars
+        hashes = [hashlib.sha256(prompt[:block * block_chars].encode("utf-8")).hexdigest()
+                  for block in range(1, blocks + 1)]
+        cached = 0
+        for block, digest in enumerate(hashes, start=1):
+            if digest not in seen_prefixes:
+                break
+            cached = block * cache_block_tokens
+        seen_prefixes.update(hashes)
+        return cached if cached >= cache_min_tokens else 0
+
+    async def completions(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        payload = await request.json()
+        counter["requests"] += 1
+        max_tokens = payload.get("max_tokens") or 1024
+        prompt = "".join(f"{message.get('role')}:{message.get('content', '')}" for message in payload.get("messages", []))
+        prompt_chars = len(prompt)
+
+        # Заголовок в первой строке, как у настоящих статей, затем абзацы нужной длины
+        words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+        body_chars = max_tokens * chars_per_token
+        paragraph = " ".join(random.choice(words) for _ in range(body_chars // 6)) + "."
+        content = f"Article {counter['requests']}\n{paragraph}"
+
+        prompt_tokens = prompt_chars // 4
+        cached_tokens = cached_prefix_tokens(prompt)
+        counter["prompt_tokens"] += prompt_tokens
+        counter["cached_tokens"] += cached_tokens
+        completion_tokens = len(content) // chars_per_token
+        return web.json_response({
+            "id": f"chatcmpl-{counter['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stand-in"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    app["counter"] = counter
+    return app
+
+
+def pixabay_app(behavior=None, cdn_behavior=None, image_size=200 * 1024, hits_per_page=5):
+    """Сервис, отвечающий как API Pixabay (GET /api/) и CDN изображений (GET /cdn/{name})"""
+    behavior = behavior or ServiceBehavior()
+    cdn_behavior = cdn_behavior or ServiceBehavior(latency=0.02)
+    image_bytes = b"\xff\xd8\xff\xe0" + random.randbytes(max(image_size - 4, 0))
+    counter = {"searches": 0, "downloads": 0}
+
+    async def search(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        counter["searches"] += 1
+        query = request.query.get("q", "")
+        base = f"http://{request.host}"
+        hits = []
+        for idx in range(hits_per_page):
+            # Уникальные теги, чтобы каждое изображение считалось новым
+            image_id = f"{counter['searches']}-{idx}"
+            hits.append({
+                "id": image_id,
+                "tags": f"{query}, stand-in, {image_id}",
+                "type": "photo",
+                "largeImageURL": f"{base}/cdn/{image_id}.jpg",
+            })
+        return web.json_response({"total": len(hits), "totalHits": len(hits), "hits": hits})
+
+    async def cdn(request):
+        error = await cdn_behavior.apply()
+        if error is not None:
+            return error
+        counter["downloads"] += 1
+        # Уникальный префикс, чтобы кэш медиафайлов постера не схлопывал разные изображения
+        marker = counter["downloads"].to_bytes(8, "big")
+        return web.Response(body=image_bytes[:4] + marker + image_bytes[12:], content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/api/", search)
+    app.router.add_get("/cdn/{name}", cdn)
+    app["counter"] = counter
+    return app
+
+
+def wordpress_app(behavior=None, media_behavior=None, lost_response_rate=0.0, batch_max_items=None, reject_auth=False,
+                  fail_statuses=()):
+    """Сервис, отвечающий как REST API WordPress: /wp-json/wp/v2/posts и /wp-json/wp/v2/media.
+
+    lost_response_rate - доля созданных постов, на которые вместо 201 приходит 504,
+    как при таймауте прокси уже после записи в базу.
+    batch_max_items - включает /wp-json/batch/v1 с указанным лимитом запросов в батче.
+    reject_auth - сайт отвечает 401 на все запросы с авторизацией, как при отозванном пароле приложения.
+    fail_statuses - статусы (например, 503), которыми по очереди отвечают первые запросы, как при кратком сбое сайта.
+    """
+    behavior = behavior or ServiceBehavior()
+    media_behavior = media_behavior or behavior
+    failures = list(fail_statuses)
+    state = {"next_id": 1, "posts": {}, "media": {}, "media_bytes": 0, "duplicates": 0, "batches": 0}
+
+    def next_id():
+        state["next_id"] += 1
+        return state["next_id"]
+
+    def store_post(payload):
+        slug = payload.get("slug")
+        if slug and any(post.get("slug") == slug for post in state["posts"].values()):
+            # Настоящий WordPress добавил бы к slug суффикс -2; здесь считаем это дублем
+            state["duplicates"] += 1
+        post_id = next_id()
+        state["posts"][post_id] = payload
+        return {"id": post_id, "status": payload.get("status", "draft")}
+
+    async def create_post(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        payload = await request.json()
+        if payload.get("featured_media") and payload["featured_media"] not in state["media"]:
+            # Как WordPress, когда вложение удалили с сайта
+            return web.json_response({"code": "rest_invalid_featured_media", "message": "Invalid featured media ID."}, status=400)
+        created = store_post(payload)
+        if lost_response_rate and random.random() < lost_response_rate:
+            return web.json_response({"code": "gateway_timeout"}, status=504)
+        return web.json_response(created, status=201)
+
+    async def batch_schema(request):
+        return web.json_response({"namespace": "", "methods": ["POST"], "endpoints": [
+            {"methods": ["POST"], "args": {"requests": {"type": "array", "maxItems": batch_max_items}}}]})
+
+    async def batch(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        payload = await request.json()
+        requests = payload.get("requests", [])
+        if len(requests) > batch_max_items:
+            return web.json_response({"code": "rest_invalid_param"}, status=400)
+        state["batches"] += 1
+        responses = [{"status": 201, "body": store_post(item.get("body", {})), "headers": {}} for item in requests]
+        if lost_response_rate and random.random() < lost_response_rate:
+            return web.json_response({"code": "gateway_timeout"}, status=504)
+        return web.json_response({"responses": responses}, status=207)
+
+    async def list_posts(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        slug = request.query.get("slug")
+        found = [{"id": post_id} for post_id, post in state["posts"].items() if slug is None or post.get("slug") == slug]
+        return web.json_response(found)
+
+    async def create_media(request):
+        error = await media_behavior.apply()
+        if error is not None:
+            return error
+        size = 0
+        async for chunk in request.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+        media_id = next_id()
+        state["media"][media_id] = size
+        state["media_bytes"] += size
+        return web.json_response({"id": media_id}, status=201)
+
+    async def get_media(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        media_id = int(request.match_info["media_id"])
+        if media_id not in state["media"]:
+            return web.json_response({"code": "rest_post_invalid_id"}, status=404)
+        return web.json_response({"id": media_id})
+
+    async def index(request):
+        return web.json_response({"namespaces": ["wp/v2"], "routes": {}})
+
+    async def current_user(request):
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        return web.json_response({"id": 1, "capabilities": {"publish_posts": True, "upload_files": True}})
+
+    @web.middleware
+    async def check_request(request, handler):
+        if failures:
+            return web.json_response({"code": "service_unavailable"}, status=failures.pop(0))
+        if reject_auth and request.headers.get("Authorization"):
+            return web.json_response({"code": "incorrect_password"}, status=401)
+        return await handler(request)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024, middlewares=[check_request])
+    app.router.add_get("/wp-json/", index)
+    app.router.add_get("/wp-json/wp/v2/users/me", current_user)
+    app.router.add_post("/wp-json/wp/v2/posts", create_post)
+    app.router.add_get("/wp-json/wp/v2/posts", list_posts)
+    app.router.add_post("/wp-json/wp/v2/media", create_media)
+    app.router.add_get("/wp-json/wp/v2/media/{media_id}", get_media)
+    if batch_max_items:
+        app.router.add_route("OPTIONS", "/wp-json/batch/v1", batch_schema)
+        app.router.add_post("/wp-json/batch/v1", batch)
+    app["state"] = state
+    return app
+
+
+def content_watch_app(behavior=None, min_percent=50.0, fail_statuses=(), malformed=False):
+    """Сервис, отвечающий как API content-watch.ru (POST с полями формы key, text, action).
+
+    Уникальность текста детерминированно выводится из его хэша в диапазоне min_percent..100,
+    поэтому повторная проверка того же текста дает тот же результат.
+    fail_statuses - статусы (например, 500, 429), которыми по очереди отвечают первые запросы.
+    malformed - на проверки приходит 200 со страницей вместо JSON, как при сбое прокси.
+    """
+    behavior = behavior or ServiceBehavior()
+    counter = {"requests": 0, "checks": 0, "balance_requests": 0}
+    failures = list(fail_statuses)
+
+    async def api(request):
+        counter["requests"] += 1
+        if failures:
+            return web.json_response({"error": ""}, status=failures.pop(0), headers={"Retry-After": "0"})
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        if malformed:
+            return web.Response(text="<html>Bad Gateway</html>", content_type="text/html")
+        form = await request.post()
+        if not form.get("key"):
+            return web.json_response({"error": "Не указан ключ API"})
+        action = form.get("action")
+        if action == "GET_BALANCE":
+            counter["balance_requests"] += 1
+            return web.json_response({"error": "", "balance": 100.0})
+
+        counter["checks"] += 1
+        text = form.get("text") or form.get("url") or ""
+        fraction = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        percent = round(min_percent + (100 - min_percent) * fraction, 1)
+        return web.json_response({"error": "", "text": text, "percent": str(percent), "highlight": [], "matches": []})
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post("/public/api/", api)
+    app["counter"] = counter
+    return app
+
+
+def dump_state(app):
+    """Краткая сводка состояния сервиса для отчета"""
+    if "state" in app:
+        state = app["state"]
+        return {"posts": len(state["posts"]), "media": len(state["media"]), "media_bytes": state["media_bytes"],
+                "duplicates": state["duplicates"], "batches": state["batches"]}
+    return json.loads(json.dumps(app.get("counter", {})))
@@ -0,0 +1,21 @@
+import logging
+
+import pytest
+
+from benchmarks.stand_ins import ServiceBehavior, StandInServer, wordpress_app
+
+
+@pytest.fixture
+def quiet_logger():
+    logger = logging.getLogger('ArtGenPostTests')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+@pytest.fixture
+def wordpress_server():
+    server = StandInServer(wordpress_app(ServiceBehavior(latency=0))).start()
+    yield server
+    server.stop()
+
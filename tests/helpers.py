@@ -0,0 +1,28 @@
+import asyncio
+
+from WordPressPoster.WordPressPoster import WordPressPoster
+
+
+def write_article(base_folder, site, article, image=None):
+    """Папка статьи в исходном формате: article.txt (первая строка - заголовок) и изображение рядом"""
+    article_path = base_folder / site / article
+    article_path.mkdir(parents=True, exist_ok=True)
+    (article_path / 'article.txt').write_text(f"{article}\nText of {article}.", encoding='utf-8')
+    if image is not None:
+        (article_path / 'image.jpg').write_bytes(image)
+    return article_path
+
+
+def make_poster(tmp_path, sites, logger, **kwargs):
+    credentials_file = tmp_path / 'credentials.txt'
+    credentials_file.write_text(''.join(f"{site}|admin|secret\n" for site in sites), encoding='utf-8')
+    kwargs.setdefault('retry_base_delay', 0.01)
+    return WordPressPoster(tmp_path / 'articles', credentials_file, tmp_path / 'posts.db', logger=logger,
+                           scheme='http', pause_between_batches=0, **kwargs)
+
+
+def run(poster):
+    try:
+        asyncio.run(poster.process_sites_with_batches())
+    finally:
+        poster.close()
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import time
+
+from WordPressPoster.article_index import ArticleIndex
+from tests.helpers import write_article
+
+
+def make_index(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'posts.db')
+    return conn, ArticleIndex(conn, str(tmp_path / 'articles'), racy_window=0)
+
+
+def test_scan_does_not_commit_pending_writes_of_owner(tmp_path):
+    conn, index = make_index(tmp_path)
+    conn.execute("CREATE TABLE marks (article TEXT)")
+    conn.commit()
+    write_article(tmp_path / 'articles', 'site.com', 'first')
+
+    # Отметка постера ждет пакетной фиксации; сканирование не должно зафиксировать ее раньше
+    conn.execute("INSERT INTO marks VALUES ('first')")
+    assert index.scan_site('site.com') == (['first'], ['first'])
+    assert conn.in_transaction
+    assert index.take_uncommitted() > 0
+    assert index.take_uncommitted() == 0
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM marks").fetchone()[0] == 0
+    conn.close()
+
+
+def scan(index, site, **kwargs):
+    """scan_site с отсортированным списком всех статей (порядок scandir не определен)"""
+    found, ready = index.scan_site(site, **kwargs)
+    return sorted(found), ready
+
+
+def count_scans(monkeypatch, index):
+    """Считает чтения папок статей (scan_article) и списков статей сайта (scandir папки сайта)"""
+    scans = {'articles': [], 'sites': 0}
+    scan_article = index.scan_article
+    scandir = os.scandir
+
+    def counted_scan_article(article_path):
+        scans['articles'].append(os.path.basename(article_path))
+        return scan_article(article_path)
+
+    def counted_scandir(path):
+        if os.path.dirname(os.fspath(path)) == index.base_folder:
+            scans['sites'] += 1
+        return scandir(path)
+
+    monkeypatch.setattr(index, 'scan_article', counted_scan_article)
+    monkeypatch.setattr(os, 'scandir', counted_scandir)
+    return scans
+
+
+def set_mtime(path, seconds_ago):
+    mtime_ns = time.time_ns() - int(seconds_ago * 1e9)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_folders_are_not_rescanned(tmp_path, monkeypatch):
+    conn, index = make_index(tmp_path)
+    for article in ('first', 'second'):
+        write_article(tmp_path / 'articles', 'site.com', article)
+    assert index.scan_site('site.com')[1] == ['first', 'second']
+
+    scans = count_scans(monkeypatch, index)
+    assert index.scan_site('site.com')[1] == ['first', 'second']
+    assert scans == {'articles': [], 'sites': 0}
+    # Опубликованные статьи не проверяются вовсе, но остаются в списке всех статей
+    assert scan(index, 'site.com', skip={'first'}) == (['first', 'second'], ['second'])
+    conn.close()
+
+
+def test_touched_folder_is_rescanned(tmp_path, monkeypatch):
+    conn, index = make_index(tmp_path)
+    for article in ('first', 'second'):
+        write_article(tmp_path / 'articles', 'site.com', article)
+    index.scan_site('site.com')
+
+    scans = count_scans(monkeypatch, index)
+    article_path = write_article(tmp_path / 'articles', 'site.com', 'second', image=b'image')
+    set_mtime(article_path, 0)
+    assert index.scan_site('site.com')[1] == ['first', 'second']
+    assert scans == {'articles': ['second'], 'sites': 0}
+    assert index.files('site.com', 'second')[1] == [str(article_path / 'image.jpg')]
+
+    # Новая папка меняет mtime папки сайта: список статей перечитывается
+    write_article(tmp_path / 'articles', 'site.com', 'third')
+    set_mtime(tmp_path / 'articles' / 'site.com', 0)
+    assert index.scan_site('site.com')[1] == ['first', 'second', 'third']
+    assert scans == {'articles': ['second', 'third'], 'sites': 1}
+    conn.close()
+
+
+def test_recently_changed_folders_wait_for_settle(tmp_path):
+    conn, index = make_index(tmp_path)
+    set_mtime(write_article(tmp_path / 'articles', 'site.com', 'old'), 60)
+    fresh = write_article(tmp_path / 'articles', 'site.com', 'fresh')
+
+    # Генератор мог еще не дописать изображения свежей статьи
+    assert scan(index, 'site.com', settle=5) == (['fresh', 'old'], ['old'])
+    set_mtime(fresh, 10)
+    assert scan(index, 'site.com', settle=5) == (['fresh', 'old'], ['fresh', 'old'])
+    conn.close()
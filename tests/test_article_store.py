@@ -0,0 +1,73 @@
+from Common.article_store import PackedArticleStore, main
+from tests.helpers import make_poster, run
+
+IMAGE = b'\xff\xd8\xff' + b'image' * 100
+OTHER_IMAGE = b'\xff\xd8\xff' + b'other' * 100
+
+
+def write_packed(folder):
+    store = PackedArticleStore(folder)
+    # Одно и то же изображение в двух статьях и дважды в одной статье
+    store.save_text('site.com', 'first', 'First\nText of first.')
+    store.save_image('site.com', 'first', 'cover.jpg', IMAGE)
+    store.save_image('site.com', 'first', 'extra.JPG', IMAGE)
+    store.complete('site.com', 'first')
+    store.save_text('site.com', 'second', 'Second\nText of second.')
+    store.save_image('site.com', 'second', 'cover.jpg', IMAGE)
+    store.save_image('site.com', 'second', 'photo.png', OTHER_IMAGE)
+    store.complete('site.com', 'second')
+    # Генератор еще не докачал изображения: статья не видна постеру и не выгружается
+    store.save_text('site.com', 'unfinished', 'Unfinished\nText.')
+    return store
+
+
+def test_images_are_stored_once_per_content_hash(tmp_path):
+    store = write_packed(tmp_path)
+    assert store.list_articles('site.com') == ['first', 'second']
+    # Три ссылки на IMAGE (расширение приводится к нижнему регистру) - один файл, плюс OTHER_IMAGE
+    stored = sorted(path.name for path in (tmp_path / 'images').rglob('*') if path.is_file())
+    assert len(stored) == 2
+    text, images = store.load('site.com', 'second')
+    assert text == 'Second\nText of second.'
+    assert [filename for _, filename in images] == ['cover.jpg', 'photo.png']
+    assert open(images[0][0], 'rb').read() == IMAGE
+    store.close()
+
+
+def test_export_restores_folder_layout(tmp_path):
+    write_packed(tmp_path / 'packed').close()
+    assert main([str(tmp_path / 'packed'), str(tmp_path / 'folders')]) == 0
+
+    exported = {str(path.relative_to(tmp_path / 'folders')): path.read_bytes()
+                for path in (tmp_path / 'folders').rglob('*') if path.is_file()}
+    assert exported == {
+        'site.com/first/article.txt': b'First\nText of first.',
+        'site.com/first/cover.jpg': IMAGE,
+        'site.com/first/extra.JPG': IMAGE,
+        'site.com/second/article.txt': b'Second\nText of second.',
+        'site.com/second/cover.jpg': IMAGE,
+        'site.com/second/photo.png': OTHER_IMAGE,
+    }
+
+
+def test_export_without_store_fails(tmp_path):
+    assert main([str(tmp_path), str(tmp_path / 'folders')]) == 1
+
+
+def test_poster_detects_packed_store(tmp_path, wordpress_server, quiet_logger):
+    site = wordpress_server.address
+    store = PackedArticleStore(tmp_path / 'articles')
+    for article in ('first', 'second'):
+        store.save_text(site, article, f"{article}\nText of {article}.")
+        store.save_image(site, article, 'cover.jpg', IMAGE)
+        store.complete(site, article)
+    store.close()
+
+    poster = make_poster(tmp_path, [site], quiet_logger)
+    assert poster.store.packed
+    run(poster)
+
+    state = wordpress_server.app['state']
+    assert sorted(post['title'] for post in state['posts'].values()) == ['first', 'second']
+    # Одинаковое изображение загружается на сайт один раз
+    assert len(state['media']) == 1
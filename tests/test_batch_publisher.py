@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks.stand_ins import ServiceBehavior, StandInServer, wordpress_app
+from tests.helpers import make_poster, run, write_article
+
+
+@pytest.fixture
+def start_wordpress():
+    servers = []
+
+    def start(**kwargs):
+        server = StandInServer(wordpress_app(ServiceBehavior(latency=0), **kwargs)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def publish(tmp_path, server, logger, articles, site_limit=None):
+    site = server.address
+    for idx in range(articles):
+        write_article(tmp_path / 'articles', site, f"article {idx}")
+    poster = make_poster(tmp_path, [site], logger, batch_publishing=True)
+    if site_limit is not None:
+        # Лимит, определенный раньше, больше, чем сайт принимает сейчас
+        poster.batch_publisher._site_limits[site] = site_limit
+    run(poster)
+    return server.app['state']
+
+
+def assert_published_once(state, articles):
+    titles = sorted(post['title'] for post in state['posts'].values())
+    assert titles == sorted(f"article {idx}" for idx in range(articles))
+    assert state['duplicates'] == 0
+
+
+def test_posts_are_sent_in_batches_up_to_site_limit(tmp_path, start_wordpress, quiet_logger):
+    state = publish(tmp_path, start_wordpress(batch_max_items=3), quiet_logger, 7)
+    assert_published_once(state, 7)
+    # Не больше 3 постов в батче - значит, не меньше 3 батчей
+    assert state['batches'] >= 3
+
+
+def test_site_without_batch_api_gets_single_requests(tmp_path, start_wordpress, quiet_logger):
+    state = publish(tmp_path, start_wordpress(), quiet_logger, 5)
+    assert_published_once(state, 5)
+    assert state['batches'] == 0
+
+
+def test_rejected_batch_falls_back_to_single_requests(tmp_path, start_wordpress, quiet_logger):
+    state = publish(tmp_path, start_wordpress(batch_max_items=2), quiet_logger, 5, site_limit=25)
+    assert_published_once(state, 5)
+    assert state['batches'] == 0
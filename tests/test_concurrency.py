@@ -0,0 +1,59 @@
+import time
+
+from WordPressPoster.concurrency import AdaptiveLimiter, CircuitBreaker
+
+
+def test_mixed_request_kinds_keep_window_open():
+    # Изображения грузятся в 6 раз дольше, чем создаются посты; это не перегрузка
+    limiter = AdaptiveLimiter(initial_limit=5, max_limit=20)
+    for _ in range(300):
+        limiter._update(201, 0.05, None, "post")
+        limiter._update(201, 0.3, None, "media")
+    assert limiter.window == 20
+
+
+def test_latency_growth_within_kind_shrinks_window():
+    limiter = AdaptiveLimiter(initial_limit=5, max_limit=20)
+    for _ in range(300):
+        limiter._update(201, 0.05, None, "post")
+        limiter._update(201, 0.3, None, "media")
+    limiter._update(201, 1.5, None, "media")
+    assert limiter.window == 10
+
+
+def test_server_errors_shrink_window_and_429_pauses():
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=20, pause_on_429=5)
+    limiter._update(500, 0.1, None, "post")
+    assert limiter.window == 4
+    time.sleep(0.01)
+    limiter._update(429, 0.001, 3, "post")
+    assert limiter.window == 2
+    assert limiter._paused_until > time.monotonic() + 2
+
+
+def test_article_failures_during_probe_do_not_extend_back_off():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01, max_reset_timeout=1)
+    breaker.record_failure("500")
+    breaker.record_failure("500")
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+    assert breaker.probe_due()
+    # Статьи, начатые до срабатывания, завершаются ошибками, пока идет проба
+    for _ in range(3):
+        breaker.record_failure("500")
+    assert (breaker.state, breaker.reset_timeout) == (CircuitBreaker.HALF_OPEN, 0.01)
+    breaker.record_failure("timeout", probe=True)
+    assert (breaker.state, breaker.reset_timeout) == (CircuitBreaker.OPEN, 0.02)
+
+
+def test_breaker_is_exhausted_after_probe_fails_at_max_interval():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, max_reset_timeout=0.02)
+    breaker.record_failure("500")
+    assert 0 < breaker.probe_delay() <= 0.01
+    for expected in (False, True):
+        time.sleep(breaker.probe_delay() + 0.005)
+        assert breaker.probe_due()
+        breaker.record_failure("timeout", probe=True)
+        assert breaker.exhausted is expected
+    breaker.record_success()
+    assert not breaker.exhausted and breaker.reset_timeout == 0.01
@@ -0,0 +1,96 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from ArticleGenerator.integration_api_unique_code.content_watch import ContentWatchClient, ContentWatchError, UniquenessGate
+from benchmarks.stand_ins import ServiceBehavior, StandInServer, content_watch_app
+
+
+@pytest.fixture
+def start_content_watch():
+    servers = []
+
+    def start(**kwargs):
+        kwargs.setdefault('behavior', ServiceBehavior(latency=0))
+        server = StandInServer(content_watch_app(**kwargs)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def make_client(server, logger, **kwargs):
+    return ContentWatchClient('stand-in', api_url=f"{server.base_url}/public/api/", retry_base_delay=0.01,
+                              logger=logger, **kwargs)
+
+
+async def with_session(coroutine_factory):
+    async with aiohttp.ClientSession() as session:
+        return await coroutine_factory(session)
+
+
+def test_retries_server_errors_and_429(start_content_watch, quiet_logger):
+    server = start_content_watch(fail_statuses=(500, 429, 503))
+    client = make_client(server, quiet_logger)
+    result = asyncio.run(with_session(lambda session: client.check_text(session, "some text")))
+    assert 50 <= result['percent'] <= 100
+    assert server.app['counter']['requests'] == 4
+
+
+def test_gives_up_after_max_retries(start_content_watch, quiet_logger):
+    server = start_content_watch(fail_statuses=(500,) * 10)
+    client = make_client(server, quiet_logger, max_retries=2)
+    with pytest.raises(ContentWatchError):
+        asyncio.run(with_session(lambda session: client.check_text(session, "some text")))
+    assert server.app['counter']['requests'] == 3
+
+
+def test_repeated_text_is_served_from_cache(start_content_watch, quiet_logger, tmp_path):
+    server = start_content_watch()
+    cache_file = tmp_path / 'uniqueness_cache.db'
+    client = make_client(server, quiet_logger, cache_file=cache_file)
+
+    async def check_twice(session):
+        return [await client.check_text(session, "cached text") for _ in range(2)]
+
+    first, second = asyncio.run(with_session(check_twice))
+    client.close()
+    assert first['percent'] == second['percent']
+
+    # Новый клиент с тем же файлом кэша (следующий запуск) тоже не обращается к API
+    client = make_client(server, quiet_logger, cache_file=cache_file)
+    third = asyncio.run(with_session(lambda session: client.check_text(session, "cached text")))
+    client.close()
+    assert third['percent'] == first['percent']
+    assert server.app['counter']['checks'] == 1
+
+
+def test_concurrent_checks_of_same_text_share_one_request(start_content_watch, quiet_logger):
+    server = start_content_watch(behavior=ServiceBehavior(latency=0.1))
+    client = make_client(server, quiet_logger)
+
+    async def check_concurrently(session):
+        return await asyncio.gather(*(client.check_text(session, "same text") for _ in range(5)))
+
+    results = asyncio.run(with_session(check_concurrently))
+    assert len({result['percent'] for result in results}) == 1
+    assert server.app['counter']['checks'] == 1
+
+
+@pytest.mark.parametrize('fail_open', [True, False])
+def test_malformed_response_follows_fail_open(start_content_watch, quiet_logger, fail_open):
+    server = start_content_watch(malformed=True)
+    gate = UniquenessGate(make_client(server, quiet_logger), min_percent=80, fail_open=fail_open)
+    passed, percent = asyncio.run(with_session(lambda session: gate.check(session, "text")))
+    assert (passed, percent) == (fail_open, None)
+    # Некорректный ответ не повторяется: повтор вернет то же самое
+    assert server.app['counter']['requests'] == 1
+
+
+def test_unavailable_api_follows_fail_open(start_content_watch, quiet_logger):
+    server = start_content_watch(fail_statuses=(502,) * 10)
+    gate = UniquenessGate(make_client(server, quiet_logger, max_retries=1), fail_open=False)
+    assert asyncio.run(with_session(lambda session: gate.check(session, "text"))) == (False, None)
@@ -0,0 +1,41 @@
+import random
+import time
+
+from ArticleGenerator.keyword_clusters import KeywordClusterer, lsh_bands
+
+
+def test_bands_match_threshold():
+    clusterer = KeywordClusterer(threshold=0.7)
+    assert (clusterer.bands, clusterer.rows) == (16, 8)
+    # S-образный порог LSH (1/bands)^(1/rows) близок к заданному
+    assert abs((1 / clusterer.bands) ** (1 / clusterer.rows) - 0.7) < 0.05
+    assert lsh_bands(0.9, 128) < lsh_bands(0.5, 128)
+
+
+def test_similar_sets_are_grouped():
+    keyword_sets = [
+        ["running shoes for men", "trail waterproof lightweight", "cushioned review"],
+        ["review cushioned", "lightweight waterproof trail", "men running shoes"],  # Те же слова в другом порядке
+        ["running shoes for men", "trail waterproof lightweight", "cushioned test"],  # Одно слово другое
+        ["chocolate cake recipe", "easy baking at home"],
+    ]
+    assert KeywordClusterer().cluster(keyword_sets) == [[0, 1, 2], [3]]
+
+
+def test_merge_combines_keywords_of_group():
+    keywords_data = {"site.com": [["buy shoes online", "cheap shoes"], ["shoes buy online", "cheap shoes"]]}
+    reduced, report = KeywordClusterer().reduce(keywords_data, merge=True)
+    assert reduced == {"site.com": [["buy shoes online", "cheap shoes"]]}
+    assert len(report["site.com"]) == 1
+
+
+def test_shared_head_sets_stay_linear():
+    # Наборы с общей "головой": все попадают в одни и те же корзины LSH, но не похожи друг на друга
+    generator = random.Random(0)
+    vocabulary = [f"word{idx}" for idx in range(2000)]
+    keyword_sets = [["buy shoes online", "cheap shoes", f"shoes {generator.choice(vocabulary)}",
+                     f"{generator.choice(vocabulary)} {generator.choice(vocabulary)}"] for _ in range(20000)]
+    started = time.perf_counter()
+    clusters = KeywordClusterer().cluster(keyword_sets)
+    assert time.perf_counter() - started < 20
+    assert len(clusters) > 19000
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ArticleGenerator.article_generator import ArticleGenerator, ImageDownloaderPix
+from ArticleGenerator.token_budget import OK, STOP, THROTTLE, TokenBudget, key_label
+from benchmarks.stand_ins import ServiceBehavior, StandInServer, chat_completions_app, pixabay_app
+
+API_KEYS = ['sk-first', 'sk-second']
+
+
+def usage(tokens):
+    return SimpleNamespace(prompt_tokens=tokens, completion_tokens=0, prompt_tokens_details=None)
+
+
+@pytest.fixture
+def services(monkeypatch):
+    chat = StandInServer(chat_completions_app(ServiceBehavior(latency=0))).start()
+    pixabay = StandInServer(pixabay_app(ServiceBehavior(latency=0), ServiceBehavior(latency=0), image_size=1024)).start()
+    monkeypatch.setenv('OPENAI_BASE_URL', f"{chat.base_url}/v1")
+    yield chat, pixabay
+    chat.stop()
+    pixabay.stop()
+
+
+@pytest.fixture
+def make_generator(tmp_path, monkeypatch, services, quiet_logger):
+    # Загрузчик изображений ведет CSV в папке settings относительно текущего каталога
+    monkeypatch.chdir(tmp_path)
+    _, pixabay = services
+
+    def make(keyword_lines, budget):
+        keyword_file = tmp_path / 'keywords.txt'
+        keyword_file.write_text(''.join(f"{line}\n" for line in keyword_lines), encoding='utf-8')
+        api_key_file = tmp_path / 'api_keys.txt'
+        api_key_file.write_text('\n'.join(API_KEYS), encoding='utf-8')
+        prompt_file = tmp_path / 'prompt.txt'
+        prompt_file.write_text('Write a blog article.', encoding='utf-8')
+        generator = ArticleGenerator(keyword_file, api_key_file, tmp_path / 'output', prompt_file, 100,
+                                     logger=quiet_logger, budget=budget)
+        image_downloader = ImageDownloaderPix('stand-in', tmp_path / 'output', api_url=f"{pixabay.base_url}/api/",
+                                              logger=quiet_logger)
+        return generator, image_downloader
+
+    return make
+
+
+def test_check_throttles_at_share_of_limit():
+    budget = TokenBudget({"run": {"tokens": 1000}, "throttle_at": 0.8})
+    budget.record('gpt-4o-mini', usage(700))
+    assert budget.check() == (OK, None)
+    budget.record('gpt-4o-mini', usage(100))
+    assert budget.check() == (THROTTLE, 'run')
+    budget.record('gpt-4o-mini', usage(200))
+    assert budget.check() == (STOP, 'run')
+
+
+def test_throttled_generation_waits_throttle_delay(make_generator):
+    budget = TokenBudget({"site": {"tokens": 1000}, "throttle_at": 0.8, "throttle_delay": 0.2})
+    budget.record('gpt-4o-mini', usage(900), site='site.com')
+    generator, _ = make_generator(['site.com|topic'], budget)
+    throttled = set()
+    started = time.perf_counter()
+    assert asyncio.run(generator.wait_for_budget('site.com', throttled)) is None
+    assert time.perf_counter() - started >= 0.2
+    assert throttled == {('site', 'site.com')}
+
+
+def test_ledger_keeps_spending_within_day_and_rolls_over(tmp_path, monkeypatch):
+    ledger_file = tmp_path / 'token_ledger.db'
+    limits = {"api_key": {"tokens": 1000}, "site": {"tokens": 1000}}
+    monkeypatch.setattr(TokenBudget, 'current_period', lambda self: '2026-10-19')
+    budget = TokenBudget(limits, ledger_file)
+    budget.record('gpt-4o-mini', usage(1000), api_key='sk-first', site='site.com')
+    budget.close()
+
+    # Перезапуск в тот же день не обнуляет потраченное
+    budget = TokenBudget(limits, ledger_file)
+    assert budget.usage('site', 'site.com')['tokens'] == 1000
+    assert budget.check(api_key='sk-first', site='site.com') == (STOP, 'api_key')
+    assert budget.run_usage['tokens'] == 0
+
+    # На следующий день (UTC) лимиты ключей и сайтов начинаются заново
+    monkeypatch.setattr(TokenBudget, 'current_period', lambda self: '2026-10-20')
+    assert budget.check(api_key='sk-first', site='site.com') == (OK, None)
+    budget.close()
+
+
+def test_spent_api_key_switches_to_next_key(make_generator, services, tmp_path):
+    chat, _ = services
+    budget = TokenBudget({"api_key": {"tokens": 1000}}, tmp_path / 'token_ledger.db')
+    budget.record('gpt-4o-mini', usage(1000), api_key='sk-first')
+    generator, image_downloader = make_generator(['site.com|first topic', 'site.com|second topic'], budget)
+    asyncio.run(generator.generate_article_single_request(image_downloader))
+    budget.close()
+
+    assert generator.current_api_key == 'sk-second'
+    assert generator.progress.snapshot().done == 2
+    assert budget.usage('api_key', key_label('sk-first'))['tokens'] == 1000
+    assert chat.app['counter']['requests'] == 4
+
+
+def test_spent_site_is_skipped_and_others_continue(make_generator, services):
+    chat, _ = services
+    budget = TokenBudget({"sites": {"spent.com": {"tokens": 1000}}})
+    budget.record('gpt-4o-mini', usage(1000), site='spent.com')
+    generator, image_downloader = make_generator(
+        ['spent.com|first topic', 'other.com|second topic', 'spent.com|third topic'], budget)
+    asyncio.run(generator.generate_article_single_request(image_downloader))
+
+    progress = generator.progress.snapshot()
+    assert (progress.done, progress.skipped) == (1, 2)
+    # Одна статья - два запроса к модели (generate_article_with_retries выбирает лучший из двух текстов)
+    assert chat.app['counter']['requests'] == 2
+
+
+def test_generation_stops_at_run_budget(make_generator, services):
+    chat, _ = services
+    budget = TokenBudget({"run": {"tokens": 1}})
+    generator, image_downloader = make_generator([f"site.com|topic {idx}" for idx in range(5)], budget)
+    asyncio.run(generator.generate_article_single_request(image_downloader))
+
+    progress = generator.progress.snapshot()
+    assert (progress.done, progress.skipped) == (1, 4)
+    assert chat.app['counter']['requests'] == 2
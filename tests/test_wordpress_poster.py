@@ -0,0 +1,127 @@
+import asyncio
+
+from WordPressPoster.concurrency import FairScheduler
+from benchmarks.stand_ins import ServiceBehavior, StandInServer, wordpress_app
+from tests.helpers import make_poster, run, write_article
+
+IMAGE = b'\xff\xd8\xff' + b'image' * 100
+
+
+def test_deleted_cached_media_is_uploaded_again(tmp_path, wordpress_server, quiet_logger):
+    site = wordpress_server.address
+    state = wordpress_server.app['state']
+    write_article(tmp_path / 'articles', site, 'first', IMAGE)
+    run(make_poster(tmp_path, [site], quiet_logger))
+    assert len(state['posts']) == 1 and len(state['media']) == 1
+
+    # Вложение удалили на сайте; следующая статья с тем же изображением не должна ссылаться на него
+    state['media'].clear()
+    write_article(tmp_path / 'articles', site, 'second', IMAGE)
+    run(make_poster(tmp_path, [site], quiet_logger))
+
+    assert len(state['posts']) == 2
+    assert len(state['media']) == 1
+    second = [post for post in state['posts'].values() if post['title'] == 'second'][0]
+    assert second['featured_media'] in state['media']
+
+
+def test_rejected_featured_media_is_uploaded_again(tmp_path, wordpress_server, quiet_logger):
+    site = wordpress_server.address
+    state = wordpress_server.app['state']
+    write_article(tmp_path / 'articles', site, 'first', IMAGE)
+    run(make_poster(tmp_path, [site], quiet_logger))
+    stale_id = next(iter(state['media']))
+
+    # Вложение удалили уже после того, как в этом запуске его наличие было проверено
+    state['media'].clear()
+    write_article(tmp_path / 'articles', site, 'second', IMAGE)
+    poster = make_poster(tmp_path, [site], quiet_logger)
+    poster._media_checked.add((site, stale_id))
+    run(poster)
+
+    second = [post for post in state['posts'].values() if post['title'] == 'second'][0]
+    assert second['featured_media'] in state['media']
+    assert second['featured_media'] != stale_id
+
+
+def test_daily_quota_is_shared_across_watch_passes(tmp_path, wordpress_server, quiet_logger):
+    site = wordpress_server.address
+    state = wordpress_server.app['state']
+    poster = make_poster(tmp_path, [site], quiet_logger, default_daily_quota=10, watch=True, watch_settle=0)
+    for idx in range(4):
+        write_article(tmp_path / 'articles', site, f"first {idx}")
+
+    async def two_passes():
+        scheduler = FairScheduler(poster.max_total_concurrency)
+        async with poster.create_session() as session:
+            await poster.process_pass(session, scheduler)
+            assert len(state['posts']) == 4
+            # Генератор дописал статьи; во втором проходе квота - 10 минус 4 уже опубликованных сегодня
+            for idx in range(11):
+                write_article(tmp_path / 'articles', site, f"second {idx}")
+            await poster.process_pass(session, scheduler, report=False)
+
+    try:
+        asyncio.run(two_passes())
+    finally:
+        poster.close()
+    assert len(state['posts']) == 10
+
+
+def test_watch_passes_do_not_recount_postponed_articles(tmp_path, wordpress_server, quiet_logger):
+    site = wordpress_server.address
+    poster = make_poster(tmp_path, [site], quiet_logger, watch=True, watch_settle=0)
+    write_article(tmp_path / 'articles', site, 'good')
+    # Папка без текста: статья не публикуется и находится заново в каждом проходе
+    (tmp_path / 'articles' / site / 'broken').mkdir()
+
+    async def passes():
+        scheduler = FairScheduler(poster.max_total_concurrency)
+        async with poster.create_session() as session:
+            await poster.process_pass(session, scheduler)
+            for _ in range(3):
+                await poster.process_pass(session, scheduler, report=False)
+
+    try:
+        asyncio.run(passes())
+    finally:
+        poster.close()
+    progress = poster.progress.snapshot()
+    assert (progress.queued, progress.done, progress.failed) == (2, 1, 1)
+    assert poster.total_articles == 2
+
+
+def test_preflight_skips_site_with_rejected_credentials(tmp_path, wordpress_server, quiet_logger):
+    rejecting = StandInServer(wordpress_app(ServiceBehavior(latency=0), reject_auth=True)).start()
+    try:
+        sites = [wordpress_server.address, rejecting.address]
+        for site in sites:
+            for idx in range(3):
+                write_article(tmp_path / 'articles', site, f"article {idx}")
+        poster = make_poster(tmp_path, sites, quiet_logger)
+        run(poster)
+    finally:
+        rejecting.stop()
+    assert poster.get_breaker(rejecting.address).is_open
+    assert not poster.get_breaker(wordpress_server.address).is_open
+    assert len(wordpress_server.app['state']['posts']) == 3
+    assert rejecting.app['state']['posts'] == {}
+
+
+def test_site_recovering_from_outage_keeps_its_queue(tmp_path, quiet_logger):
+    # Два поста не создаются, автомат срабатывает; проба сначала тоже получает 503, затем сайт восстанавливается
+    server = StandInServer(wordpress_app(ServiceBehavior(latency=0), fail_statuses=(503,) * 4)).start()
+    try:
+        site = server.address
+        for idx in range(6):
+            write_article(tmp_path / 'articles', site, f"article {idx}")
+        poster = make_poster(tmp_path, [site], quiet_logger, batch_size=1, max_concurrency=1, max_retries=0,
+                             http_settings={"preflight": False, "warm_up": False, "breaker_threshold": 2,
+                                            "breaker_reset_timeout": 0.1})
+        run(poster)
+    finally:
+        server.stop()
+    assert len(server.app['state']['posts']) == 4
+    assert not poster.get_breaker(site).is_open
+    progress = poster.progress.snapshot()
+    assert (progress.done, progress.failed, progress.skipped) == (4, 2, 0)